@@ -0,0 +1,88 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+from src.CSRGraph import CSRGraph
+from src.PathCache import ShortestPathTree
+
+# Floyd-Warshall is chosen by "auto" when E * DENSE_RATIO >= V^2 (or the graph is small):
+# a vectorized O(V^3) pass beats V pure python Dijkstra runs unless the graph is very sparse
+DENSE_RATIO = 500
+SMALL_GRAPH = 300
+# Floyd-Warshall relaxes the matrix in blocks of rows, each with a temporary of about this many bytes
+BLOCK_BYTES = 4 * 1024 * 1024
+
+
+def all_pairs_distances(csr: CSRGraph, method: str = "auto", dtype: str = "float64", out: str = None):
+    """
+    Computes the distances between every pair of nodes of a frozen graph.
+    :param csr: the frozen graph
+    :param method: "floyd_warshall" - a NumPy vectorized Floyd-Warshall, O(V^3), best for small or dense graphs
+                   "dijkstra" - a Dijkstra search from every node, O(V(V+E)logV), best for large sparse graphs
+                   "auto" - choose between the two by the size and the density of the graph
+    :param dtype: the type of the matrix, "float64" or "float32"
+    :param out: if given, the matrix is written to a memory mapped .npy file at this path
+    (for matrices that don't fit in the memory)
+    :return: a V x V numpy matrix (inf where there is no path), and a dictionary of (key: row/column index)
+    More info:
+    https://en.wikipedia.org/wiki/Floyd%E2%80%93Warshall_algorithm
+    """
+    import numpy as np
+
+    n = csr.v_size()
+    if method == "auto":
+        small = n <= SMALL_GRAPH
+        method = "floyd_warshall" if small or csr.e_size() * DENSE_RATIO >= n * n else "dijkstra"
+    if method not in ("floyd_warshall", "dijkstra"):
+        raise ValueError("Unknown all pairs method: " + method)
+
+    if out is None:
+        d = np.full((n, n), np.inf, dtype=dtype)
+    else:
+        d = np.lib.format.open_memmap(out, mode="w+", dtype=dtype, shape=(n, n))
+        d[:] = np.inf
+
+    if method == "floyd_warshall":
+        _floyd_warshall(csr, d)
+    else:
+        _dijkstra_rows(csr, d)
+    if out is not None:
+        d.flush()
+    return d, dict(csr.index)
+
+
+def _floyd_warshall(csr: CSRGraph, d) -> None:
+    import numpy as np
+
+    n = csr.v_size()
+    offsets = np.frombuffer(csr.out_offsets, dtype=np.int64)
+    src = np.repeat(np.arange(n), np.diff(offsets))
+    dst = np.frombuffer(csr.out_targets, dtype=np.int32) if csr.e_size() else np.zeros(0, dtype=np.int32)
+    w = np.frombuffer(csr.out_weights, dtype=np.float64) if csr.e_size() else np.zeros(0)
+    np.minimum.at(d, (src, dst), w.astype(d.dtype))
+    np.fill_diagonal(d, 0)
+    rows = max(1, BLOCK_BYTES // max(1, n * d.itemsize))
+    tmp = np.empty((min(rows, n), n), dtype=d.dtype)
+    for k in range(n):
+        # d[i][j] = min(d[i][j], d[i][k] + d[k][j]) for a block of rows i and all j at once,
+        # row k and column k themselves don't change in round k (d[k][k] = 0)
+        for i in range(0, n, rows):
+            j = min(i + rows, n)
+            t = tmp[:j - i]
+            np.add(d[i:j, k, None], d[k], out=t)
+            np.minimum(d[i:j], t, out=d[i:j])
+
+
+def _dijkstra_rows(csr: CSRGraph, d) -> None:
+    import numpy as np
+
+    for s in range(csr.v_size()):
+        tree = ShortestPathTree(csr, s)
+        # -1 is never settled, so the search runs over everything reachable from s
+        tree.settle(-1)
+        d[s, np.fromiter(tree.dist.keys(), dtype=np.int64)] = np.fromiter(tree.dist.values(), dtype=np.float64)
@@ -0,0 +1,88 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.CSRGraph import CSRGraph
+from src.PathCache import ShortestPathTree
+
+# the frozen graph of a worker process, set once by the pool initializer
+_csr = None
+
+
+def group_by_source(pairs) -> dict:
+    """
+    :param pairs: an iterable of (src, dst) keys
+    :return: a dictionary of (src: [dst1, dst2, ...]) keeping the original order
+    """
+    groups = {}
+    for src, dst in pairs:
+        groups.setdefault(src, []).append(dst)
+    return groups
+
+
+def solve_groups(csr: CSRGraph, groups: list) -> list:
+    """
+    Answers all the queries of the given groups, with a single search per source
+    (the search is resumed for every destination that was not settled yet).
+    :param csr: the frozen graph
+    :param groups: a list of (src, [dst1, dst2, ...]) keys
+    :return: a list of ((src, dst), (dist, path)), or ((src, dst), None) if one of the nodes does not exist
+    """
+    results = []
+    index = csr.index
+    for src, dsts in groups:
+        tree = ShortestPathTree(csr, index[src]) if src in index else None
+        for dst in dsts:
+            if tree is None or dst not in index:
+                results.append(((src, dst), None))
+                continue
+            t = index[dst]
+            tree.settle(t)
+            results.append(((src, dst), tree.path_to(t)))
+    return results
+
+
+def _init_worker(csr: CSRGraph) -> None:
+    global _csr
+    _csr = csr
+
+
+def _solve_in_worker(groups: list) -> list:
+    return solve_groups(_csr, groups)
+
+
+def solve_parallel(csr: CSRGraph, pairs, workers: int = None):
+    """
+    Answers many shortest path queries, spread over a pool of worker processes.
+    The pairs are grouped by source, the groups are split into chunks, and each worker
+    answers whole chunks. The frozen graph is sent to every worker only once (when the
+    pool starts), so the tasks themselves only carry the keys of the queries.
+    :param csr: the frozen graph
+    :param pairs: an iterable of (src, dst) keys
+    :param workers: the number of worker processes (default: the number of cpus)
+    :return: a generator of ((src, dst), (dist, path)) in the order the chunks are done
+    """
+    groups = list(group_by_source(pairs).items())
+    if not groups:
+        return
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(groups) == 1:
+        yield from solve_groups(csr, groups)
+        return
+    chunk = max(1, len(groups) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(csr,)) as pool:
+        futures = [pool.submit(_solve_in_worker, groups[i:i + chunk]) for i in range(0, len(groups), chunk)]
+        try:
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,147 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import math
+from array import array
+
+
+class CSRGraph(object):
+    """
+    A frozen (read only) snapshot of a directed graph in compressed sparse row (CSR) form.
+    The nodes are packed into a dense index 0..n-1 (in the insertion order of the graph),
+    and each direction of the adjacency is kept in three flat arrays:
+        offsets[i] .. offsets[i+1]  - the range of the node i edges in the two arrays below
+        targets                     - the dense index of the other end of each edge
+        weights                     - the weight of each edge
+    The positions of the nodes are kept flat as well: (x, y, z) of node i at positions[3*i : 3*i+3].
+    The snapshot is tagged with the mc of the graph it was built from, so it can be
+    reused as long as the graph did not change.
+    """
+
+    __slots__ = ("keys", "index", "mc", "positions", "has_positions", "profile",
+                 "out_offsets", "out_targets", "out_weights",
+                 "in_offsets", "in_targets", "in_weights")
+
+    def __init__(self, keys: list, mc: int,
+                 out_offsets: array, out_targets: array, out_weights: array,
+                 in_offsets: array, in_targets: array, in_weights: array,
+                 positions: array = None, has_positions: bool = False):
+        self.keys = keys
+        self.index = {k: i for i, k in enumerate(keys)}
+        self.mc = mc
+        self.out_offsets = out_offsets
+        self.out_targets = out_targets
+        self.out_weights = out_weights
+        self.in_offsets = in_offsets
+        self.in_targets = in_targets
+        self.in_weights = in_weights
+        self.positions = positions if positions is not None else array('d', bytes(24 * len(keys)))
+        self.has_positions = has_positions
+        self.profile = None
+
+    @classmethod
+    def from_graph(cls, g) -> "CSRGraph":
+        """
+        Packs the adjacency dictionaries of the given graph into CSR arrays.
+        :param g: the graph to freeze (any GraphInterface)
+        :return: a new CSRGraph tagged with the current mc of g
+        """
+        nodes = g.get_all_v()
+        keys = list(nodes.keys())
+        index = {k: i for i, k in enumerate(keys)}
+        out_edges = [g.all_out_edges_of_node(k) for k in keys]
+        in_edges = [g.all_in_edges_of_node(k) for k in keys]
+        positions = array('d')
+        has_positions = True
+        for node in nodes.values():
+            # checked before pos, so no random position is made up just to be ignored
+            has_pos = getattr(node, "has_pos", None)
+            if has_pos is None:
+                has_pos = node.pos is not None
+            if not has_pos:
+                has_positions = False
+                positions.extend((0.0, 0.0, 0.0))
+            else:
+                positions.extend(map(float, node.pos))
+        return cls(keys, g.get_mc(),
+                   *cls._pack(out_edges, index),
+                   *cls._pack(in_edges, index),
+                   positions, has_positions)
+
+    @staticmethod
+    def _pack(adjacency: list, index: dict) -> (array, array, array):
+        offsets = array('q', [0])
+        targets = array('i')
+        weights = array('d')
+        for ni in adjacency:
+            targets.extend([index[u] for u in ni.keys()])
+            weights.extend(ni.values())
+            offsets.append(len(targets))
+        return offsets, targets, weights
+
+    def v_size(self) -> int:
+        """
+        :return: The number of vertices in the snapshot
+        """
+        return len(self.keys)
+
+    def e_size(self) -> int:
+        """
+        :return: The number of edges in the snapshot
+        """
+        return len(self.out_targets)
+
+    def out_edges(self, i: int) -> zip:
+        """
+        :param i: the dense index of a node
+        :return: pairs of (dense index, weight) of all the edges going out of node i
+        """
+        a, b = self.out_offsets[i], self.out_offsets[i + 1]
+        return zip(self.out_targets[a:b], self.out_weights[a:b])
+
+    def in_edges(self, i: int) -> zip:
+        """
+        :param i: the dense index of a node
+        :return: pairs of (dense index, weight) of all the edges coming into node i
+        """
+        a, b = self.in_offsets[i], self.in_offsets[i + 1]
+        return zip(self.in_targets[a:b], self.in_weights[a:b])
+
+    def weight_profile(self) -> (bool, float, float):
+        """
+        :return: (True if all the weights are integers, the smallest weight, the largest weight),
+        computed on the first call
+        """
+        if self.profile is None:
+            w = self.out_weights
+            if len(w) == 0:
+                self.profile = (True, 0.0, 0.0)
+            else:
+                self.profile = (all(x.is_integer() for x in w), min(w), max(w))
+        return self.profile
+
+    def __getstate__(self):
+        # the index is rebuilt on the other side, so only the flat arrays are pickled
+        return {name: getattr(self, name) for name in self.__slots__ if name != "index"}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.index = {k: i for i, k in enumerate(self.keys)}
+
+    def distance(self, i: int, j: int) -> float:
+        """
+        :return: the euclidean distance between the positions of nodes i and j
+        """
+        p = self.positions
+        return math.sqrt((p[3 * i] - p[3 * j]) ** 2 + (p[3 * i + 1] - p[3 * j + 1]) ** 2 +
+                         (p[3 * i + 2] - p[3 * j + 2]) ** 2)
+
+    def __repr__(self):
+        return "CSRGraph |V|={} , |E|={} , MC={}".format(self.v_size(), self.e_size(), self.mc)
@@ -0,0 +1,440 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import heapq
+import math
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from src.CSRGraph import CSRGraph
+from src.GraphIO import _write_array
+
+# binary file: magic "OOCH", version (u16), padding (u16), |V| (i64), |up arcs| (i64), |down arcs| (i64),
+# the fingerprint of the graph (u32), the rank of the first core node (i32) and |E| of the graph (i64),
+# then the rank, up and down arrays, 8 bytes aligned
+MAGIC = b"OOCH"
+VERSION = 2
+_HEADER = struct.Struct("<4sHHqqqIiq")
+
+
+def fingerprint(csr: CSRGraph) -> int:
+    """
+    :return: a checksum of the nodes and the edges of a frozen graph, to match a saved hierarchy with its graph
+    """
+    crc = zlib.crc32(array('q', csr.keys))
+    for a in (csr.out_offsets, csr.out_targets, csr.out_weights):
+        crc = zlib.crc32(a, crc)
+    return crc
+
+
+class ContractionHierarchy(object):
+    """
+    A contraction hierarchy of a frozen graph, for fast repeated point to point queries.
+    The nodes are contracted one by one, least important first: a contracted node is taken out of
+    the graph, and every path u -> v -> x through it that no other path (witness) is as short as,
+    is replaced by a shortcut edge u -> x. The order of the contraction is the rank of the nodes.
+    A query runs a bidirectional Dijkstra that only goes up: the forward search takes the edges to
+    higher ranked nodes, the backward search takes the edges from higher ranked nodes (backwards),
+    so both searches stay very small. The shortcuts of the found path are then unpacked back into
+    the original nodes.
+    Contracting stops when the next node would add more arcs than it removes (see build); the nodes that
+    are left (the core) keep all the arcs between them. The upward searches stop at the core, and the
+    core is crossed by a plain bidirectional Dijkstra from the nodes where they entered it.
+    This pays off most on graphs with a natural hierarchy (road networks, grids), where the core is small.
+    Random graphs have no such hierarchy and most of their nodes end up in the core, so the query is
+    about as fast as a bidirectional Dijkstra there.
+    Every arc is kept with its middle node: the contracted node a shortcut bypasses, or -1 for an
+    original edge.
+    More info:
+    https://en.wikipedia.org/wiki/Contraction_hierarchies
+    """
+
+    __slots__ = ("keys", "index", "rank", "core", "fingerprint", "e_size", "mc",
+                 "up_offsets", "up_targets", "up_weights", "up_mids",
+                 "down_offsets", "down_sources", "down_weights", "down_mids")
+
+    # a witness search gives up (and the shortcut is added) after settling this many nodes or going this many hops
+    WITNESS_LIMIT = 40
+    HOP_LIMIT = 4
+    # contracting stops once even the best node left would add this many arcs more than it removes
+    EDGE_DIFF_LIMIT = 10
+
+    def __init__(self, keys: list, rank: array, core: int, up: tuple, down: tuple, fingerprint_: int,
+                 e_size: int, mc: int):
+        self.keys = keys
+        self.index = {k: i for i, k in enumerate(keys)}
+        self.rank = rank
+        # the nodes ranked from core up were not contracted
+        self.core = core
+        self.up_offsets, self.up_targets, self.up_weights, self.up_mids = up
+        self.down_offsets, self.down_sources, self.down_weights, self.down_mids = down
+        self.fingerprint = fingerprint_
+        self.e_size = e_size
+        self.mc = mc
+
+    # -----------------------------------------------------------------------------------------
+    # *********************************** Preprocessing ***************************************
+    # -----------------------------------------------------------------------------------------
+    @classmethod
+    def build(cls, csr: CSRGraph, max_shortcuts: int = 64) -> "ContractionHierarchy":
+        """
+        Contracts the nodes of a frozen graph by their priority: the edge difference (the shortcuts a node
+        adds minus the arcs it removes), plus the number of its already contracted neighbours and its level
+        in the hierarchy. The priorities are updated lazily: a node popped from the heap is prioritized
+        again, and only contracted if it is still the best one (otherwise it is pushed back).
+        Contracting stops once the best node left would add more than EDGE_DIFF_LIMIT arcs (or more than
+        max_shortcuts shortcuts): from there on the graph only gets denser, so the rest is left as the core.
+        :param csr: the frozen graph
+        :param max_shortcuts: contracting stops when the next node would add more shortcuts than that
+        :return: the hierarchy, tagged with the mc of csr
+        """
+        n = csr.v_size()
+        out_adj = [{} for _ in range(n)]
+        in_adj = [{} for _ in range(n)]
+        for v in range(n):
+            for u, w in csr.out_edges(v):
+                if u != v and w < out_adj[v].get(u, (math.inf,))[0]:
+                    out_adj[v][u] = (w, -1)
+                    in_adj[u][v] = (w, -1)
+        deleted = [0] * n
+        level = [0] * n
+        rank = array('i', [-1]) * n
+        up = [None] * n
+        down = [None] * n
+
+        def priority(v: int) -> (int, int, list):
+            shortcuts = cls._shortcuts(out_adj, in_adj, v)
+            diff = len(shortcuts) - len(out_adj[v]) - len(in_adj[v])
+            return diff + deleted[v] + level[v], diff, shortcuts
+
+        q = [(priority(v)[0], v) for v in range(n)]
+        heapq.heapify(q)
+        order = 0
+        while q:
+            _, v = heapq.heappop(q)
+            p, diff, shortcuts = priority(v)
+            if q and p > q[0][0]:
+                heapq.heappush(q, (p, v))
+                continue
+            if diff > cls.EDGE_DIFF_LIMIT or len(shortcuts) > max_shortcuts:
+                break
+            rank[v] = order
+            order += 1
+            up[v] = list(out_adj[v].items())
+            down[v] = list(in_adj[v].items())
+            neighbours = set(out_adj[v]) | set(in_adj[v])
+            for u in out_adj[v]:
+                del in_adj[u][v]
+            for u in in_adj[v]:
+                del out_adj[u][v]
+            for u, x, w in shortcuts:
+                if out_adj[u].get(x, (math.inf,))[0] > w:
+                    out_adj[u][x] = (w, v)
+                    in_adj[x][u] = (w, v)
+            out_adj[v] = in_adj[v] = None
+            # the neighbours are not prioritized again here, only when they are popped
+            for u in neighbours:
+                deleted[u] += 1
+                level[u] = max(level[u], level[v] + 1)
+
+        # the core: ranked above all the contracted nodes, keeping all the arcs between its nodes
+        core = order
+        for v in range(n):
+            if rank[v] != -1:
+                continue
+            rank[v] = order
+            order += 1
+            up[v] = list(out_adj[v].items())
+            down[v] = list(in_adj[v].items())
+        return cls(list(csr.keys), rank, core, cls._pack(up), cls._pack(down), fingerprint(csr), csr.e_size(),
+                   csr.mc)
+
+    @classmethod
+    def _shortcuts(cls, out_adj: list, in_adj: list, v: int) -> list:
+        """
+        :return: the shortcuts (u, x, weight) needed to contract v - one for every pair of neighbours
+        u -> v -> x that has no other path (witness) as short, found by a limited Dijkstra from u
+        """
+        outs = out_adj[v]
+        shortcuts = []
+        if not outs:
+            return shortcuts
+        max_out = max(w for w, _ in outs.values())
+        for u, (w1, _) in in_adj[v].items():
+            dist = cls._witness(out_adj, u, v, w1 + max_out, outs)
+            for x, (w2, _) in outs.items():
+                if x != u and dist.get(x, math.inf) > w1 + w2:
+                    shortcuts.append((u, x, w1 + w2))
+        return shortcuts
+
+    @classmethod
+    def _witness(cls, out_adj: list, src: int, skip: int, limit: float, targets: dict) -> dict:
+        """
+        A Dijkstra from src that never goes through skip, and stops once all the targets are settled,
+        the distance passes limit, or WITNESS_LIMIT nodes were settled. Paths of more than HOP_LIMIT
+        edges are not followed.
+        :return: the distances found (an upper bound of the real ones, so a missed witness only costs a shortcut)
+        """
+        dist = {src: 0}
+        settled = set()
+        left = len(targets)
+        q = [(0, 0, src)]
+        while q and left > 0 and len(settled) < cls.WITNESS_LIMIT:
+            dv, hops, v = heapq.heappop(q)
+            if v in settled:
+                continue
+            if dv > limit:
+                break
+            settled.add(v)
+            if v in targets:
+                left -= 1
+            if hops == cls.HOP_LIMIT:
+                continue
+            for u, (w, _) in out_adj[v].items():
+                if u != skip and dist.get(u, math.inf) > dv + w:
+                    dist[u] = dv + w
+                    heapq.heappush(q, (dv + w, hops + 1, u))
+        return dist
+
+    @staticmethod
+    def _pack(adjacency: list) -> (array, array, array, array):
+        offsets = array('q', [0])
+        targets, weights, mids = array('i'), array('d'), array('i')
+        for arcs in adjacency:
+            for u, (w, mid) in arcs:
+                targets.append(u)
+                weights.append(w)
+                mids.append(mid)
+            offsets.append(len(targets))
+        return offsets, targets, weights, mids
+
+    # -----------------------------------------------------------------------------------------
+    # ************************************* Queries *******************************************
+    # -----------------------------------------------------------------------------------------
+    def shortest_path(self, src: int, dst: int, stats=None) -> (float, list):
+        """
+        Answers a query in two phases:
+            1. the upward searches from both ends, over the contracted nodes only: they meet at the highest
+               node of a path that never enters the core, and stop at the core nodes they reach
+            2. a bidirectional Dijkstra inside the core, starting from the core nodes each side reached
+               (at the distances it reached them), which finds the best path through the core
+        :param src: the dense index of the source
+        :param dst: the dense index of the destination
+        :param stats: an optional SearchStats to add the heap counters of the search to
+        :return: the distance of the path, a list of the nodes keys that the path goes through
+        (inf, []) if there is no path
+        """
+        if src == dst:
+            return 0, [self.keys[src]]
+        rank, core = self.rank, self.core
+        dist = ({src: 0}, {dst: 0})
+        prev = ({src: (-1, -1)}, {dst: (-1, -1)})
+        done = (set(), set())
+        # the arcs each side searches over, and the opposite arcs used to stall it
+        arcs = ((self.up_offsets, self.up_targets, self.up_weights, self.up_mids),
+                (self.down_offsets, self.down_sources, self.down_weights, self.down_mids))
+        best, meet = math.inf, -1
+        pops = pushes = scanned = 0
+
+        # ------------ Phase 1: upward over the contracted nodes ------------ #
+        for side, start in ((0, src), (1, dst)):
+            if rank[start] >= core:
+                continue
+            q = [(0, start)]
+            d, p, settled = dist[side], prev[side], done[side]
+            while q:
+                dv, v = heapq.heappop(q)
+                pops += 1
+                if v in settled:
+                    continue
+                settled.add(v)
+                # stall on demand: if a higher node reaches v shorter than its label, v is on no shortest path
+                offsets, targets, weights, _ = arcs[1 - side]
+                if any(d.get(targets[j], math.inf) + weights[j] < dv for j in range(offsets[v], offsets[v + 1])):
+                    continue
+                offsets, targets, weights, mids = arcs[side]
+                scanned += offsets[v + 1] - offsets[v]
+                for j in range(offsets[v], offsets[v + 1]):
+                    u = targets[j]
+                    du = dv + weights[j]
+                    if d.get(u, math.inf) > du:
+                        d[u] = du
+                        p[u] = (v, mids[j])
+                        # the core nodes are only reached here, they are searched in phase 2
+                        if rank[u] < core:
+                            heapq.heappush(q, (du, u))
+                            pushes += 1
+        forward, backward = dist
+        for v in done[0] & done[1]:
+            if forward[v] + backward[v] < best:
+                best, meet = forward[v] + backward[v], v
+
+        # ------------ Phase 2: bidirectional Dijkstra inside the core ------------ #
+        heaps = tuple([(dv, v) for v, dv in d.items() if rank[v] >= core] for d in dist)
+        for v, dv in forward.items():
+            if rank[v] >= core and v in backward and dv + backward[v] < best:
+                best, meet = dv + backward[v], v
+        for q in heaps:
+            heapq.heapify(q)
+        done = (set(), set())
+        # a path shorter than best would have a node settled from both sides before their tops sum up to best
+        while heaps[0] and heaps[1] and heaps[0][0][0] + heaps[1][0][0] < best:
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            q = heaps[side]
+            dv, v = heapq.heappop(q)
+            pops += 1
+            settled = done[side]
+            if v in settled or dv > dist[side][v]:
+                continue
+            settled.add(v)
+            d, other, p = dist[side], dist[1 - side], prev[side]
+            offsets, targets, weights, mids = arcs[side]
+            scanned += offsets[v + 1] - offsets[v]
+            for j in range(offsets[v], offsets[v + 1]):
+                u = targets[j]
+                du = dv + weights[j]
+                if d.get(u, math.inf) > du:
+                    d[u] = du
+                    p[u] = (v, mids[j])
+                    heapq.heappush(q, (du, u))
+                    pushes += 1
+                    if u in other and du + other[u] < best:
+                        best, meet = du + other[u], u
+        if stats is not None:
+            stats.add_search(pops, pushes, len(done[0]) + len(done[1]), scanned)
+        if meet == -1:
+            return math.inf, []
+
+        # -------------- Unpacking the path: -------------- #
+        arcs_on_path = []
+        v = meet
+        while prev[0][v][0] != -1:
+            u, mid = prev[0][v]
+            arcs_on_path.append((u, v, mid))
+            v = u
+        arcs_on_path.reverse()
+        v = meet
+        while prev[1][v][0] != -1:
+            u, mid = prev[1][v]
+            arcs_on_path.append((v, u, mid))
+            v = u
+        path = [src]
+        total = 0
+        for a, b, mid in arcs_on_path:
+            total = self._unpack(a, b, mid, path, total)
+        return total, [self.keys[i] for i in path]
+
+    def _unpack(self, a: int, b: int, mid: int, path: list, total: float) -> float:
+        """
+        Appends the original nodes of the arc a -> b (after a) to path, and adds their weights to total
+        (one edge at a time, so the distance is summed exactly like a plain search sums it).
+        :return: the new total
+        """
+        stack = [(a, b, mid)]
+        while stack:
+            a, b, mid = stack.pop()
+            if mid == -1:
+                total += self._arc(a, b)[0]
+                path.append(b)
+                continue
+            # a -> mid is an arc down into mid, mid -> b is an arc up from mid
+            stack.append((mid, b, self._arc(mid, b)[1]))
+            stack.append((a, mid, self._arc(a, mid)[1]))
+        return total
+
+    def _arc(self, a: int, b: int) -> (float, int):
+        """
+        :return: the (weight, middle node) of the arc a -> b, looked up at the lower ranked end
+        """
+        if self.rank[a] < self.rank[b]:
+            offsets, others, weights, mids, v, other = (self.up_offsets, self.up_targets, self.up_weights,
+                                                        self.up_mids, a, b)
+        else:
+            offsets, others, weights, mids, v, other = (self.down_offsets, self.down_sources, self.down_weights,
+                                                        self.down_mids, b, a)
+        for j in range(offsets[v], offsets[v + 1]):
+            if others[j] == other:
+                return weights[j], mids[j]
+        raise KeyError((a, b))
+
+    def matches(self, csr: CSRGraph) -> bool:
+        """
+        :return: True if this hierarchy was built from a graph with the same nodes and edges as csr
+        """
+        return (self.keys == csr.keys and self.e_size == csr.e_size()) and self.fingerprint == fingerprint(csr)
+
+    def shortcuts(self) -> int:
+        """
+        :return: the number of shortcut arcs
+        """
+        return sum(1 for m in self.up_mids if m != -1) + sum(1 for m in self.down_mids if m != -1)
+
+    def __repr__(self):
+        return "ContractionHierarchy |V|={} , |arcs|={} , shortcuts={} , MC={}".format(
+            len(self.keys), len(self.up_targets) + len(self.down_sources), self.shortcuts(), self.mc)
+
+    # -----------------------------------------------------------------------------------------
+    # *********************************** Load / save *****************************************
+    # -----------------------------------------------------------------------------------------
+    def save(self, file_name: str) -> None:
+        """
+        Writes the hierarchy to a binary file (to a temporary file, renamed over file_name when it's complete).
+        :param file_name: The path to the out file, e.g. next to the graph file: "graph.json.ch"
+        """
+        tmp = file_name + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, 0, len(self.keys), len(self.up_targets), len(self.down_sources),
+                                 self.fingerprint, self.core, self.e_size))
+            _write_array(f, array('q', self.keys))
+            _write_array(f, array('i', self.rank))
+            for a, code in zip((self.up_offsets, self.up_targets, self.up_weights, self.up_mids,
+                                self.down_offsets, self.down_sources, self.down_weights, self.down_mids),
+                               "qidiqidi"):
+                _write_array(f, array(code, a))
+        os.replace(tmp, file_name)
+
+    @classmethod
+    def load(cls, file_name: str, mc: int = -1) -> "ContractionHierarchy":
+        """
+        Reads a hierarchy written by save().
+        :param file_name: The path to the file
+        :param mc: the mc to tag the hierarchy with (the caller checks it matches the graph, see matches())
+        :return: the hierarchy
+        """
+        with open(file_name, "rb") as f:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            raise ValueError("Not a contraction hierarchy file: " + file_name)
+        magic, version, _, n, m_up, m_down, fp, core, e_size = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a contraction hierarchy file: " + file_name)
+        if version != VERSION:
+            raise ValueError("Unsupported contraction hierarchy version: {}".format(version))
+        offset = _HEADER.size
+
+        def section(code: str, count: int) -> array:
+            nonlocal offset
+            a = array(code)
+            size = a.itemsize * count
+            if offset + size > len(data):
+                raise ValueError("Truncated contraction hierarchy file: " + file_name)
+            a.frombytes(data[offset:offset + size])
+            if sys.byteorder == "big":
+                a.byteswap()
+            offset += size + (-size % 8)
+            return a
+
+        keys = section('q', n).tolist()
+        rank = section('i', n)
+        up = section('q', n + 1), section('i', m_up), section('d', m_up), section('i', m_up)
+        down = section('q', n + 1), section('i', m_down), section('d', m_down), section('i', m_down)
+        return cls(keys, rank, core, up, down, fp, e_size, mc)
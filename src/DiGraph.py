@@ -8,16 +8,41 @@
 """
 
 import random
+import weakref
+from collections import deque
+from src.CSRGraph import CSRGraph
 from src.GraphInterface import GraphInterface
 
 
 class NodeData(object):
+    """
+    A node of the graph: its key and its position.
+    A node without a given position gets a random one, but only when it is asked for (e.g. by plot_graph).
+    The random position is drawn from a generator seeded by (NodeData.seed, key), so it is reproducible.
+    """
+
+    __slots__ = ("key", "_pos", "has_pos")
+
+    # the seed of the random positions of the nodes without a given position
+    seed = 0
+
     def __init__(self, key: int, pos=None):
         self.key = key
-        if pos is None:
-            self.pos = random.randint(1, 10), random.randint(1, 10), random.randint(1, 10)
-        else:
-            self.pos = pos
+        self._pos = pos
+        # False when the position was not given (and a random one is made up on demand)
+        self.has_pos = pos is not None
+
+    @property
+    def pos(self) -> tuple:
+        if self._pos is None:
+            rnd = random.Random("{}:{}".format(NodeData.seed, self.key))
+            self._pos = rnd.randint(1, 10), rnd.randint(1, 10), rnd.randint(1, 10)
+        return self._pos
+
+    @pos.setter
+    def pos(self, pos: tuple) -> None:
+        self._pos = pos
+        self.has_pos = pos is not None
 
     def __repr__(self):
         return f"#{self.key}"
@@ -25,6 +50,9 @@ class NodeData(object):
 
 class DiGraph(GraphInterface):
 
+    # how many changes are kept in the change log (see changes_since)
+    CHANGES_LIMIT = 4096
+
     def __init__(self):
         self.V = dict()
         self.Ni_out = dict()
@@ -33,6 +61,17 @@ class DiGraph(GraphInterface):
         self.__nodeSize = 0
         self.__edgeSize = 0
         self.__mc = 0
+        self._frozen = None
+        self._changes = deque()
+        self._changes_floor = 0
+        # copy on write state (see snapshot): weak references to the snapshots that may share the
+        # structure of the graph, whether the outer dictionaries are shared with the last one,
+        # and the keys whose adjacency dictionaries are private (None while no snapshot is alive)
+        self._snapshots = []
+        self._shared = False
+        self._owned = None
+        # if set, every change is also appended to this journal (see Journal)
+        self.journal = None
 
     def get_all_v(self) -> dict:
         """
@@ -50,41 +89,67 @@ class DiGraph(GraphInterface):
         Note: if the node id already exists the node will not be added
         """
         if key not in self.V:
+            if self._owned is not None:
+                self._unshare()
             self.V[key] = NodeData(key, pos=pos)
             self.Ni_in[key] = {}
             self.Ni_out[key] = {}
             self._keys_set.add(key)
             self.__mc += 1
             self.__nodeSize += 1
+            self._record("add_node", key, pos)
             return True
         return False
 
     def remove_node(self, key: int) -> bool:
         """
         Removes a node from the graph.
+        Only the node's own neighbours are touched (found by its in / out edges), so it costs O(degree).
         :param key: The node ID
         :return: True if the node was removed successfully, False o.w.
 
         Note: if the node id does not exists the function will do nothing
         """
-        if key in self.V:
-            for k in self.Ni_in.keys():
-                if key in self.Ni_in[k].keys():
-                    del self.Ni_in[k][key]
-
-            for k in self.Ni_out.keys():
-                if key in self.Ni_out[k].keys():
-                    del self.Ni_out[k][key]
-
-            self._keys_set.remove(key)
-            self.V.pop(key)
-            self.Ni_in.pop(key)
-            self.Ni_out.pop(key)
+        if self._remove_node(key):
             self.__mc += 1
-            self.__nodeSize -= 1
+            self._record("remove_node", key)
             return True
         return False
 
+    def remove_nodes(self, keys) -> int:
+        """
+        Removes many nodes (with all their edges) from the graph, as a single change (the mc grows by 1).
+        :param keys: an iterable of node IDs
+        :return: the number of nodes that were removed
+
+        Note: node ids that do not exist are skipped
+        """
+        removed = [key for key in keys if self._remove_node(key)]
+        if removed:
+            self.__mc += 1
+            self._record_batch("remove_node", [(key,) for key in removed])
+        return len(removed)
+
+    def _remove_node(self, key: int) -> bool:
+        if key not in self.V:
+            return False
+        if self._owned is not None:
+            self._unshare(*self.Ni_in[key], *self.Ni_out[key])
+        ni_in = self.Ni_in.pop(key)
+        ni_out = self.Ni_out.pop(key)
+        for src in ni_in:
+            if src != key:
+                del self.Ni_out[src][key]
+        for dst in ni_out:
+            if dst != key:
+                del self.Ni_in[dst][key]
+        # a self loop is both in ni_in and in ni_out, but it is a single edge
+        self.__edgeSize -= len(ni_in) + len(ni_out) - (1 if key in ni_out else 0)
+        self._keys_set.remove(key)
+        self.V.pop(key)
+        self.__nodeSize -= 1
+        return True
+
     def get_node(self, key: int) -> NodeData:
         return self.V[key]
 
@@ -98,10 +163,13 @@ class DiGraph(GraphInterface):
         Note: If the edge already exists or one of the nodes dose not exists the functions will do nothing
         """
         if src in self.V and dst in self.V and dst not in self.Ni_out[src]:
+            if self._owned is not None:
+                self._unshare(src, dst)
             self.Ni_in[dst][src] = w
             self.Ni_out[src][dst] = w
             self.__mc += 1
             self.__edgeSize += 1
+            self._record("add_edge", src, dst, w)
             return True
         return False
 
@@ -114,14 +182,60 @@ class DiGraph(GraphInterface):
 
         Note: If such an edge does not exists the function will do nothing
         """
-        try:
-            self.all_out_edges_of_node(src).pop(dst)
-            self.all_in_edges_of_node(dst).pop(src)
+        if self._remove_edge(src, dst):
             self.__mc += 1
-            self.__edgeSize -= 1
+            self._record("remove_edge", src, dst)
             return True
-        except:
+        return False
+
+    def update_edge_weight(self, src: int, dst: int, w: float) -> bool:
+        """
+        Changes the weight of an existing edge, as a single change (the mc grows by 1),
+        instead of removing and adding it again.
+        :param src: The start node of the edge
+        :param dst: The end node of the edge
+        :param w: The new weight of the edge
+        :return: True if the edge exists (and now has the weight w), False o.w.
+
+        Note: setting the weight the edge already has is not a change
+        """
+        ni_out = self.Ni_out.get(src)
+        if ni_out is None or dst not in ni_out:
             return False
+        if ni_out[dst] != w:
+            if self._owned is not None:
+                self._unshare(src, dst)
+            self.Ni_in[dst][src] = w
+            self.Ni_out[src][dst] = w
+            self.__mc += 1
+            self._record("update_edge_weight", src, dst, w)
+        return True
+
+    def remove_edges(self, pairs) -> int:
+        """
+        Removes many edges from the graph, as a single change (the mc grows by 1).
+        :param pairs: an iterable of (src, dst)
+        :return: the number of edges that were removed
+
+        Note: edges that do not exist are skipped
+        """
+        removed = [(src, dst) for src, dst in pairs if self._remove_edge(src, dst)]
+        if removed:
+            self.__mc += 1
+            self._record_batch("remove_edge", removed)
+        return len(removed)
+
+    def _remove_edge(self, src: int, dst: int) -> bool:
+        ni_out = self.Ni_out.get(src)
+        if ni_out is None or dst not in ni_out:
+            return False
+        if self._owned is not None:
+            self._unshare(src, dst)
+            ni_out = self.Ni_out[src]
+        del ni_out[dst]
+        del self.Ni_in[dst][src]
+        self.__edgeSize -= 1
+        return True
 
     def all_in_edges_of_node(self, dst: int) -> dict:
         """
@@ -155,6 +269,170 @@ class DiGraph(GraphInterface):
         """
         return self.__mc
 
+    def bulk_load(self, nodes, edges) -> None:
+        """
+        Adds many nodes and edges at once, skipping the per element bookkeeping of add_node / add_edge.
+        The whole load counts as a single change of the graph (the mc grows by 1).
+        :param nodes: an iterable of (key, pos), pos may be None
+        :param edges: an iterable of (src, dst, w)
+
+        Note: like add_node / add_edge, existing nodes and edges are kept as they are,
+        and edges with a missing end are ignored
+        """
+        if self._owned is not None:
+            self._unshare(*self.V)
+        V, Ni_in, Ni_out = self.V, self.Ni_in, self.Ni_out
+        for key, pos in nodes:
+            if key not in V:
+                V[key] = NodeData(key, pos=pos)
+                Ni_in[key] = {}
+                Ni_out[key] = {}
+        for src, dst, w in edges:
+            out = Ni_out.get(src)
+            if out is not None and dst in V and dst not in out:
+                out[dst] = w
+                Ni_in[dst][src] = w
+        self._keys_set = set(V)
+        self.__nodeSize = len(V)
+        self.__edgeSize = sum(map(len, Ni_out.values()))
+        self.__mc += 1
+        # the change log can't describe a bulk load, so whoever follows it must start over
+        self._changes.clear()
+        self._changes_floor = self.__mc
+        # and neither can the journal, so the whole graph goes into a new checkpoint
+        if self.journal is not None:
+            self.journal.compact()
+
+    @classmethod
+    def from_csr(cls, csr: CSRGraph) -> "DiGraph":
+        """
+        Builds a graph out of a frozen one. The new graph adopts csr as its own frozen snapshot,
+        so it is not packed again until the graph changes.
+        :param csr: a frozen graph
+        :return: the new graph
+        """
+        keys, p = csr.keys, csr.positions
+        if csr.has_positions:
+            nodes = ((k, (p[3 * i], p[3 * i + 1], p[3 * i + 2])) for i, k in enumerate(keys))
+        else:
+            nodes = ((k, None) for k in keys)
+
+        def edges():
+            offsets, targets, weights = csr.out_offsets, csr.out_targets, csr.out_weights
+            for i, src in enumerate(keys):
+                a, b = offsets[i], offsets[i + 1]
+                for u, w in zip(targets[a:b], weights[a:b]):
+                    yield src, keys[u], w
+
+        g = cls()
+        g.bulk_load(nodes, edges())
+        csr.mc = g.get_mc()
+        g._frozen = csr
+        return g
+
+    def _record(self, op: str, *args) -> None:
+        """
+        Appends a change to the change log, tagged with the mc it brought the graph to.
+        Only the last CHANGES_LIMIT changes are kept. The change is also appended to the journal, if any.
+        """
+        self._changes.append((self.__mc, op) + args)
+        if len(self._changes) > self.CHANGES_LIMIT:
+            self._changes_floor = self._changes.popleft()[0]
+        if self.journal is not None:
+            self.journal.append(self.__mc, op, args)
+
+    def _record_batch(self, op: str, batch: list) -> None:
+        """
+        Appends the changes of a batch (a tuple of arguments per item) to the change log, all tagged with the
+        same mc. The batch is appended to the journal as a whole, so nothing runs in between its records.
+        """
+        for args in batch:
+            self._changes.append((self.__mc, op) + args)
+        while len(self._changes) > self.CHANGES_LIMIT:
+            self._changes_floor = self._changes.popleft()[0]
+        if self.journal is not None:
+            self.journal.append_batch(self.__mc, op, batch)
+
+    def changes_since(self, mc: int) -> list:
+        """
+        Returns all the changes made to the graph after version mc, oldest first.
+        Each change is a tuple of (mc, op, args...) where op is one of:
+            ("add_node", key, pos), ("remove_node", key), ("add_edge", src, dst, w), ("remove_edge", src, dst),
+            ("update_edge_weight", src, dst, w)
+        :param mc: a version of this graph (a value returned by get_mc())
+        :return: the list of changes, or None if the log does not go back that far
+        """
+        if mc < self._changes_floor:
+            return None
+        changes = []
+        for change in reversed(self._changes):
+            if change[0] <= mc:
+                break
+            changes.append(change)
+        changes.reverse()
+        return changes
+
+    def snapshot(self) -> "GraphSnapshot":
+        """
+        Returns an immutable snapshot of the current version of the graph (tagged with get_mc()),
+        which can be read (e.g. by a GraphAlgo in another thread) while the graph keeps changing.
+        Taking a snapshot copies nothing: the snapshot shares the dictionaries of the graph, and the
+        graph copies them on write instead - the outer dictionaries once on the first change after the
+        snapshot, and the adjacency dictionaries of a node only when a change touches that node.
+        So the memory grows with the nodes changed while the snapshot is alive, and once all the
+        snapshots are gone the graph stops copying.
+        Calling snapshot() again with no change in between returns the same snapshot.
+        :return: a GraphSnapshot of the graph
+        """
+        last = self._snapshots[-1]() if self._snapshots else None
+        if last is not None and last.get_mc() == self.__mc:
+            return last
+        frozen = self._frozen if self._frozen is not None and self._frozen.mc == self.__mc else None
+        snap = GraphSnapshot(self.V, self.Ni_out, self.Ni_in, self._keys_set,
+                             self.__nodeSize, self.__edgeSize, self.__mc, frozen)
+        self._snapshots = [ref for ref in self._snapshots if ref() is not None]
+        self._snapshots.append(weakref.ref(snap))
+        self._shared = True
+        self._owned = set()
+        return snap
+
+    def _unshare(self, *keys) -> None:
+        """
+        Called before a change while snapshots may be alive: makes the outer dictionaries and the
+        adjacency dictionaries of the given nodes private to the graph (copying the shared ones).
+        """
+        self._snapshots = [ref for ref in self._snapshots if ref() is not None]
+        if not self._snapshots:
+            self._shared = False
+            self._owned = None
+            return
+        if self._shared:
+            self.V = dict(self.V)
+            self.Ni_out = dict(self.Ni_out)
+            self.Ni_in = dict(self.Ni_in)
+            self._keys_set = set(self._keys_set)
+            self._shared = False
+        owned, Ni_out, Ni_in = self._owned, self.Ni_out, self.Ni_in
+        for key in keys:
+            if key not in owned:
+                Ni_out[key] = dict(Ni_out[key])
+                Ni_in[key] = dict(Ni_in[key])
+                owned.add(key)
+
+    def freeze(self) -> CSRGraph:
+        """
+        Returns a frozen CSR snapshot of the graph for the algorithms hot paths.
+        The snapshot is cached, and rebuilt only after the graph has changed (i.e. the mc moved on).
+        :return: a CSRGraph of the current state of the graph
+        """
+        if self._frozen is None or self._frozen.mc != self.__mc:
+            self._frozen = CSRGraph.from_graph(self)
+            # a snapshot of this version can use it as well
+            last = self._snapshots[-1]() if self._snapshots else None
+            if last is not None and last.get_mc() == self.__mc and last._frozen is None:
+                last._frozen = self._frozen
+        return self._frozen
+
     def __repr__(self):
         s = "|V|={} , |E|={} , MC={}\n".format(self.__nodeSize, self.__edgeSize, self.__mc)
         for key in self.V.keys():
@@ -173,3 +451,69 @@ class DiGraph(GraphInterface):
 
     def keysSet(self):
         return self._keys_set
+
+
+class GraphSnapshot(GraphInterface):
+    """
+    An immutable version of a DiGraph (see DiGraph.snapshot), sharing the unchanged structure with it.
+    It answers all the read methods of a graph, so it can be given to a GraphAlgo,
+    and all the changing methods raise a TypeError.
+    """
+
+    def __init__(self, V: dict, Ni_out: dict, Ni_in: dict, keys_set: set,
+                 node_size: int, edge_size: int, mc: int, frozen: CSRGraph = None):
+        self.V = V
+        self.Ni_out = Ni_out
+        self.Ni_in = Ni_in
+        self._keys_set = keys_set
+        self._node_size = node_size
+        self._edge_size = edge_size
+        self._mc = mc
+        self._frozen = frozen
+
+    def get_all_v(self) -> dict:
+        return self.V
+
+    def get_node(self, key: int) -> NodeData:
+        return self.V[key]
+
+    def all_in_edges_of_node(self, dst: int) -> dict:
+        return self.Ni_in.get(dst)
+
+    def all_out_edges_of_node(self, src: int) -> dict:
+        return self.Ni_out.get(src)
+
+    def v_size(self) -> int:
+        return self._node_size
+
+    def e_size(self) -> int:
+        return self._edge_size
+
+    def get_mc(self) -> int:
+        return self._mc
+
+    def keysSet(self):
+        return self._keys_set
+
+    def changes_since(self, mc: int) -> list:
+        """
+        :return: no changes for the version of the snapshot, None (unknown) for any other version
+        """
+        return [] if mc == self._mc else None
+
+    def freeze(self) -> CSRGraph:
+        """
+        :return: a CSRGraph of the snapshot (the one of the graph if it was frozen at that version)
+        """
+        if self._frozen is None:
+            self._frozen = CSRGraph.from_graph(self)
+        return self._frozen
+
+    def _read_only(self, *args) -> bool:
+        raise TypeError("A graph snapshot is read only")
+
+    add_node = remove_node = add_edge = remove_edge = update_edge_weight = remove_nodes = remove_edges = bulk_load = \
+        _read_only
+
+    def __repr__(self):
+        return "Snapshot |V|={} , |E|={} , MC={}".format(self._node_size, self._edge_size, self._mc)
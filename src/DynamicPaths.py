@@ -0,0 +1,223 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import heapq
+import math
+
+
+class SourceTree(object):
+    """
+    The complete shortest path tree of a single source over a DiGraph: the distance and the parent
+    of every reachable node, and the children of every node in the tree (to find the subtree below an edge).
+    Unlike ShortestPathTree it is not tied to a frozen version of the graph, it is repaired in place
+    when the graph changes (see repair).
+    """
+
+    __slots__ = ("src", "dist", "parent", "children")
+
+    def __init__(self, src: int):
+        self.src = src
+        self.dist = {}
+        self.parent = {}
+        self.children = {}
+
+    def rebuild(self, g, stats=None) -> None:
+        """
+        Computes the tree from scratch (Dijkstra over the adjacency dictionaries of the graph).
+        """
+        self.dist, self.parent, self.children = {}, {}, {}
+        seeds = [(0, self.src, None)] if self.src in g.get_all_v() else []
+        self._run(g, seeds, stats)
+
+    def repair(self, g, removed: set, edges: set, stats=None) -> int:
+        """
+        Brings the tree up to date after the given changes, touching only the part of the tree they affect
+        (in the spirit of Ramalingam and Reps):
+            1. a tree edge that was removed, or got heavier, cuts the subtree below it: the distances in that
+               subtree are dropped (and so is the subtree of a removed node)
+            2. every dropped node is offered its best in-edge from the rest of the tree, and every added edge,
+               or edge that got lighter, is offered to its head
+            3. a Dijkstra search from these offers settles only the nodes whose distance changed
+        The rest of the tree keeps its distances: no path through it was cut or made longer.
+        More info:
+        https://doi.org/10.1006/jagm.1996.0046 (Ramalingam, Reps - dynamic shortest paths)
+        :param g: the graph, after the changes
+        :param removed: the nodes that were removed (and maybe added again) by the changes
+        :param edges: the (src, dst) of the edges that were added, removed or reweighted by the changes
+        :param stats: an optional SearchStats to add the counters of the repair to
+        :return: the number of nodes dropped in step 1
+        """
+        dist, parent, children = self.dist, self.parent, self.children
+        out_edges = g.all_out_edges_of_node
+
+        # ------------ Step 1: drop the subtrees that lost their path ------------ #
+        roots = [k for k in removed if k in dist]
+        for u, v in edges:
+            if parent.get(v) == u and u in dist:
+                ni = out_edges(u)
+                w = ni.get(v) if ni is not None else None
+                if w is None or dist[u] + w > dist[v]:
+                    roots.append(v)
+        dropped = set()
+        while roots:
+            v = roots.pop()
+            if v not in dropped:
+                dropped.add(v)
+                roots.extend(children.pop(v, ()))
+        for v in dropped:
+            del dist[v]
+            p = parent.pop(v)
+            if p is not None and p not in dropped:
+                children[p].discard(v)
+
+        # ------------ Step 2: offer the dropped nodes and the new edges to the tree ------------ #
+        seeds = []
+        for v in dropped:
+            ni = g.all_in_edges_of_node(v)
+            if ni:
+                best = min(((dist[p] + w, p) for p, w in ni.items() if p in dist), default=None)
+                if best is not None:
+                    seeds.append((best[0], v, best[1]))
+        for u, v in edges:
+            ni = out_edges(u)
+            if u in dist and ni is not None and v in ni and dist[u] + ni[v] < dist.get(v, math.inf):
+                seeds.append((dist[u] + ni[v], v, u))
+        if self.src not in dist and self.src in g.get_all_v():
+            seeds.append((0, self.src, None))
+
+        # ------------ Step 3: settle the nodes whose distance changed ------------ #
+        self._run(g, seeds, stats)
+        return len(dropped)
+
+    def _run(self, g, seeds: list, stats=None) -> None:
+        """
+        A Dijkstra search from the given (distance, node, parent) offers, that settles a node only
+        if the offer improves its current distance, and moves it to its new parent in the tree.
+        """
+        dist, parent, children = self.dist, self.parent, self.children
+        out_edges = g.all_out_edges_of_node
+        heapq.heapify(seeds)
+        pops, pushes, settled, scanned = 0, len(seeds), 0, 0
+        while seeds:
+            d, v, p = heapq.heappop(seeds)
+            pops += 1
+            if d >= dist.get(v, math.inf):
+                continue
+            settled += 1
+            if v in dist and parent[v] is not None:
+                children[parent[v]].discard(v)
+            dist[v] = d
+            parent[v] = p
+            if p is not None:
+                children.setdefault(p, set()).add(v)
+            ni = out_edges(v)
+            scanned += len(ni)
+            for u, w in ni.items():
+                if d + w < dist.get(u, math.inf):
+                    heapq.heappush(seeds, (d + w, u, v))
+                    pushes += 1
+        if stats is not None:
+            stats.add_search(pops, pushes, settled, scanned)
+
+    def path_to(self, dst: int) -> (float, list):
+        """
+        :return: the distance to dst and the list of the nodes keys on the path, or (inf, []) if unreachable
+        """
+        if dst not in self.dist:
+            return math.inf, []
+        path = []
+        p = dst
+        while p is not None:
+            path.append(p)
+            p = self.parent[p]
+        path.reverse()
+        return self.dist[dst], path
+
+
+class DynamicSSSP(object):
+    """
+    Keeps the shortest path trees of a few registered sources of a DiGraph up to date across its mutations,
+    for graphs whose weights keep changing while the same sources are queried again and again.
+    Like IncrementalSCC, the changes made since the last update are read from the change log of the graph
+    (DiGraph.changes_since), and every tree is repaired only where they affect it (see SourceTree.repair),
+    so an update costs in proportion to the changed part of the trees and not to the size of the graph.
+    If the log does not go back far enough, or it holds more than max_delta changes,
+    the trees are rebuilt from scratch.
+    """
+
+    def __init__(self, g, sources=(), max_delta: int = 1024):
+        self.graph = g
+        self.max_delta = max_delta
+        self.trees = {}
+        self.mc = g.get_mc()
+        self.rebuilds = 0
+        self.repairs = 0
+        for src in sources:
+            self.add_source(src)
+
+    def add_source(self, src: int, stats=None) -> None:
+        """
+        Registers a source, and computes its tree (if it is not registered yet).
+        """
+        if src not in self.trees:
+            self.update(stats)
+            tree = self.trees[src] = SourceTree(src)
+            tree.rebuild(self.graph, stats)
+
+    def remove_source(self, src: int) -> bool:
+        """
+        :return: True if the source was registered (and its tree is dropped), False o.w.
+        """
+        return self.trees.pop(src, None) is not None
+
+    def update(self, stats=None) -> bool:
+        """
+        Brings all the trees up to date with the current version of the graph.
+        :param stats: an optional SearchStats to add the counters of the repairs to
+        :return: True if the changes were applied incrementally, False if the trees were rebuilt
+        """
+        g = self.graph
+        if self.mc == g.get_mc():
+            return True
+        changes = g.changes_since(self.mc)
+        self.mc = g.get_mc()
+        if changes is None or len(changes) > self.max_delta:
+            for tree in self.trees.values():
+                tree.rebuild(g, stats)
+            self.rebuilds += 1
+            return False
+        removed, edges = set(), set()
+        for change in changes:
+            op = change[1]
+            if op == "remove_node":
+                removed.add(change[2])
+            elif op != "add_node":
+                # add_edge, remove_edge and update_edge_weight (a new node has no edges until they are added)
+                edges.add((change[2], change[3]))
+        for tree in self.trees.values():
+            tree.repair(g, removed, edges, stats)
+        self.repairs += 1
+        return True
+
+    def shortest_path(self, src: int, dst: int, stats=None) -> (float, list):
+        """
+        :param src: a registered source
+        :param dst: the destination
+        :return: the distance of the path, a list of the nodes keys that the path goes through
+        """
+        self.update(stats)
+        return self.trees[src].path_to(dst)
+
+    def distances(self, src: int, stats=None) -> dict:
+        """
+        :param src: a registered source
+        :return: a dictionary of (key: distance from src) of all the nodes reachable from src (read only)
+        """
+        self.update(stats)
+        return self.trees[src].dist
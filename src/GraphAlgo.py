@@ -8,22 +8,41 @@
 """
 
 import heapq
-import json
 import math
 import random
+from contextlib import contextmanager
 from typing import List
 
-import matplotlib.pyplot as plt
-
-from DiGraph import DiGraph
-from src import GraphInterface
+from src.DiGraph import DiGraph
+from src.DynamicPaths import DynamicSSSP
+from src.GraphInterface import GraphInterface
 from src.GraphAlgoInterface import GraphAlgoInterface
+from src.GraphIO import load_json, read_binary_graph, save_binary, save_json
+from src.Landmarks import LandmarkIndex, alt_search
+from src.AllPairs import all_pairs_distances
+from src.ContractionHierarchy import ContractionHierarchy
+from src.Metrics import Metrics, instrument, instrumented
+from src.PathCache import PathCache
+from src.PathSearch import bidirectional_dijkstra, astar, geometric_factor
+from src.SCC import IncrementalSCC
 
 
 class GraphAlgo(GraphAlgoInterface):
 
     def __init__(self, g: DiGraph = DiGraph()):
         self.graph = g
+        self._scc = None
+        self._scc_cache = None
+        self.path_cache = PathCache()
+        self._dynamic = None
+        self._astar_factor = None
+        self._landmarks = None
+        self._landmark_settings = {}
+        self._ch = None
+        self._ch_future = None
+        self.load_stats = None
+        self._metrics = None
+        self._stats = None
 
     def get_graph(self) -> GraphInterface:
         """
@@ -31,75 +50,138 @@ class GraphAlgo(GraphAlgoInterface):
         """
         return self.graph
 
+    # -----------------------------------------------------------------------------------------
+    # *********************************** Instrumentation *************************************
+    # -----------------------------------------------------------------------------------------
+    @property
+    def metrics(self) -> Metrics:
+        """
+        The Metrics the calls are measured into, or None (the default) when they are not measured.
+        """
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, metrics: Metrics) -> None:
+        self._metrics = metrics
+        instrument(self, metrics is not None)
+
+    @contextmanager
+    def instrument(self, metrics: Metrics = None, profile: bool = False):
+        """
+        Measures the calls made inside the with block: the wall time of every shortest_path,
+        connected_component(s) and BFS call, the heap pushes / pops / stale pops, relaxations
+        (edges scanned) and settled nodes of the searches, and the BFS frontier sizes.
+        Setting self.metrics directly keeps the instrumentation on; when it is None
+        (the default) the calls are not measured at all.
+        :param metrics: the Metrics to collect into (default: a new one)
+        :param profile: if True (and no metrics given), every call also runs under cProfile and tracemalloc
+        :return: a context manager giving the Metrics
+        """
+        previous = self.metrics
+        self.metrics = metrics if metrics is not None else Metrics(profile)
+        try:
+            yield self.metrics
+        finally:
+            self.metrics = previous
+
     # -----------------------------------------------------------------------------------------
     # ******************************** Load graph from json ***********************************
     # -----------------------------------------------------------------------------------------
     def load_from_json(self, file_name: str) -> bool:
         """
-        Loads a graph from a json file.
+        Loads a graph from a json file (gzip or xz compressed files are detected and read as well).
+        The file is streamed record by record into DiGraph.bulk_load (see GraphIO.read_json_graph),
+        so the whole parsed json is never held in memory.
+        The load throughput and the peak memory are kept in self.load_stats.
         :param file_name: The path to the json file
         :returns True if the loading was successful, False o.w.
         """
         try:
-            with open(file_name) as f:
-                s = json.load(f)
-                g = DiGraph()
-            for node in s["Nodes"]:
-                if "pos" in node:
-                    pos = tuple(map(float, str(node["pos"]).split(",")))
-                else:
-                    pos = None
-                g.add_node(key=node["id"], pos=pos)
-
-            for edge in s["Edges"]:
-                g.add_edge(edge["src"], edge["dest"], edge["w"])
+            g, self.load_stats = load_json(file_name)
             self.graph = g
             return True
         except Exception as e:
             print(e)
             return False
-        finally:
-            f.close()
 
     # -----------------------------------------------------------------------------------------
     # ********************************* Save graph to json ************************************
     # -----------------------------------------------------------------------------------------
-    def save_to_json(self, file_name: str) -> bool:
+    def save_to_json(self, file_name: str, compact: bool = True, compression: str = None) -> bool:
         """
-        Saves the graph in JSON format to a file
+        Saves the graph in JSON format to a file.
+        The records are streamed to a temporary file, which is renamed over file_name only when it's complete
+        (see GraphIO.save_json), so a reader never sees a half written graph.
         :param file_name: The path to the out file
+        :param compact: write no whitespace at all if True, otherwise a record per line
+        :param compression: None, "gzip" or "xz" - by default chosen by the suffix of file_name (.gz or .xz).
+        load_from_json reads the compressed files as well
         :return: True if the save was successful, False o.w.
         """
-        with open('../data/' + file_name, 'w', encoding='utf-8') as f:
-            try:
-                d = {"Nodes": [], "Edges": []}
-                for src in self.graph.Ni_out.keys():
-                    for dst, w in self.graph.all_out_edges_of_node(src).items():
-                        d["Edges"].append({"src": src, "w": w, "dest": dst})
-
-                for node in self.graph.V.values():
-                    if node.pos is not None:
-                        t = "{}, {}, {}".format(node.pos[0], node.pos[1], node.pos[2])
-                        d["Nodes"].append({"pos": t, "id": node.key})
-                    else:
-                        d["Nodes"].append({"id": node.key})
-                json.dump(d, f, ensure_ascii=False, indent=4)
-                return True
-            except Exception as e:
-                print("Error save to Json: " + e.__repr__())
-                return False
-            finally:
-                f.close()
+        try:
+            save_json(self.graph, file_name, compact, compression)
+            return True
+        except Exception as e:
+            print("Error save to Json: " + e.__repr__())
+            return False
+
+    # -----------------------------------------------------------------------------------------
+    # ******************************* Binary load / save **************************************
+    # -----------------------------------------------------------------------------------------
+    def load_binary(self, file_name: str) -> bool:
+        """
+        Loads a graph from a binary file (see GraphIO for the format).
+        The file is memory mapped and used as is for the frozen (CSR) form of the graph.
+        :param file_name: The path to the binary file
+        :returns True if the loading was successful, False o.w.
+        """
+        try:
+            self.graph = read_binary_graph(file_name)
+            return True
+        except Exception as e:
+            print(e)
+            return False
+
+    def save_binary(self, file_name: str) -> bool:
+        """
+        Saves the graph in the binary format to a file
+        :param file_name: The path to the out file
+        :return: True if the save was successful, False o.w.
+        """
+        try:
+            save_binary(self.graph, file_name)
+            return True
+        except Exception as e:
+            print("Error save to binary: " + e.__repr__())
+            return False
 
     # -----------------------------------------------------------------------------------------
     # *********************************** Shortest path ***************************************
     # -----------------------------------------------------------------------------------------
 
-    def shortest_path(self, src: int, dst: int) -> (float, list):
+    @instrumented
+    def shortest_path(self, src: int, dst: int, method: str = "dijkstra") -> (float, list):
         """
-        Returns the shortest path from node id1 to node id2 using Dijkstra's Algorithm
+        Returns the shortest path from node id1 to node id2 using Dijkstra's Algorithm.
         :param src: The start node id
         :param dst: The end node id
+        :param method: The search to use:
+            "dijkstra" - the shortest path trees are kept in an LRU cache (self.path_cache) keyed by (src, mc),
+                         so repeated queries from the same source resume the same search instead of starting over.
+            "bidirectional" - a bidirectional Dijkstra (forward over the out-edges, backward over the in-edges),
+                              settles far fewer nodes for a single point to point query.
+            "astar" - A* guided by the euclidean distance between the nodes positions, scaled by the minimal
+                      weight/distance ratio over all the edges (so it never overestimates).
+                      Falls back to "dijkstra" when the positions are missing or made up.
+            "alt" - A* guided by the lower bounds of a landmark index (see build_landmarks), for graphs without
+                    meaningful positions. The index is built on the first "alt" query, and rebuilt after the graph changes.
+            "ch" - an upward bidirectional search over the contraction hierarchy of the graph (see preprocess).
+                   A query never builds the hierarchy: the first "ch" query (and the first one after the graph
+                   changes) starts building it in the background, and the queries fall back to "dijkstra"
+                   until it is ready.
+            "dynamic" - read from the shortest path tree of a registered source (see register_source),
+                        which is repaired after the graph changes instead of being computed again.
+                        Falls back to "dijkstra" for sources that are not registered.
         :return: The distance of the path, a list of the nodes ids that the path goes through
         More info:
         https://en.wikipedia.org/wiki/Dijkstra's_algorithm
@@ -110,61 +192,275 @@ class GraphAlgo(GraphAlgoInterface):
         if src not in nodes or dst not in nodes:
             return None
 
+        stats = self._stats
+        if method == "dynamic":
+            dynamic = self._dynamic_sssp()
+            if dynamic is not None and src in dynamic.trees:
+                return dynamic.shortest_path(src, dst, stats)
+            method = "dijkstra"
+
         # ----------------- Dijkstra core: ----------------- #
-        prev = {src: -1}
-        dist = {i: math.inf for i in nodes.keys()}
-        dist[src] = 0
-        q = []
-        heapq.heappush(q, (0, src))
-        while q:
-            v = heapq.heappop(q)[1]
-            for u, w in self.graph.all_out_edges_of_node(v).items():
-                if dist[u] > dist[v] + w:
-                    dist[u] = dist[v] + w
-                    prev[u] = v
-                    heapq.heappush(q, (dist[u], u))
-            if v == dst:
-                break
-
-        # -------------- Retrieving the path: -------------- #
-        if dist[dst] == math.inf:
-            return math.inf, []
-        path = []
-        p = dst
-        while p != -1:
-            path.insert(0, p)
-            p = prev[p]
-        return dist[dst], path
+        csr = self.graph.freeze()
+        s, t = csr.index[src], csr.index[dst]
+        if method == "dijkstra":
+            return self.path_cache.shortest_path(csr, s, t, stats)
+        if method == "bidirectional":
+            return bidirectional_dijkstra(csr, s, t, stats)[:2]
+        if method == "astar":
+            factor = self.astar_factor()
+            if factor > 0:
+                return astar(csr, s, t, factor, stats)[:2]
+            return self.path_cache.shortest_path(csr, s, t, stats)
+        if method == "alt":
+            return alt_search(csr, self.landmarks(), s, t, stats)[:2]
+        if method == "ch":
+            ch = self.hierarchy()
+            if ch is None:
+                self.preprocess(background=True)
+            else:
+                return ch.shortest_path(s, t, stats)
+            return self.path_cache.shortest_path(csr, s, t, stats)
+        raise ValueError("Unknown shortest path method: " + method)
+
+    def register_source(self, src: int) -> bool:
+        """
+        Registers a source whose shortest path tree is kept up to date across the changes of the graph
+        (see DynamicSSSP), for the sources that are queried again and again while the weights keep changing.
+        Its queries are then answered by shortest_path(src, dst, method="dynamic").
+        :param src: The source node id
+        :return: True if the source is registered, False if there is no such node
+        """
+        if src not in self.graph.get_all_v():
+            return False
+        if self._dynamic is None or self._dynamic.graph is not self.graph:
+            self._dynamic = DynamicSSSP(self.graph)
+        self._dynamic.add_source(src, self._stats)
+        return True
+
+    def unregister_source(self, src: int) -> bool:
+        """
+        Drops the shortest path tree of a registered source.
+        :return: True if the source was registered, False o.w.
+        """
+        return self._dynamic is not None and self._dynamic.remove_source(src)
+
+    def _dynamic_sssp(self) -> DynamicSSSP:
+        """
+        :return: the trees of the registered sources, following the graph if it was replaced (e.g. by load_from_json)
+        """
+        dynamic = self._dynamic
+        if dynamic is not None and dynamic.graph is not self.graph:
+            dynamic = self._dynamic = DynamicSSSP(self.graph, [k for k in dynamic.trees if k in self.graph.get_all_v()])
+        return dynamic
+
+    def shortest_paths_batch(self, pairs, workers: int = None):
+        """
+        Answers many shortest path queries at once.
+        The pairs are grouped by source so every source needs only one (resumed) Dijkstra search,
+        and the groups are spread over a pool of worker processes that get a compact (CSR) copy
+        of the graph once, when they start.
+        :param pairs: an iterable of (src, dst) node ids
+        :param workers: the number of worker processes (default: the number of cpus, 1 - no pool)
+        :return: a generator of ((src, dst), (dist, path)) streamed as soon as they are ready,
+        ((src, dst), None) if one of the nodes does not exist.
+        """
+        from src.BatchPaths import solve_parallel
+        return solve_parallel(self.graph.freeze(), pairs, workers)
+
+    def all_pairs_distances(self, method: str = "auto", dtype: str = "float64", out: str = None):
+        """
+        Computes the distance matrix of the graph (requires NumPy).
+        :param method: "floyd_warshall" (vectorized, for small / dense graphs), "dijkstra" (a search from
+        every node, for sparse graphs) or "auto" to choose by the size and density of the graph
+        :param dtype: "float64" or "float32"
+        :param out: an optional path of a .npy file to memory map the matrix to, for matrices that don't fit in RAM
+        :return: a V x V matrix (inf where there is no path) and a dictionary of (node id: row/column index)
+        """
+        return all_pairs_distances(self.graph.freeze(), method, dtype, out)
+
+    def astar_factor(self) -> float:
+        """
+        The scale factor of the A* geometric heuristic (see PathSearch.geometric_factor),
+        cached until the graph changes.
+        :return: the factor, or 0 if the positions of the nodes can not be used
+        """
+        csr = self.graph.freeze()
+        if self._astar_factor is None or self._astar_factor[0] is not csr:
+            self._astar_factor = (csr, geometric_factor(csr))
+        return self._astar_factor[1]
+
+    # -----------------------------------------------------------------------------------------
+    # ********************************** Landmarks (ALT) **************************************
+    # -----------------------------------------------------------------------------------------
+    def build_landmarks(self, k: int = 8, selection: str = "farthest", seed: int = 0,
+                        typecode: str = 'd', max_bytes: int = None) -> LandmarkIndex:
+        """
+        Builds the landmark index for shortest_path(method="alt"): selects k landmarks and computes the
+        distances from and to each of them (2k Dijkstra runs). The settings are kept, so the index is
+        rebuilt the same way after the graph changes.
+        :param k: the number of landmarks
+        :param selection: "farthest" (farthest first, spread over the large strongly connected components) or "random"
+        :param seed: the random seed of the selection
+        :param typecode: 'd' to keep the distances as float64, 'f' as float32 (half the memory)
+        :param max_bytes: if given, k is lowered so the distances fit in that much memory
+        :return: the index
+        """
+        self._landmark_settings = {"k": k, "selection": selection, "seed": seed,
+                                   "typecode": typecode, "max_bytes": max_bytes}
+        components = self.connected_components() if selection == "farthest" else None
+        index = LandmarkIndex.build(self.graph.freeze(), components=components, **self._landmark_settings)
+        self._landmarks = (self.graph, index)
+        return index
+
+    def landmarks(self) -> LandmarkIndex:
+        """
+        :return: the landmark index of the current graph, (re)built with the last settings if it is missing or stale
+        """
+        if self._landmarks is None or self._landmarks[0] is not self.graph or \
+                self._landmarks[1].mc != self.graph.get_mc():
+            return self.build_landmarks(**self._landmark_settings)
+        return self._landmarks[1]
+
+    # -----------------------------------------------------------------------------------------
+    # ******************************** Contraction hierarchy **********************************
+    # -----------------------------------------------------------------------------------------
+    def preprocess(self, background: bool = False, max_shortcuts: int = 64):
+        """
+        Builds a contraction hierarchy of the graph (see ContractionHierarchy), for shortest_path(method="ch").
+        The hierarchy is tied to the current mc of the graph, and is not used once the graph changes.
+        :param background: if True, the hierarchy is built in a separate process, and is adopted when it's ready
+        :param max_shortcuts: contracting stops when the next node would add more shortcuts than that
+        :return: the hierarchy, or a Future of it when built in the background
+        """
+        graph, csr = self.graph, self.graph.freeze()
+        if not background:
+            ch = ContractionHierarchy.build(csr, max_shortcuts)
+            self._ch = (graph, ch)
+            return ch
+        if self._ch_future is not None and not self._ch_future[1].done():
+            return self._ch_future[1]
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=1)
+        future = executor.submit(ContractionHierarchy.build, csr, max_shortcuts)
+        executor.shutdown(wait=False)
+        self._ch_future = (graph, future)
+        return future
+
+    def hierarchy(self) -> ContractionHierarchy:
+        """
+        :return: the contraction hierarchy of the current graph, or None if there is none up to date
+        """
+        if self._ch_future is not None and self._ch_future[1].done():
+            graph, future = self._ch_future
+            self._ch_future = None
+            if not future.cancelled() and future.exception() is None:
+                self._ch = (graph, future.result())
+        if self._ch is not None and self._ch[0] is self.graph and self._ch[1].mc == self.graph.get_mc():
+            return self._ch[1]
+        return None
+
+    def save_hierarchy(self, file_name: str) -> bool:
+        """
+        Saves the contraction hierarchy of the graph to a file, e.g. next to the graph file ("graph.json.ch").
+        :param file_name: The path to the out file
+        :return: True if the save was successful, False o.w. (or if there is no up to date hierarchy)
+        """
+        ch = self.hierarchy()
+        if ch is None:
+            return False
+        try:
+            ch.save(file_name)
+            return True
+        except Exception as e:
+            print("Error save hierarchy: " + e.__repr__())
+            return False
+
+    def load_hierarchy(self, file_name: str) -> bool:
+        """
+        Loads a contraction hierarchy saved by save_hierarchy, if it was built from a graph
+        with the same nodes and edges as the current one.
+        :param file_name: The path to the hierarchy file
+        :return: True if the loading was successful, False o.w.
+        """
+        try:
+            csr = self.graph.freeze()
+            ch = ContractionHierarchy.load(file_name, csr.mc)
+            if not ch.matches(csr):
+                print("The hierarchy does not match the graph: " + file_name)
+                return False
+            self._ch = (self.graph, ch)
+            return True
+        except Exception as e:
+            print(e)
+            return False
 
     # -----------------------------------------------------------------------------------------
     # ******************************** Connected components ***********************************
     # -----------------------------------------------------------------------------------------
-    def connected_components(self) -> List[list]:
+    @instrumented
+    def connected_components(self, workers: int = 1) -> List[list]:
         """
         Finds all the Strongly Connected Component(SCC) in the graph.
-            1. hold a list containing all the graph's nodes keys
-            2. for each node in the list find its Strongly Connected Component(SCC)
-            3. remove the SCC members from the list
-            4. repeat till the list is empty
-        :return: The list all SCC
+            1. on the first call, run an iterative Tarjan's algorithm over the frozen graph - O(V+E)
+            2. on the next calls, apply only the changes made to the graph since the previous call:
+               removals re-split only the component they touched, and a new edge searches only the
+               components ranked between its ends in a topological order of the components,
+               to merge the ones on a cycle through it or reorder them (see IncrementalSCC)
+        With more than one worker, the components are computed from scratch by a parallel
+        trim + forward-backward decomposition (see ParallelSCC), for very large graphs.
+        :param workers: the number of worker processes (None - the number of cpus, 1 - sequential)
+        :return: The list all SCC (in topological order, when computed sequentially)
         """
-        sccs = []
-        t = self.graph.keysSet()
-        while t:
-            scc = self.connected_component(t.pop())
-            sccs.append(scc)
-            t -= set(scc)
-        return sccs
+        if self.graph is None:
+            return []
+        if workers != 1:
+            from src.ParallelSCC import parallel_scc
+            g = self.graph
+            sccs = parallel_scc(g.freeze(), workers)
+            comp_of = {k: c for c, scc in enumerate(sccs) for k in scc}
+            self._scc_cache = (g, g.get_mc(), comp_of, sccs)
+            return sccs
+        return self._components()[1]
+
+    def component_map(self) -> dict:
+        """
+        Maps every node of the graph to the id of its Strongly Connected Component(SCC),
+        the id is the position of the component in the list returned by connected_components().
+        The map is cached until the graph changes, so it can be queried for many keys without recomputing.
+        :return: a dictionary of (key: component id)
+        """
+        if self.graph is None:
+            return {}
+        return self._components()[0]
+
+    def _incremental_scc(self) -> IncrementalSCC:
+        if self._scc is None or self._scc.graph is not self.graph:
+            self._scc = IncrementalSCC(self.graph)
+        else:
+            self._scc.update()
+        return self._scc
+
+    def _components(self) -> (dict, List[list]):
+        g = self.graph
+        cache = self._scc_cache
+        if cache is None or cache[0] is not g or cache[1] != g.get_mc():
+            sccs = self._incremental_scc().components()
+            comp_of = {k: c for c, scc in enumerate(sccs) for k in scc}
+            cache = self._scc_cache = (g, g.get_mc(), comp_of, sccs)
+        return cache[2], cache[3]
 
     # -----------------------------------------------------------------------------------------
     # ******************************** Connected component ************************************
     # -----------------------------------------------------------------------------------------
+    @instrumented
     def connected_component(self, key: int) -> list:
         """
         Finds the Strongly Connected Component(SCC) that node id1 is a part of.
             1. run BFS on the graph from the given node, and store the visited nodes in bfs_in
             2. run BFS on the Transposed graph from the given node, and store the visited nodes in bfs_out
             3. the intersection of bfs_in and bfs_out is the strongly connected component of the given node.
+        If all the components were already computed for this graph, they are brought up to date
+        and the component of the given node is taken from there.
 
         :param key: The node id
         :return: The list of nodes in the SCC
@@ -173,64 +469,131 @@ class GraphAlgo(GraphAlgoInterface):
         """
         if self.graph is None or key not in self.graph.V.keys():
             return []
+        if self._scc is not None and self._scc.graph is self.graph:
+            scc = self._incremental_scc()
+            return list(scc.members[scc.comp_of[key]])
         bfs_in = self.BFS(key)
         bfs_out = self.BFS(key, inverted=True)
         return list(bfs_out & bfs_in)
 
     # =========================================================================
+    @instrumented
     def BFS(self, s: int, inverted: bool = False) -> set:
         """
-        Traverse the graph using BFS algorithm
+        Traverse the graph using BFS algorithm, level by level
         :param s: the starting vertex
         :param inverted: if True, traverse the transposed graph
         :return: a set of all vertices the been visited during the BFS travers
         """
-        q = [s]
-        visited = {s}
-        while q:
-            v = q.pop()
-            v_adjs = self.graph.all_out_edges_of_node(v).keys() if inverted \
-                else self.graph.all_in_edges_of_node(v).keys()
-
-            for u in v_adjs:
-                if u not in visited:
-                    q.append(u)
-                    visited.add(u)
-        return visited
+        csr = self.graph.freeze()
+        if inverted:
+            offsets, targets = csr.out_offsets, csr.out_targets
+        else:
+            offsets, targets = csr.in_offsets, csr.in_targets
+        i = csr.index[s]
+        frontier = [i]
+        visited = bytearray(csr.v_size())
+        visited[i] = 1
+        stats = self._stats
+        while frontier:
+            if stats is not None:
+                stats.frontiers.append(len(frontier))
+                stats.settled += len(frontier)
+            level = []
+            for v in frontier:
+                for u in targets[offsets[v]:offsets[v + 1]]:
+                    if not visited[u]:
+                        level.append(u)
+                        visited[u] = 1
+            frontier = level
+        return {k for k, seen in zip(csr.keys, visited) if seen}
 
     # -----------------------------------------------------------------------------------------
     # *********************************** Graph plotting **************************************
     # -----------------------------------------------------------------------------------------
-    def plot_graph(self) -> None:
+    # the default level of detail: above these sizes arrowheads / node labels are not drawn
+    ARROWS_MAX_EDGES = 2000
+    LABELS_MAX_NODES = 200
+
+    def plot_graph(self, file_name: str = None, max_edges: int = None, arrows: bool = None,
+                   color_components: bool = False, labels: bool = None, seed: int = 0) -> None:
         """
         Plots the graph.
         If the nodes have a position, the nodes will be placed there.
         Otherwise, they will be placed in random positions.
+        All the edges are drawn by a single collection (quiver for arrows, LineCollection for plain lines)
+        and all the nodes by a single scatter, so large graphs are rendered in seconds.
+        :param file_name: if given, the figure is saved to this file (the format by its suffix, e.g. png or svg)
+        without any window, so it works on servers as well. Otherwise it is shown by plt.show()
+        :param max_edges: if given, only a random sample of that many edges is drawn
+        :param arrows: draw arrowheads, by default only if there are at most ARROWS_MAX_EDGES edges to draw
+        :param color_components: color the nodes and the edges inside a component by their SCC
+        (edges between components are gray) - an overview of the structure of large graphs
+        :param labels: write the keys on the nodes, by default only if there are at most LABELS_MAX_NODES nodes
+        :param seed: the random seed of the edge sample
         :return: None
         """
+        # matplotlib takes hundreds of milliseconds to import, so it is loaded only when a graph is plotted
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+        from matplotlib.figure import Figure
+
         g = self.get_graph()
-        for src in g.get_all_v().keys():
-            for dst, w in g.all_out_edges_of_node(src).items():
-                r = 0.0002
-                x1, y1, z1 = g.get_node(src).pos
-                x2, y2, z2 = g.get_node(dst).pos
-                distp1p2 = math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
-                if distp1p2 == 0:
-                    distp1p2 = 1
-                dir_x = (x1 - x2) / distp1p2
-                dir_y = (y1 - y2) / distp1p2
-                x1 = dir_x * (-r) + x1
-                y1 = dir_y * (-r) + y1
-                x2 = dir_x * r + x2
-                y2 = dir_y * r + y2
-
-                plt.arrow(x1, y1, (x2 - x1), (y2 - y1),
-                          length_includes_head=True, width=0.003 * distp1p2, head_width=0.1 * distp1p2, color='black')
-
-        for node in g.get_all_v().values():
-            if node.pos is None:
-                node.pos = (random.uniform(0, 5), random.uniform(0, 5), 0)
-            plt.text(node.pos[0], node.pos[1], str(node.key), horizontalalignment='center',
-                     verticalalignment='center',
-                     bbox=dict(facecolor='red', edgecolor='black', boxstyle='circle, pad=0.1'))
-        plt.show()
+        csr = g.freeze()
+        n = csr.v_size()
+        xs, ys = [], []
+        for key in csr.keys:
+            pos = g.get_node(key).pos
+            xs.append(pos[0])
+            ys.append(pos[1])
+
+        edges = [(v, csr.out_targets[j]) for v in range(n) for j in range(csr.out_offsets[v], csr.out_offsets[v + 1])]
+        if max_edges is not None and len(edges) > max_edges:
+            edges = random.Random(seed).sample(edges, max_edges)
+        if arrows is None:
+            arrows = len(edges) <= self.ARROWS_MAX_EDGES
+        if labels is None:
+            labels = n <= self.LABELS_MAX_NODES
+
+        node_colors, edge_colors = 'red', 'black'
+        if color_components:
+            comp = self.component_map()
+            cmap = plt.get_cmap("tab20")
+            node_colors = [cmap(comp[key] % 20) for key in csr.keys]
+            edge_colors = [node_colors[v] if comp[csr.keys[v]] == comp[csr.keys[u]] else 'lightgray' for v, u in edges]
+
+        if file_name is not None:
+            # a figure not managed by pyplot needs no gui backend
+            fig = Figure(figsize=(10, 10))
+        else:
+            fig = plt.figure(figsize=(10, 10))
+        ax = fig.add_subplot()
+        if edges:
+            x1 = [xs[v] for v, _ in edges]
+            y1 = [ys[v] for v, _ in edges]
+            dx = [xs[u] - xs[v] for v, u in edges]
+            dy = [ys[u] - ys[v] for v, u in edges]
+            if arrows:
+                # the arrows stop at the border of the (labeled) target node, so their heads are not hidden
+                r = 0.015 * max(max(xs) - min(xs), max(ys) - min(ys)) if labels else 0
+                for i in range(len(edges)):
+                    length = math.hypot(dx[i], dy[i])
+                    if length > 2 * r:
+                        dx[i] *= 1 - r / length
+                        dy[i] *= 1 - r / length
+                ax.quiver(x1, y1, dx, dy, color=edge_colors, angles='xy', scale_units='xy', scale=1,
+                          width=0.0015, headwidth=5, headlength=8, zorder=1)
+            else:
+                segments = [((xs[v], ys[v]), (xs[u], ys[u])) for v, u in edges]
+                ax.add_collection(LineCollection(segments, colors=edge_colors, linewidths=0.3, zorder=1))
+        size = 200 if labels else max(1.0, 20000 / max(n, 1))
+        ax.scatter(xs, ys, s=size, c=node_colors, edgecolors='black' if labels else 'none', zorder=2)
+        if labels:
+            for key, x, y in zip(csr.keys, xs, ys):
+                ax.text(x, y, str(key), horizontalalignment='center', verticalalignment='center', zorder=3)
+        ax.autoscale_view()
+
+        if file_name is not None:
+            fig.savefig(file_name)
+        else:
+            plt.show()
@@ -0,0 +1,426 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from src.CSRGraph import CSRGraph
+from src.DiGraph import DiGraph
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+_WHITESPACE = " \t\n\r"
+
+
+def iter_json_records(f, chunk_size: int = 1 << 16, keys: set = None):
+    """
+    Streams the records of a graph json file ({"Edges": [...], "Nodes": [...]}) without
+    loading the whole file: the file is read in chunks, and only one record at a time is decoded.
+    :param f: a text file object
+    :param chunk_size: the number of characters read at a time
+    :param keys: if given, every top level key of the file is added to it
+    :return: a generator of (section, record), e.g. ("Nodes", {"id": 0, "pos": "1,2,0"})
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def more() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_ws() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not more():
+                return ""
+
+    def expect(c: str) -> None:
+        nonlocal pos
+        if skip_ws() != c:
+            raise ValueError("Invalid graph json: expected '{}' at offset {}".format(c, pos))
+        pos += 1
+
+    def value():
+        nonlocal pos
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                # a number at the very end of the buffer may continue in the next chunk
+                if end < len(buf) or eof:
+                    pos = end
+                    return obj
+            except json.JSONDecodeError:
+                pass
+            if not more():
+                obj, pos = decoder.raw_decode(buf, pos)
+                return obj
+
+    expect("{")
+    if skip_ws() == "}":
+        return
+    while True:
+        skip_ws()
+        key = value()
+        if keys is not None:
+            keys.add(key)
+        expect(":")
+        if skip_ws() == "[":
+            pos += 1
+            if skip_ws() == "]":
+                pos += 1
+            else:
+                while True:
+                    skip_ws()
+                    yield key, value()
+                    c = skip_ws()
+                    pos += 1
+                    if c == "]":
+                        break
+                    if c != ",":
+                        raise ValueError("Invalid graph json: expected ',' or ']' at offset {}".format(pos - 1))
+        else:
+            value()
+        c = skip_ws()
+        pos += 1
+        if c == "}":
+            return
+        if c != ",":
+            raise ValueError("Invalid graph json: expected ',' or '}}' at offset {}".format(pos - 1))
+
+
+def read_json_graph(f) -> DiGraph:
+    """
+    Builds a graph from a json file, streaming its records into DiGraph.bulk_load.
+    The edges are buffered in flat arrays until all the nodes are known (the edges may come first).
+    :param f: a text file object
+    :return: the new graph
+    """
+    nodes = []
+    srcs, dsts, weights = array('q'), array('q'), array('d')
+    sections = set()
+    for section, record in iter_json_records(f, keys=sections):
+        if section == "Nodes":
+            if "pos" in record:
+                pos = tuple(map(float, str(record["pos"]).split(",")))
+            else:
+                pos = None
+            nodes.append((record["id"], pos))
+        elif section == "Edges":
+            srcs.append(record["src"])
+            dsts.append(record["dest"])
+            weights.append(record["w"])
+    for section in ("Nodes", "Edges"):
+        if section not in sections:
+            raise KeyError(section)
+    g = DiGraph()
+    g.bulk_load(nodes, zip(srcs, dsts, weights))
+    return g
+
+
+def peak_rss_kb() -> int:
+    """
+    :return: the peak resident memory of this process so far (in KB), or -1 if it is unknown
+    """
+    if resource is None:
+        return -1
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def load_json(file_name: str) -> (DiGraph, dict):
+    """
+    Loads a graph from a json file (gzip / xz compressed or not) and measures the load.
+    :param file_name: The path to the json file
+    :return: the graph, and a dictionary of stats: seconds, nodes, edges, records_per_second, peak_rss_kb
+    """
+    start = time.perf_counter()
+    with open_json(file_name) as f:
+        g = read_json_graph(f)
+    seconds = time.perf_counter() - start
+    records = g.v_size() + g.e_size()
+    return g, {"seconds": seconds, "nodes": g.v_size(), "edges": g.e_size(),
+               "records_per_second": records / seconds if seconds > 0 else float("inf"),
+               "peak_rss_kb": peak_rss_kb()}
+
+
+# -----------------------------------------------------------------------------------------
+# ************************************* Binary format *************************************
+# -----------------------------------------------------------------------------------------
+# All the numbers are little endian, every section starts on an 8 bytes boundary:
+#   header       - magic "OOPG", version (u16), flags (u16), |V| (i64), |E| (i64)
+#   keys         - i64[|V|] the node ids, in the order of the dense index
+#   positions    - f64[3|V|] (x, y, z) of every node, only if the FLAG_POSITIONS flag is set
+#   out edges    - offsets i64[|V|+1], targets i32[|E|], weights f64[|E|]
+#   in edges     - offsets i64[|V|+1], targets i32[|E|], weights f64[|E|]
+MAGIC = b"OOPG"
+VERSION = 1
+FLAG_POSITIONS = 1
+_HEADER = struct.Struct("<4sHHqq")
+
+
+class MappedCSRGraph(CSRGraph):
+    """
+    A CSRGraph whose arrays are views over a memory mapped binary graph file (see open_binary).
+    Opening one costs almost nothing, and all the processes mapping the same file share its pages,
+    so it is pickled as its path (and its mc): a worker process receiving it maps the file by itself.
+    """
+
+    __slots__ = ("path", "_mmap")
+
+    def __reduce__(self):
+        return open_binary, (self.path, self.mc)
+
+
+def save_binary(g, file_name: str, fsync: bool = False) -> None:
+    """
+    Writes a graph in the binary format (to a temporary file, renamed over file_name when it's complete).
+    :param g: the graph (anything with a freeze() method)
+    :param file_name: The path to the out file
+    :param fsync: if True, the file and then the rename are forced to the disk before returning
+    """
+    csr = g.freeze()
+    n, m = csr.v_size(), csr.e_size()
+    tmp = file_name + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, FLAG_POSITIONS if csr.has_positions else 0, n, m))
+        _write_array(f, array('q', csr.keys))
+        if csr.has_positions:
+            _write_array(f, array('d', csr.positions))
+        for arrays in ((csr.out_offsets, csr.out_targets, csr.out_weights),
+                       (csr.in_offsets, csr.in_targets, csr.in_weights)):
+            _write_array(f, array('q', arrays[0]))
+            _write_array(f, array('i', arrays[1]))
+            _write_array(f, array('d', arrays[2]))
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, file_name)
+    if fsync:
+        fsync_dir(file_name)
+
+
+def fsync_dir(file_name: str) -> None:
+    """
+    Forces the directory entry of a file to the disk (after it was created or renamed).
+    Not supported (and not needed) on Windows, where it does nothing.
+    :param file_name: The path to the file
+    """
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(file_name)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_array(f, a: array) -> None:
+    if sys.byteorder == "big":
+        a.byteswap()
+    f.write(a.tobytes())
+    pad = -f.tell() % 8
+    f.write(b"\0" * pad)
+
+
+def open_binary(file_name: str, mc: int = 0) -> MappedCSRGraph:
+    """
+    Opens a binary graph file as a frozen graph, by memory mapping it (nothing is copied except the keys).
+    :param file_name: The path to the binary file
+    :param mc: the mc to tag the frozen graph with (the graph it was adopted by may have moved on since it was loaded)
+    :return: a MappedCSRGraph over the file
+    """
+    with open(file_name, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mm) < _HEADER.size:
+        raise ValueError("Not a binary graph file: " + file_name)
+    magic, version, flags, n, m = _HEADER.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a binary graph file: " + file_name)
+    if version != VERSION:
+        raise ValueError("Unsupported binary graph version: {}".format(version))
+    view = memoryview(mm)
+    offset = _HEADER.size
+
+    def section(code: str, count: int):
+        nonlocal offset
+        size = array(code).itemsize * count
+        if offset + size > len(mm):
+            raise ValueError("Truncated binary graph file: " + file_name)
+        a = view[offset:offset + size].cast(code)
+        offset += size + (-size % 8)
+        if sys.byteorder == "big":
+            a = array(code, a)
+            a.byteswap()
+        return a
+
+    keys = section('q', n).tolist()
+    positions = section('d', 3 * n) if flags & FLAG_POSITIONS else None
+    out_edges = section('q', n + 1), section('i', m), section('d', m)
+    in_edges = section('q', n + 1), section('i', m), section('d', m)
+    csr = MappedCSRGraph(keys, mc, *out_edges, *in_edges, positions, bool(flags & FLAG_POSITIONS))
+    csr.path = file_name
+    csr._mmap = mm
+    return csr
+
+
+def read_binary_graph(file_name: str) -> DiGraph:
+    """
+    Loads a binary graph file into a new (mutable) DiGraph, which adopts the memory mapped
+    snapshot as its frozen form, so the algorithms can start right away.
+    :param file_name: The path to the binary file
+    :return: the new graph
+    """
+    return DiGraph.from_csr(open_binary(file_name))
+
+
+def write_json_graph(g, f, compact: bool = True, chunk_records: int = 4096) -> None:
+    """
+    Writes a graph as json ({"Edges": [...], "Nodes": [...]}), streaming the records in chunks,
+    so no dictionary of the whole graph is built.
+    :param g: the graph
+    :param f: a text file object
+    :param compact: no whitespace at all if True, otherwise a record per line
+    :param chunk_records: the number of records formatted before each write
+    """
+    sep, item, colon, nl = (",", ",", ":", "") if compact else (",\n", ", ", ": ", "\n")
+    number = json.JSONEncoder().encode
+    edge_record = ('{"src"' + colon + '%s' + item + '"w"' + colon + '%s' + item + '"dest"' + colon + '%s}').__mod__
+    pos_record = ('{"pos"' + colon + '"%s,%s,%s"' + item + '"id"' + colon + '%s}').__mod__
+    id_record = ('{"id"' + colon + '%s}').__mod__
+
+    def section(name: str, records) -> None:
+        f.write('"{}"{}[{}'.format(name, colon, nl))
+        first = True
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == chunk_records:
+                f.write(("" if first else sep) + sep.join(chunk))
+                first = False
+                chunk.clear()
+        if chunk:
+            f.write(("" if first else sep) + sep.join(chunk))
+        f.write(nl + "]")
+
+    f.write("{" + nl)
+    section("Edges", (edge_record((number(src), number(w), number(dst)))
+                      for src in g.get_all_v().keys()
+                      for dst, w in g.all_out_edges_of_node(src).items()))
+    f.write(sep)
+    section("Nodes", (pos_record((*node.pos, number(node.key)))
+                      if getattr(node, "has_pos", True) and node.pos is not None else id_record(number(node.key))
+                      for node in g.get_all_v().values()))
+    f.write(nl + "}")
+
+
+# the file name suffixes of the compressions supported for json files, and the magic bytes they start with
+COMPRESSIONS = {"gzip": (".gz", b"\x1f\x8b"), "xz": (".xz", b"\xfd7zXZ\x00")}
+
+
+def open_json(file_name: str, mode: str = "r", compression: str = None):
+    """
+    Opens a json graph file as a text file, compressed or not.
+    :param file_name: The path to the file
+    :param mode: "r" to read - the compression is detected by the first bytes of the file,
+    or "w" to write - the compression is given, or else chosen by the suffix of file_name (.gz or .xz)
+    :param compression: None, "gzip" or "xz"
+    :return: a text file object
+    """
+    if mode == "r":
+        with open(file_name, "rb") as f:
+            head = f.read(6)
+        compression = next((c for c, (_, magic) in COMPRESSIONS.items() if head.startswith(magic)), None)
+    elif compression is None:
+        compression = next((c for c, (suffix, _) in COMPRESSIONS.items() if file_name.endswith(suffix)), None)
+    if compression == "gzip":
+        import gzip
+        return gzip.open(file_name, mode + "t", encoding="utf-8")
+    if compression == "xz":
+        import lzma
+        return lzma.open(file_name, mode + "t", encoding="utf-8")
+    if compression is not None:
+        raise ValueError("Unknown compression: " + compression)
+    return open(file_name, mode, encoding="utf-8")
+
+
+def save_json(g, file_name: str, compact: bool = True, compression: str = None) -> None:
+    """
+    Writes a graph as json (to a temporary file, renamed over file_name when it's complete,
+    so a reader never sees a half written graph).
+    :param g: the graph
+    :param file_name: The path to the out file
+    :param compact: see write_json_graph
+    :param compression: None, "gzip" or "xz" (by default chosen by the suffix of file_name)
+    """
+    if compression is None:
+        compression = next((c for c, (suffix, _) in COMPRESSIONS.items() if file_name.endswith(suffix)), None)
+    tmp = file_name + ".tmp"
+    try:
+        with open_json(tmp, "w", compression) as f:
+            write_json_graph(g, f, compact)
+        os.replace(tmp, file_name)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def convert(src: str, dst: str) -> None:
+    """
+    Converts a graph file between the json and the binary formats (by the format of src).
+    :param src: the path of the file to convert
+    :param dst: the path of the converted file
+    """
+    with open(src, "rb") as f:
+        is_binary = f.read(len(MAGIC)) == MAGIC
+    if is_binary:
+        save_json(read_binary_graph(src), dst)
+    else:
+        save_binary(load_json(src)[0], dst)
+
+
+def main(argv: list) -> int:
+    """
+    json <-> binary converter:
+        python -m src.GraphIO json2bin FILE... - writes FILE.bin next to every json FILE
+        python -m src.GraphIO bin2json FILE... - writes FILE.json next to every binary FILE
+    """
+    if len(argv) < 2 or argv[0] not in ("json2bin", "bin2json"):
+        print(main.__doc__)
+        return 2
+    ext = ".bin" if argv[0] == "json2bin" else ".json"
+    for file_name in argv[1:]:
+        start = time.perf_counter()
+        convert(file_name, file_name + ext)
+        print("{} -> {} ({:.3f}s)".format(file_name, file_name + ext, time.perf_counter() - start))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
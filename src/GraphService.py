@@ -0,0 +1,423 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+
+An asyncio query service over a graph loaded by GraphAlgo.load_from_json.
+The protocol is json lines over TCP: every request is a json object on its own line, e.g.
+    {"id": 1, "op": "shortest_path", "src": 0, "dst": 7}
+    {"id": 2, "op": "connected_component", "node": 3}
+    {"id": 3, "op": "connected_components"}
+    {"id": 4, "op": "stats"}
+and every response is a json line carrying the same id, with a "result" or an "error".
+The requests of a connection are served concurrently, so the responses may come out of order.
+
+usage:
+    python -m src.GraphService serve data/G_10000_80000_0.json [--port 8765] [--workers 4]
+    python -m src.GraphService load [--port 8765] [--requests 10000] [--concurrency 64]
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.CSRGraph import CSRGraph
+from src.GraphAlgo import GraphAlgo
+from src.PathCache import PathCache
+from src.SCC import tarjan
+
+# the frozen graph and the search trees cache of a worker process, set once by the pool initializer
+_csr = None
+_cache = None
+
+
+def _init_worker(csr: CSRGraph) -> None:
+    global _csr, _cache
+    _csr = csr
+    _cache = PathCache()
+
+
+def _solve_in_worker(groups: list) -> list:
+    """
+    Answers the shortest path queries of the given groups, one search per source (see PathCache).
+    :param groups: a list of (src, [dst1, dst2, ...]) keys
+    :return: a list of (dist, path) per destination, in the order of the groups, None if a node does not exist
+    """
+    index = _csr.index
+    results = []
+    for src, dsts in groups:
+        for dst in dsts:
+            if src not in index or dst not in index:
+                results.append(None)
+            else:
+                results.append(_cache.shortest_path(_csr, index[src], index[dst]))
+    return results
+
+
+def _components_in_worker() -> list:
+    comp, count = tarjan(_csr)
+    sccs = [[] for _ in range(count)]
+    for key, c in zip(_csr.keys, comp):
+        sccs[count - 1 - c].append(key)
+    return sccs
+
+
+class LatencyHistogram(object):
+    """
+    The latencies of one endpoint, counted in buckets growing by powers of 2 (from 50 microseconds),
+    so the memory is fixed however many requests are served.
+    """
+
+    BOUNDS = [0.00005 * 2 ** i for i in range(20)]
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p: float) -> float:
+        """
+        :return: the upper bound of the bucket holding the p-th percentile (the max for the last bucket)
+        """
+        if self.count == 0:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self.BOUNDS[i], self.max) if i < len(self.BOUNDS) else self.max
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {"count": self.count, "mean": self.total / self.count if self.count else 0.0, "max": self.max,
+                "p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99),
+                "buckets": {"<={:g}ms".format(b * 1000): c for b, c in zip(self.BOUNDS, self.counts) if c}}
+
+
+class GraphService(object):
+    """
+    Serves the queries of a graph over TCP (see the module docstring for the protocol).
+        - identical requests in flight share a single computation (coalescing)
+        - shortest path queries arriving within batch_window seconds are grouped by source,
+          so each source needs a single (resumed) Dijkstra search
+        - all the searches run in a pool of worker processes holding a frozen copy of the graph,
+          so the event loop only parses and routes requests and stays responsive
+        - the latency of every endpoint is kept in a histogram (the "stats" op)
+    The graph is served as it was when the service started.
+    """
+
+    OPS = ("shortest_path", "connected_component", "connected_components", "stats")
+
+    def __init__(self, ga: GraphAlgo, workers: int = None, batch_window: float = 0.002):
+        self.csr = ga.get_graph().freeze()
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_window = batch_window
+        self.latency = {op: LatencyHistogram() for op in self.OPS}
+        self.coalesced = 0
+        self.batches = 0
+        self._pool = None
+        self._server = None
+        self._inflight = {}
+        self._pending = {}
+        self._flush = None
+        self._sccs = None
+        self._connections = {}
+
+    @classmethod
+    def from_json(cls, file_name: str, **kwargs) -> "GraphService":
+        """
+        :param file_name: the path of a json graph file (see GraphAlgo.load_from_json)
+        :return: a service over the loaded graph
+        """
+        ga = GraphAlgo()
+        if not ga.load_from_json(file_name):
+            raise ValueError("Cannot load the graph: " + file_name)
+        return cls(ga, **kwargs)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """
+        Starts the worker pool and listens for connections.
+        :return: the port listened on (useful with port=0, any free port)
+        """
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.csr,))
+        self._server = await asyncio.start_server(self._serve_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        """
+        Stops listening, closes the open connections (their handlers end as on a client disconnect)
+        and shuts the worker pool down.
+        """
+        if self._server is not None:
+            self._server.close()
+            for writer in self._connections.values():
+                writer.close()
+            if self._connections:
+                await asyncio.wait(list(self._connections))
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8765) -> None:
+        port = await self.start(host, port)
+        print("serving |V|={} |E|={} on {}:{}".format(self.csr.v_size(), self.csr.e_size(), host, port))
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    # -----------------------------------------------------------------------------------------
+    # ************************************** Requests *****************************************
+    # -----------------------------------------------------------------------------------------
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        tasks = set()
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(self._answer(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            del self._connections[asyncio.current_task()]
+
+    async def _answer(self, line: bytes, writer: asyncio.StreamWriter) -> None:
+        start = time.perf_counter()
+        request_id = None
+        op = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            op = request.get("op")
+            response = {"id": request_id, "result": await self.query(op, request)}
+        except Exception as e:
+            response = {"id": request_id, "error": "{}: {}".format(type(e).__name__, e)}
+        if op in self.latency:
+            self.latency[op].add(time.perf_counter() - start)
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+
+    async def query(self, op: str, request: dict):
+        """
+        Answers a single request (also usable in process, without the TCP layer).
+        :param op: the name of the operation
+        :param request: the arguments of the operation
+        :return: the json friendly result:
+            shortest_path        - {"dist": the distance (None if there is no path), "path": [keys]},
+                                   None if one of the nodes does not exist
+            connected_component  - [keys]
+            connected_components - [[keys], ...]
+            stats                - the latency histograms and the counters of the service
+        """
+        if op == "shortest_path":
+            result = await self.shortest_path(request["src"], request["dst"])
+            if result is None:
+                return None
+            return {"dist": None if result[0] == math.inf else result[0], "path": result[1]}
+        if op == "connected_component":
+            return await self.connected_component(request["node"])
+        if op == "connected_components":
+            return await self.connected_components()
+        if op == "stats":
+            return self.stats()
+        raise ValueError("Unknown op: {}".format(op))
+
+    def _coalesce(self, key: tuple):
+        """
+        :return: the future of an identical request in flight (counted as coalesced), or None
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        return future
+
+    def _track(self, key: tuple, future: asyncio.Future) -> asyncio.Future:
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return future
+
+    async def shortest_path(self, src: int, dst: int) -> (float, list):
+        """
+        :return: the distance and the path from src to dst, computed in a batch with the other queries
+        of the same source (see _dispatch), None if one of the nodes does not exist
+        """
+        key = ("shortest_path", src, dst)
+        future = self._coalesce(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._track(key, loop.create_future())
+            self._pending.setdefault(src, {})[dst] = future
+            if self._flush is None:
+                self._flush = loop.call_later(self.batch_window, self._dispatch)
+        return await asyncio.shield(future)
+
+    def _dispatch(self) -> None:
+        """
+        Sends the pending shortest path queries to the workers, grouped by source:
+        the groups are split into one chunk per worker.
+        """
+        self._flush = None
+        pending, self._pending = self._pending, {}
+        groups = [(src, list(dsts.items())) for src, dsts in pending.items()]
+        size = max(1, math.ceil(len(groups) / self.workers))
+        for i in range(0, len(groups), size):
+            self.batches += 1
+            asyncio.ensure_future(self._run_batch(groups[i:i + size]))
+
+    async def _run_batch(self, groups: list) -> None:
+        futures = [future for _, dsts in groups for _, future in dsts]
+        try:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(
+                self._pool, _solve_in_worker, [(src, [dst for dst, _ in dsts]) for src, dsts in groups])
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def connected_components(self) -> list:
+        """
+        :return: all the SCCs of the graph, computed (once) by a worker
+        """
+        if self._sccs is None:
+            key = ("connected_components",)
+            future = self._coalesce(key)
+            if future is None:
+                loop = asyncio.get_running_loop()
+                future = self._track(key, loop.run_in_executor(self._pool, _components_in_worker))
+            sccs = await asyncio.shield(future)
+            self._sccs = (sccs, {k: c for c, scc in enumerate(sccs) for k in scc})
+        return self._sccs[0]
+
+    async def connected_component(self, node: int) -> list:
+        """
+        :return: the SCC of the node (taken from all the SCCs), [] if there is no such node
+        """
+        await self.connected_components()
+        c = self._sccs[1].get(node)
+        return [] if c is None else self._sccs[0][c]
+
+    def stats(self) -> dict:
+        """
+        :return: the latency histogram of every endpoint, and the number of coalesced requests and batches
+        """
+        return {"latency": {op: h.as_dict() for op, h in self.latency.items() if h.count},
+                "coalesced": self.coalesced, "batches": self.batches, "workers": self.workers}
+
+
+# -----------------------------------------------------------------------------------------
+# ************************************ Load test client ***********************************
+# -----------------------------------------------------------------------------------------
+async def load_test(host: str, port: int, nodes: list, requests: int = 1000, concurrency: int = 32,
+                    seed: int = 0, mix: dict = None, sources: int = None) -> dict:
+    """
+    Drives a running service with concurrent clients, each on its own connection with one request in flight.
+    :param host: the host of the service
+    :param port: the port of the service
+    :param nodes: the node keys to draw the queries from
+    :param requests: the total number of requests
+    :param concurrency: the number of concurrent clients
+    :param seed: the random seed of the queries
+    :param mix: the share of every op, by default {"shortest_path": 0.9, "connected_component": 0.1}
+    :param sources: if given, the shortest path queries start from only that many (random) nodes,
+    like the popular origins of real traffic
+    :return: the number of requests and errors, the wall time, the throughput and the client side latency histogram
+    """
+    mix = mix or {"shortest_path": 0.9, "connected_component": 0.1}
+    rnd = random.Random(seed)
+    ops = rnd.choices(list(mix), weights=list(mix.values()), k=requests)
+    origins = rnd.sample(nodes, min(sources, len(nodes))) if sources else nodes
+    queries = [{"id": i, "op": op, "src": rnd.choice(origins), "dst": rnd.choice(nodes), "node": rnd.choice(nodes)}
+               for i, op in enumerate(ops)]
+    histogram = LatencyHistogram()
+    errors = 0
+
+    async def client(share: list) -> None:
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for query in share:
+                start = time.perf_counter()
+                writer.write(json.dumps(query).encode() + b"\n")
+                await writer.drain()
+                response = json.loads(await reader.readline())
+                histogram.add(time.perf_counter() - start)
+                if "error" in response:
+                    errors += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(queries[i::concurrency]) for i in range(concurrency)])
+    seconds = time.perf_counter() - start
+    return {"requests": requests, "errors": errors, "seconds": seconds,
+            "requests_per_second": requests / seconds if seconds > 0 else float("inf"),
+            "latency": histogram.as_dict()}
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description="graph query service")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="serve a json graph file")
+    serve.add_argument("file")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--workers", type=int)
+    serve.add_argument("--batch-window", type=float, default=0.002, help="seconds to wait for queries to batch")
+    load = sub.add_parser("load", help="load test a running service")
+    load.add_argument("--host", default="127.0.0.1")
+    load.add_argument("--port", type=int, default=8765)
+    load.add_argument("--nodes", type=int, default=1000, help="draw the queries from the nodes 0 .. nodes-1")
+    load.add_argument("--requests", type=int, default=10000)
+    load.add_argument("--concurrency", type=int, default=64)
+    load.add_argument("--sources", type=int, help="draw the shortest path sources from only that many nodes")
+    load.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        service = GraphService.from_json(args.file, workers=args.workers, batch_window=args.batch_window)
+        try:
+            asyncio.run(service.serve_forever(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    result = asyncio.run(load_test(args.host, args.port, list(range(args.nodes)), args.requests,
+                                   args.concurrency, args.seed, sources=args.sources))
+    print(json.dumps(result, indent=2))
+    return 1 if result["errors"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
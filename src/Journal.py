@@ -0,0 +1,292 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import os
+import struct
+import zlib
+from itertools import islice
+
+from src.DiGraph import DiGraph
+from src.GraphIO import fsync_dir, read_binary_graph, save_binary
+
+# -----------------------------------------------------------------------------------------
+# ************************************ Journal format *************************************
+# -----------------------------------------------------------------------------------------
+# A journaled graph is kept in two files:
+#   PATH          - the last checkpoint, a binary graph file (see GraphIO.save_binary)
+#   PATH.journal  - the changes made since that checkpoint, appended as they happen:
+#       header  - magic "OOJL", version (u16), reserved (u16), crc32 of the checkpoint file it follows (u32),
+#                 the mc of the graph in the checkpoint (i64)
+#       records - crc32 of the rest of the record (u32), op (u8), the mc the change brought the graph to (i64),
+#                 and the arguments of the op (all little endian):
+#           add_node    - key (i64), has_pos (u8), x, y, z (f64)
+#           remove_node - key (i64)
+#           add_edge    - src (i64), dst (i64), w (f64)
+#           remove_edge - src (i64), dst (i64)
+#           update_edge_weight - src (i64), dst (i64), w (f64)
+#           batch       - the number of records that follow (i64)
+# A batch change (remove_nodes / remove_edges) of more than one item is a batch record followed by
+# a record per item, all of them with the mc of the change. Every change takes the next mc,
+# so replaying checks that the changes follow each other with no gap and no repetition.
+# Replaying stops at the first record that is cut short or fails its checksum (a write torn by a crash),
+# or at a batch missing some of its records, and the journal is truncated there, so a recovery
+# always ends in a state the graph was in.
+MAGIC = b"OOJL"
+VERSION = 3
+_HEADER = struct.Struct("<4sHHIq")
+# the ops a batch change is recorded as, and the DiGraph calls that replay the batch at once
+_BATCHES = {"remove_node": "remove_nodes", "remove_edge": "remove_edges"}
+_CRC = struct.Struct("<I")
+_OPS = {
+    "add_node": (1, struct.Struct("<Bqq B ddd")),
+    "remove_node": (2, struct.Struct("<Bqq")),
+    "add_edge": (3, struct.Struct("<Bqqqd")),
+    "remove_edge": (4, struct.Struct("<Bqqq")),
+    "update_edge_weight": (5, struct.Struct("<Bqqqd")),
+    "batch": (6, struct.Struct("<Bqq")),
+}
+_BY_CODE = {code: (op, record) for op, (code, record) in _OPS.items()}
+
+
+def file_crc(file_name: str) -> int:
+    """
+    :return: the crc32 of a whole file (0 if it does not exist)
+    """
+    if not os.path.exists(file_name):
+        return 0
+    crc = 0
+    with open(file_name, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def encode(mc: int, op: str, args: tuple) -> bytes:
+    """
+    :return: a journal record of a change (as passed to DiGraph._record)
+    """
+    code, record = _OPS[op]
+    if op == "add_node":
+        key, pos = args
+        x, y, z = (tuple(pos) + (0.0, 0.0, 0.0))[:3] if pos is not None else (0.0, 0.0, 0.0)
+        payload = record.pack(code, mc, key, pos is not None, x, y, z)
+    else:
+        payload = record.pack(code, mc, *args)
+    return _CRC.pack(zlib.crc32(payload)) + payload
+
+
+def read_records(f):
+    """
+    Reads the records of a journal file, right after its header.
+    :param f: a binary file object
+    :return: a generator of (offset after the record, mc, op, args), up to the first torn or corrupted record
+    """
+    while True:
+        head = f.read(_CRC.size + 1)
+        if len(head) < _CRC.size + 1 or head[-1] not in _BY_CODE:
+            return
+        op, record = _BY_CODE[head[-1]]
+        payload = head[-1:] + f.read(record.size - 1)
+        if len(payload) < record.size or zlib.crc32(payload) != _CRC.unpack_from(head)[0]:
+            return
+        fields = record.unpack(payload)
+        if op == "add_node":
+            args = (fields[2], fields[4:] if fields[3] else None)
+        else:
+            args = fields[2:]
+        yield f.tell(), fields[1], op, args
+
+
+class Journal(object):
+    """
+    An append-only, checksummed log of the changes of a DiGraph on top of a full checkpoint of it
+    (see the format above). While attached to a graph (DiGraph.journal), every change is appended as it
+    happens, so persisting costs in proportion to the changes and not to the size of the graph.
+    compact() folds the journal back into a new checkpoint; it runs by itself once the journal grows
+    past compact_ratio times the size of the checkpoint, so a recovery never replays more than that.
+    """
+
+    def __init__(self, path: str, g: DiGraph, fsync: bool = False, compact_ratio: float = 1.0):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.graph = g
+        self.fsync = fsync
+        self.compact_ratio = compact_ratio
+        self.records = 0
+        self._f = None
+        self._size = 0
+        self._checkpoint_size = 0
+        # the mc written to the journal minus the mc of the graph (a recovered graph starts counting over)
+        self._mc_offset = 0
+
+    @classmethod
+    def open(cls, path: str, fsync: bool = False, compact_ratio: float = 1.0) -> DiGraph:
+        """
+        Recovers a journaled graph: loads the last checkpoint and replays the journal after it,
+        then keeps journaling the changes of the returned graph.
+        If the journal does not follow this checkpoint (a crash in the middle of a compaction, right after
+        the new checkpoint was written), all its changes are already in the checkpoint, and it is dropped.
+        A new (empty) journaled graph is started if there are no files yet.
+        The records are replayed change by change (a batch through the same batch call), and every change
+        must bring the graph to the mc of its records, so a missing, repeated or diverging change is detected.
+        :param path: the path of the checkpoint (the journal is PATH.journal)
+        :param fsync: if True, every change is forced to the disk before the change returns
+        :param compact_ratio: compact when the journal is larger than the checkpoint times this (None - never)
+        :return: the recovered graph, with the journal attached (g.journal)
+        Raises ValueError if the records of the journal are out of sequence.
+        """
+        g = read_binary_graph(path) if os.path.exists(path) else DiGraph()
+        journal = cls(path, g, fsync, compact_ratio)
+        crc = file_crc(path)
+        journal._checkpoint_size = os.path.getsize(path) if os.path.exists(path) else 0
+        end = 0
+        if os.path.exists(journal.journal_path):
+            with open(journal.journal_path, "rb") as f:
+                header = f.read(_HEADER.size)
+                header = _HEADER.unpack(header) if len(header) == _HEADER.size else None
+                if header is not None and header[:4] == (MAGIC, VERSION, 0, crc):
+                    end = _HEADER.size
+                    journal._mc_offset = header[4] - g.get_mc()
+                    records = read_records(f)
+                    for change_end, mc, op, args in records:
+                        if op == "batch":
+                            change = list(islice(records, args[0]))
+                            if len(change) < args[0]:
+                                # torn in the middle, the batch is dropped as a whole
+                                break
+                            if any(r[1] != mc or r[2] != change[0][2] for r in change):
+                                raise ValueError("Journal batch with mixed records at mc {}".format(mc))
+                            change_end, op = change[-1][0], change[0][2]
+                            args = [r[3] for r in change]
+                        else:
+                            args = [args]
+                        journal._replay(mc, op, args)
+                        end = change_end
+                        journal.records += len(args)
+        if end == 0:
+            journal._reset(crc)
+        else:
+            # drop a torn tail, the next records go right after the last good one
+            with open(journal.journal_path, "r+b") as f:
+                f.truncate(end)
+            journal._size = end
+        journal._f = open(journal.journal_path, "ab")
+        g.journal = journal
+        return g
+
+    def _replay(self, mc: int, op: str, args: list) -> None:
+        """
+        Applies the records of a single change to the graph, and checks it brought the graph to their mc.
+        """
+        g = self.graph
+        if mc != g.get_mc() + self._mc_offset + 1:
+            raise ValueError("Journal record out of sequence: mc {} after {}".format(mc, g.get_mc() + self._mc_offset))
+        if len(args) > 1 and op not in _BATCHES:
+            raise ValueError("Journal batch of {} records at mc {}".format(op, mc))
+        if op in _BATCHES:
+            items = [a[0] for a in args] if op == "remove_node" else args
+            applied = getattr(g, _BATCHES[op])(items) == len(args)
+        else:
+            applied = len(args) == 1 and getattr(g, op)(*args[0])
+        if not applied or g.get_mc() + self._mc_offset != mc:
+            raise ValueError("Journal record does not apply to the graph: {} at mc {}".format(op, mc))
+
+    @classmethod
+    def create(cls, g: DiGraph, path: str, fsync: bool = False, compact_ratio: float = 1.0) -> "Journal":
+        """
+        Starts journaling an existing graph: writes its first checkpoint and an empty journal.
+        :param g: the graph
+        :param path: the path of the checkpoint (the journal is PATH.journal)
+        :return: the journal, attached to g
+        """
+        journal = cls(path, g, fsync, compact_ratio)
+        journal.compact()
+        g.journal = journal
+        return journal
+
+    def append(self, mc: int, op: str, args: tuple) -> None:
+        """
+        Appends a change of the graph (called by DiGraph._record).
+        """
+        self._write(encode(mc + self._mc_offset, op, args), 1)
+
+    def append_batch(self, mc: int, op: str, batch: list) -> None:
+        """
+        Appends a batch change of the graph, a record per item (called by DiGraph._record_batch).
+        The whole batch is written at once, and only then the journal may be compacted.
+        """
+        if len(batch) == 1:
+            self.append(mc, op, batch[0])
+            return
+        mc += self._mc_offset
+        data = encode(mc, "batch", (len(batch),)) + b"".join(encode(mc, op, args) for args in batch)
+        self._write(data, len(batch))
+
+    def _write(self, data: bytes, records: int) -> None:
+        self._f.write(data)
+        self._f.flush()
+        if self.fsync:
+            os.fsync(self._f.fileno())
+        self._size += len(data)
+        self.records += records
+        if self.compact_ratio is not None and self._size > self.compact_ratio * max(self._checkpoint_size, 1 << 16):
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Writes a new checkpoint of the graph and starts a new empty journal after it.
+        Both files are replaced atomically, the checkpoint first, so a crash at any point leaves
+        either the old checkpoint with the whole journal, or the new checkpoint (see open).
+        With fsync, the new checkpoint is on the disk before the old journal is replaced.
+        """
+        if self._f is not None:
+            self._f.close()
+        save_binary(self.graph, self.path, self.fsync)
+        self._checkpoint_size = os.path.getsize(self.path)
+        self._reset(file_crc(self.path))
+        self._f = open(self.journal_path, "ab")
+
+    def _reset(self, crc: int) -> None:
+        tmp = self.journal_path + ".tmp"
+        self._mc_offset = 0
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, 0, crc, self.graph.get_mc()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal_path)
+        if self.fsync:
+            fsync_dir(self.journal_path)
+        self._size = _HEADER.size
+        self.records = 0
+
+    def sync(self) -> None:
+        """
+        Forces the journal to the disk.
+        """
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self) -> None:
+        """
+        Closes the journal file and detaches it from the graph (the changes are no longer recorded).
+        """
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        if self.graph.journal is self:
+            self.graph.journal = None
+
+    def size_bytes(self) -> int:
+        """
+        :return: the size of the journal file
+        """
+        return self._size
+
+    def __repr__(self):
+        return "Journal {} , {} records , {} bytes".format(self.journal_path, self.records, self._size)
@@ -0,0 +1,244 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import heapq
+import itertools
+import math
+import random
+from array import array
+
+from src.CSRGraph import CSRGraph
+
+
+def distances(offsets, targets, weights, src: int, n: int) -> array:
+    """
+    A full Dijkstra from src over one direction of a frozen graph.
+    :return: the distances of all the n nodes (inf where unreachable)
+    """
+    dist = array('d', [math.inf]) * n
+    dist[src] = 0
+    q = [(0, src)]
+    while q:
+        dv, v = heapq.heappop(q)
+        if dv > dist[v]:
+            continue
+        for j in range(offsets[v], offsets[v + 1]):
+            u = targets[j]
+            if dist[u] > dv + weights[j]:
+                dist[u] = dv + weights[j]
+                heapq.heappush(q, (dv + weights[j], u))
+    return dist
+
+
+class LandmarkIndex(object):
+    """
+    An ALT (A*, Landmarks, Triangle inequality) index of a frozen graph: the distances from and to
+    a few landmark nodes, which give a lower bound of the distance between any two nodes:
+        d(v, t) >= d(L, t) - d(L, v)   and   d(v, t) >= d(v, L) - d(t, L)
+    The bound needs no coordinates, so it guides A* on graphs without meaningful positions.
+    Unreachable landmarks are handled by the same inequalities: if L reaches v but not t
+    (or t reaches L but v does not), there is no path from v to t at all, and v is pruned.
+    The distances are kept in two flat arrays of k * |V| numbers ("d" - 8 bytes or "f" - 4 bytes each).
+    More info:
+    https://en.wikipedia.org/wiki/A*_search_algorithm#Bounded_relaxation
+    """
+
+    __slots__ = ("landmarks", "n", "mc", "dist_from", "dist_to", "slack")
+
+    # the number of landmarks used by a single query (the ones giving the best bound at the source)
+    ACTIVE = 4
+
+    def __init__(self, landmarks: list, n: int, mc: int, dist_from: array, dist_to: array):
+        self.landmarks = landmarks
+        self.n = n
+        self.mc = mc
+        self.dist_from = dist_from
+        self.dist_to = dist_to
+        # float32 distances are rounded, so the bounds (from either array) are lowered by the largest
+        # possible rounding error
+        finite = [d for d in itertools.chain(dist_from, dist_to) if d != math.inf]
+        self.slack = 4 * max(finite, default=0) * 2 ** -24 if dist_from.typecode == 'f' else 0
+
+    @classmethod
+    def build(cls, csr: CSRGraph, k: int = 8, selection: str = "farthest", seed: int = 0,
+              typecode: str = 'd', max_bytes: int = None, components: list = None) -> "LandmarkIndex":
+        """
+        Selects k landmarks and computes the distances from and to each of them.
+        :param csr: the frozen graph
+        :param k: the number of landmarks
+        :param selection: "farthest" - every next landmark is the node farthest (round trip) from the ones
+                          already selected, nodes of large components no landmark can reach come first
+                          "random" - k random nodes
+        :param seed: the random seed
+        :param typecode: 'd' (float64) or 'f' (float32, half the memory) for the stored distances
+        :param max_bytes: if given, k is lowered so the distances fit in that much memory
+        :param components: the strongly connected components of the graph (lists of keys), used by "farthest"
+        to spread the landmarks over the large components
+        :return: the index, tagged with the mc of csr
+        """
+        if selection not in ("farthest", "random"):
+            raise ValueError("Unknown landmark selection: " + selection)
+        n = csr.v_size()
+        if max_bytes is not None:
+            k = min(k, max_bytes // max(1, 2 * n * array(typecode).itemsize))
+        k = max(0, min(k, n))
+        rnd = random.Random(seed)
+        out_edges = (csr.out_offsets, csr.out_targets, csr.out_weights)
+        in_edges = (csr.in_offsets, csr.in_targets, csr.in_weights)
+
+        comp_size = None
+        if components is not None:
+            comp_size = [0] * n
+            for scc in components:
+                for key in scc:
+                    comp_size[csr.index[key]] = len(scc)
+
+        landmarks, dist_from, dist_to = [], array(typecode), array(typecode)
+        score = [math.inf] * n
+        for _ in range(k):
+            if selection == "random" or not landmarks:
+                candidates = [v for v in range(n) if v not in landmarks]
+                if comp_size is not None and selection == "farthest":
+                    largest = max(comp_size[v] for v in candidates)
+                    candidates = [v for v in candidates if comp_size[v] == largest]
+                v = rnd.choice(candidates)
+            else:
+                v = cls._farthest(score, comp_size, landmarks, n, k)
+            landmarks.append(v)
+            d_from = distances(*out_edges, v, n)
+            d_to = distances(*in_edges, v, n)
+            for u in range(n):
+                score[u] = min(score[u], d_from[u] + d_to[u])
+            dist_from.extend(array(typecode, d_from))
+            dist_to.extend(array(typecode, d_to))
+        return cls(landmarks, n, csr.mc, dist_from, dist_to)
+
+    @staticmethod
+    def _farthest(score: list, comp_size: list, landmarks: list, n: int, k: int) -> int:
+        """
+        :return: the next landmark - a node of the largest component no landmark reaches (if it is large
+        enough to be worth one: at least |V| / 4k nodes), or else the node farthest from the landmarks
+        """
+        if comp_size is not None:
+            uncovered = max(((comp_size[v], -v) for v in range(n) if score[v] == math.inf), default=None)
+            if uncovered is not None and uncovered[0] * 4 * k >= n:
+                return -uncovered[1]
+        chosen = set(landmarks)
+        return max((v for v in range(n) if v not in chosen),
+                   key=lambda v: (score[v] != math.inf, score[v] if score[v] != math.inf else 0))
+
+    def k(self) -> int:
+        """
+        :return: the number of landmarks
+        """
+        return len(self.landmarks)
+
+    def size_bytes(self) -> int:
+        """
+        :return: the memory held by the distance arrays
+        """
+        return (len(self.dist_from) + len(self.dist_to)) * self.dist_from.itemsize
+
+    def lower_bound(self, v: int, t: int) -> float:
+        """
+        :return: a lower bound of the distance from v to t (dense indexes) by all the landmarks,
+        inf if there is surely no path from v to t
+        """
+        return self._bound(v, self._active(t, len(self.landmarks)))
+
+    def _active(self, t: int, count: int) -> list:
+        """
+        :return: (base, d(L, t), d(t, L)) of count landmarks, for the bounds towards t
+        """
+        n, F, T = self.n, self.dist_from, self.dist_to
+        return [(i * n, F[i * n + t], T[i * n + t]) for i in range(min(count, len(self.landmarks)))]
+
+    def _bound(self, v: int, active: list) -> float:
+        F, T = self.dist_from, self.dist_to
+        best = 0
+        for base, lt, tl in active:
+            lv = F[base + v]
+            if lv != math.inf:
+                if lt == math.inf:
+                    return math.inf
+                if lt - lv > best:
+                    best = lt - lv
+            if tl != math.inf:
+                vl = T[base + v]
+                if vl == math.inf:
+                    return math.inf
+                if vl - tl > best:
+                    best = vl - tl
+        return best - self.slack if best > self.slack else 0
+
+    def __repr__(self):
+        return "LandmarkIndex k={} , |V|={} , {} bytes , MC={}".format(self.k(), self.n, self.size_bytes(), self.mc)
+
+
+def alt_search(csr: CSRGraph, lm: LandmarkIndex, src: int, dst: int, stats=None) -> (float, list, int):
+    """
+    A* search from src to dst guided by the landmarks lower bounds. Only the ACTIVE landmarks giving
+    the best bound from src are used. A node is reopened if it is reached shorter after it was expanded,
+    so the result is exact even if rounded (float32) bounds are not perfectly consistent.
+    :param csr: the frozen graph
+    :param lm: the landmark index of csr
+    :param src: the dense index of the source
+    :param dst: the dense index of the destination
+    :param stats: an optional SearchStats to add the heap counters of the search to
+    :return: the distance, the list of the nodes keys on the path, and the number of expanded nodes
+    """
+    if lm.lower_bound(src, dst) == math.inf:
+        return math.inf, [], 0
+    all_active = lm._active(dst, len(lm.landmarks))
+    if len(all_active) > lm.ACTIVE:
+        all_active.sort(key=lambda a: -lm._bound(src, [a]))
+    active = all_active[:lm.ACTIVE]
+    offsets, targets, weights = csr.out_offsets, csr.out_targets, csr.out_weights
+    bound = lm._bound
+    dist = {src: 0}
+    prev = {src: -1}
+    hs = {}
+    q = [(bound(src, active), 0, src)]
+    pops = pushes = expanded = scanned = 0
+    found = False
+    while q:
+        _, dv, v = heapq.heappop(q)
+        pops += 1
+        if dv > dist[v]:
+            continue
+        if v == dst:
+            found = True
+            break
+        expanded += 1
+        scanned += offsets[v + 1] - offsets[v]
+        for j in range(offsets[v], offsets[v + 1]):
+            u = targets[j]
+            du = dv + weights[j]
+            if du < dist.get(u, math.inf):
+                h = hs.get(u)
+                if h is None:
+                    h = hs[u] = bound(u, active)
+                if h == math.inf:
+                    continue
+                dist[u] = du
+                prev[u] = v
+                heapq.heappush(q, (du + h, du, u))
+                pushes += 1
+
+    if stats is not None:
+        stats.add_search(pops, pushes, expanded, scanned)
+    if not found:
+        return math.inf, [], expanded
+    path = []
+    v = dst
+    while v != -1:
+        path.append(csr.keys[v])
+        v = prev[v]
+    path.reverse()
+    return dist[dst], path, expanded
@@ -0,0 +1,202 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import cProfile
+import functools
+import io
+import json
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+
+class SearchStats(object):
+    """
+    The counters of a single instrumented call, filled in by the searches it runs.
+    """
+
+    __slots__ = ("pushes", "pops", "stale_pops", "relaxations", "settled", "frontiers", "seconds")
+
+    def __init__(self):
+        self.pushes = 0
+        self.pops = 0
+        self.stale_pops = 0
+        self.relaxations = 0
+        self.settled = 0
+        self.frontiers = []
+        self.seconds = 0.0
+
+    def add_search(self, pops: int, pushes: int, settled: int, relaxations: int) -> None:
+        """
+        Adds the counters of a heap search. Every pop that does not settle a new node is a stale entry.
+        :param pops: the number of heap pops
+        :param pushes: the number of heap pushes (the relaxations that improved a distance)
+        :param settled: the number of newly settled nodes
+        :param relaxations: the number of edges scanned from the settled nodes
+        """
+        self.pops += pops
+        self.pushes += pushes
+        self.relaxations += relaxations
+        self.settled += settled
+        self.stale_pops += pops - settled
+
+    def as_dict(self) -> dict:
+        return {"seconds": self.seconds, "pushes": self.pushes, "pops": self.pops,
+                "stale_pops": self.stale_pops, "relaxations": self.relaxations,
+                "settled": self.settled, "frontiers": list(self.frontiers)}
+
+
+class Metrics(object):
+    """
+    Collects the counters and the wall time of the instrumented GraphAlgo calls,
+    aggregated per operation (see snapshot) and kept for the last keep_calls calls (see calls).
+    With profile=True, every call also runs under cProfile and tracemalloc, and a report
+    per operation is available from report().
+    """
+
+    COUNTERS = ("pushes", "pops", "stale_pops", "relaxations", "settled")
+
+    def __init__(self, profile: bool = False, keep_calls: int = 1000):
+        self.profile = profile
+        self.calls = deque(maxlen=keep_calls)
+        self.ops = {}
+        self._profiles = {}
+        self._peaks = {}
+
+    @contextmanager
+    def call(self, name: str):
+        """
+        Measures one call of the operation name.
+        :param name: the name of the operation
+        :return: a context manager giving the SearchStats of the call
+        """
+        stats = SearchStats()
+        profiler = None
+        if self.profile:
+            profiler = cProfile.Profile()
+            tracing = tracemalloc.is_tracing()
+            if not tracing:
+                tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                peak = tracemalloc.get_traced_memory()[1] - base
+                if not tracing:
+                    tracemalloc.stop()
+                self._add_profile(name, profiler, peak)
+            self._add(name, stats)
+
+    def _add(self, name: str, stats: SearchStats) -> None:
+        op = self.ops.get(name)
+        if op is None:
+            op = self.ops[name] = dict({"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "max_frontier": 0},
+                                       **{c: 0 for c in self.COUNTERS})
+        op["calls"] += 1
+        op["seconds"] += stats.seconds
+        op["max_seconds"] = max(op["max_seconds"], stats.seconds)
+        op["max_frontier"] = max([op["max_frontier"]] + stats.frontiers)
+        for c in self.COUNTERS:
+            op[c] += getattr(stats, c)
+        self.calls.append((name, stats.as_dict()))
+
+    def _add_profile(self, name: str, profiler: cProfile.Profile, peak: int) -> None:
+        if name in self._profiles:
+            self._profiles[name].add(profiler)
+        else:
+            import pstats  # only profiled runs need it, and it costs a good part of the import time
+            self._profiles[name] = pstats.Stats(profiler)
+        self._peaks[name] = max(self._peaks.get(name, 0), peak)
+
+    def snapshot(self) -> dict:
+        """
+        :return: the aggregated counters of every operation: {name: {"calls", "seconds", "max_seconds", ...}}
+        """
+        return {name: dict(op) for name, op in self.ops.items()}
+
+    def dump(self, f) -> None:
+        """
+        Writes the aggregated counters and the recent calls as json.
+        :param f: a text file object
+        """
+        json.dump({"ops": self.snapshot(), "calls": [{"op": name, **c} for name, c in self.calls]}, f)
+
+    def report(self, name: str, limit: int = 20) -> str:
+        """
+        :param name: the name of a profiled operation
+        :param limit: the number of functions listed
+        :return: the cProfile report (by cumulative time) and the peak memory of the operation
+        """
+        if name not in self._profiles:
+            return "{}: not profiled".format(name)
+        out = io.StringIO()
+        out.write("{}: {} calls, peak memory {} bytes\n".format(name, self.ops[name]["calls"], self._peaks[name]))
+        self._profiles[name].stream = out
+        self._profiles[name].sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+    def reset(self) -> None:
+        """
+        Drops everything collected so far.
+        """
+        self.calls.clear()
+        self.ops.clear()
+        self._profiles.clear()
+        self._peaks.clear()
+
+
+def instrumented(method):
+    """
+    Marks a method of a class to be measured while the instrumentation of its objects is on (see instrument).
+    """
+    method.instrumented = True
+    return method
+
+
+def instrument(obj, on: bool) -> None:
+    """
+    Turns the measuring of the marked methods of obj on or off.
+    While on, every marked method is shadowed by a measuring wrapper set on the object itself,
+    and the calls are collected into obj.metrics. While off the object has no wrappers,
+    so the methods run with no overhead at all.
+    :param obj: the object (with metrics and _stats attributes)
+    :param on: True to measure the calls, False to stop
+    """
+    cls = type(obj)
+    for name in dir(cls):
+        if getattr(getattr(cls, name), "instrumented", False):
+            if on:
+                obj.__dict__[name] = _measured(obj, name, getattr(cls, name).__get__(obj))
+            else:
+                obj.__dict__.pop(name, None)
+
+
+def _measured(obj, name: str, method):
+    """
+    :return: a wrapper measuring the calls of the bound method into obj.metrics. The SearchStats of the
+    running call is kept in obj._stats for the searches to fill in; calls nested in a measured call
+    are counted as part of it.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if obj._stats is not None:
+            return method(*args, **kwargs)
+        with obj.metrics.call(name) as obj._stats:
+            try:
+                return method(*args, **kwargs)
+            finally:
+                obj._stats = None
+    return wrapper
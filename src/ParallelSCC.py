@@ -0,0 +1,229 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import os
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import List
+
+from src.CSRGraph import CSRGraph
+from src.SCC import tarjan_subgraph
+
+# subproblems up to this size are decomposed by Tarjan's algorithm instead of being split further
+SMALL = 2048
+
+
+class SharedCSR(object):
+    """
+    The adjacency of a frozen graph (offsets and targets of both directions, no weights) copied once
+    into a block of shared memory, which every worker process maps instead of receiving its own copy.
+    Layout: out_offsets q[|V|+1], in_offsets q[|V|+1], out_targets i[|E|], in_targets i[|E|].
+    """
+
+    __slots__ = ("shm", "n", "m", "out_offsets", "out_targets", "in_offsets", "in_targets", "inside", "stamp")
+
+    def __init__(self, shm: SharedMemory, n: int, m: int):
+        self.shm = shm
+        self.n = n
+        self.m = m
+        buf = shm.buf
+        q, i = 8 * (n + 1), 4 * m
+        self.out_offsets = buf[0:q].cast('q')
+        self.in_offsets = buf[q:2 * q].cast('q')
+        self.out_targets = buf[2 * q:2 * q + i].cast('i')
+        self.in_targets = buf[2 * q + i:2 * q + 2 * i].cast('i')
+        # inside[v] == stamp marks the nodes of the subproblem being solved (no clearing between subproblems)
+        self.inside = array('i', bytes(4 * n))
+        self.stamp = 0
+
+    @classmethod
+    def create(cls, csr: CSRGraph) -> "SharedCSR":
+        """
+        :return: a new shared copy of the adjacency of csr (to be released by close(unlink=True))
+        """
+        n, m = csr.v_size(), csr.e_size()
+        shm = SharedMemory(create=True, size=max(1, 16 * (n + 1) + 8 * m))
+        q, i = 8 * (n + 1), 4 * m
+        for start, a, code in ((0, csr.out_offsets, 'q'), (q, csr.in_offsets, 'q'),
+                               (2 * q, csr.out_targets, 'i'), (2 * q + i, csr.in_targets, 'i')):
+            data = memoryview(array(code, a)).cast('B')
+            shm.buf[start:start + len(data)] = data
+        return cls(shm, n, m)
+
+    @classmethod
+    def attach(cls, name: str, n: int, m: int) -> "SharedCSR":
+        """
+        :return: the shared adjacency created (by another process) under the given name
+        """
+        return cls(SharedMemory(name=name), n, m)
+
+    def close(self, unlink: bool = False) -> None:
+        for view in (self.out_offsets, self.in_offsets, self.out_targets, self.in_targets):
+            view.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def trim(g: SharedCSR, nodes) -> (list, list):
+    """
+    Removes the trivial components of a subproblem, repeatedly: a node with no in-edges or no
+    out-edges inside the subproblem lies on no cycle, so it is a component of its own.
+    :param g: the shared adjacency, with the nodes of the subproblem marked inside
+    :param nodes: the nodes of the subproblem (dense indexes)
+    :return: the trimmed (single node) components, and the remaining nodes (still marked inside)
+    """
+    inside, stamp = g.inside, g.stamp
+    out_offsets, in_offsets = g.out_offsets, g.in_offsets
+    if len(nodes) == g.n:
+        # the whole graph: the degrees are the sizes of the adjacency ranges
+        deg_out = {v: out_offsets[v + 1] - out_offsets[v] for v in nodes}
+        deg_in = {v: in_offsets[v + 1] - in_offsets[v] for v in nodes}
+    else:
+        deg_out, deg_in = {}, {}
+        for v in nodes:
+            deg_out[v] = sum(1 for u in g.out_targets[out_offsets[v]:out_offsets[v + 1]] if inside[u] == stamp)
+            deg_in[v] = sum(1 for u in g.in_targets[in_offsets[v]:in_offsets[v + 1]] if inside[u] == stamp)
+    queue = [v for v in nodes if deg_out[v] == 0 or deg_in[v] == 0]
+    trimmed = []
+    for v in queue:
+        if inside[v] != stamp:
+            continue
+        inside[v] = 0
+        trimmed.append([v])
+        for u in g.out_targets[out_offsets[v]:out_offsets[v + 1]]:
+            if inside[u] == stamp:
+                deg_in[u] -= 1
+                if deg_in[u] == 0:
+                    queue.append(u)
+        for u in g.in_targets[in_offsets[v]:in_offsets[v + 1]]:
+            if inside[u] == stamp:
+                deg_out[u] -= 1
+                if deg_out[u] == 0:
+                    queue.append(u)
+    return trimmed, [v for v in nodes if inside[v] == stamp]
+
+
+def _reach(g: SharedCSR, offsets, targets, pivot: int) -> set:
+    """
+    :return: the nodes of the current subproblem reachable from pivot over the given direction
+    """
+    inside, stamp = g.inside, g.stamp
+    seen = {pivot}
+    frontier = [pivot]
+    while frontier:
+        level = set()
+        for v in frontier:
+            level.update(targets[offsets[v]:offsets[v + 1]])
+        level -= seen
+        frontier = [u for u in level if inside[u] == stamp]
+        seen.update(frontier)
+    return seen
+
+
+def solve(g: SharedCSR, nodes, small: int = SMALL) -> (List[list], list):
+    """
+    One forward-backward (FW-BW) step over a subproblem:
+        1. trim the trivial components
+        2. the component of a pivot is the intersection of the nodes it reaches (FW)
+           and the nodes reaching it (BW)
+        3. every other component lies entirely in FW - BW, in BW - FW or in the rest, so these
+           are independent subproblems
+    Subproblems of at most small nodes are decomposed right away by Tarjan's algorithm.
+    More info:
+    https://doi.org/10.1007/3-540-45219-7_18 (Fleischer, Hendrickson, Pinar - FW-BW)
+    :param g: the shared adjacency
+    :param nodes: the nodes of the subproblem (dense indexes)
+    :param small: the size of the subproblems solved by Tarjan's algorithm
+    :return: the components found (lists of dense indexes), and the subproblems left (arrays of dense indexes)
+    """
+    g.stamp += 1
+    inside, stamp = g.inside, g.stamp
+    for v in nodes:
+        inside[v] = stamp
+    sccs, rest = trim(g, nodes)
+    if not rest:
+        return sccs, []
+    if len(rest) <= small:
+        out_offsets, out_targets = g.out_offsets, g.out_targets
+        sccs += tarjan_subgraph(set(rest), lambda v: out_targets[out_offsets[v]:out_offsets[v + 1]])
+        return sccs, []
+
+    # the pivot with the most edges is the most likely to sit in a large component
+    out_offsets, in_offsets = g.out_offsets, g.in_offsets
+    pivot = max(rest, key=lambda v: (out_offsets[v + 1] - out_offsets[v]) * (in_offsets[v + 1] - in_offsets[v]))
+    fw = _reach(g, g.out_offsets, g.out_targets, pivot)
+    bw = _reach(g, g.in_offsets, g.in_targets, pivot)
+    sccs.append([v for v in rest if v in fw and v in bw])
+    parts = ([v for v in rest if v in fw and v not in bw],
+             [v for v in rest if v in bw and v not in fw],
+             [v for v in rest if v not in fw and v not in bw])
+    subproblems = []
+    for part in parts:
+        if len(part) > small:
+            subproblems.append(array('i', part))
+        elif part:
+            more, _ = solve(g, part, small)
+            sccs += more
+    return sccs, subproblems
+
+
+# the shared adjacency of a worker process, attached once by the pool initializer
+_shared = None
+
+
+def _init_worker(name: str, n: int, m: int) -> None:
+    global _shared
+    _shared = SharedCSR.attach(name, n, m)
+
+
+def _solve_in_worker(nodes: array, small: int) -> (List[list], list):
+    return solve(_shared, nodes, small)
+
+
+def parallel_scc(csr: CSRGraph, workers: int = None, small: int = SMALL) -> List[list]:
+    """
+    Finds all the Strongly Connected Components(SCC) of a frozen graph by forward-backward decomposition
+    (see solve), with the independent subproblems spread over a pool of worker processes.
+    The adjacency is copied once into shared memory (see SharedCSR), so a task only carries the node
+    indexes of its subproblem. The first step over the whole graph is sequential, the parallelism comes
+    from the subproblems it leaves, so graphs made of one giant component gain little.
+    :param csr: the frozen graph
+    :param workers: the number of worker processes (default: the number of cpus, 1 - no pool)
+    :param small: the size of the subproblems solved by Tarjan's algorithm
+    :return: the list of all the SCCs (lists of keys), in no particular order
+    """
+    n = csr.v_size()
+    if n == 0:
+        return []
+    workers = workers or os.cpu_count() or 1
+    shared = SharedCSR.create(csr)
+    found = []
+    try:
+        if workers == 1:
+            pending = [array('i', range(n))]
+            while pending:
+                sccs, more = solve(shared, pending.pop(), small)
+                found += sccs
+                pending += more
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(shared.shm.name, shared.n, shared.m)) as pool:
+                running = {pool.submit(_solve_in_worker, array('i', range(n)), small)}
+                while running:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        sccs, more = future.result()
+                        found += sccs
+                        running |= {pool.submit(_solve_in_worker, part, small) for part in more}
+    finally:
+        shared.close(unlink=True)
+    keys = csr.keys
+    return [[keys[v] for v in scc] for scc in found]
@@ -0,0 +1,176 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import math
+from collections import OrderedDict
+
+from src.CSRGraph import CSRGraph
+from src.Queues import make_queue
+
+
+class ShortestPathTree(object):
+    """
+    A resumable Dijkstra search from a single source over a frozen graph.
+    The search only runs until the requested destination is settled, and keeps its
+    state (distances, parents and the queue) so a later query for another destination
+    continues from where it stopped instead of starting over.
+    The distances are kept only for the touched nodes, and the queue is pluggable (see Queues):
+    by default a Dial bucket queue for small integer weights, and a lazy binary heap otherwise.
+    """
+
+    __slots__ = ("csr", "src", "dist", "prev", "heap", "settled")
+
+    # rough memory cost (in bytes) of a touched node and of a heap entry, used for the cache budget
+    NODE_BYTES = 200
+    HEAP_BYTES = 100
+
+    def __init__(self, csr: CSRGraph, src: int, queue: str = "auto"):
+        """
+        :param csr: the frozen graph
+        :param src: the dense index of the source
+        :param queue: "heap", "dary", "bucket" or "auto" (see Queues.make_queue)
+        """
+        self.csr = csr
+        self.src = src
+        self.dist = {src: 0}
+        self.prev = {src: -1}
+        self.heap = make_queue(csr, queue, [(0, src)])
+        self.settled = set()
+
+    def settle(self, dst: int, stats=None) -> bool:
+        """
+        Continues the search until dst is settled (or there is nothing left to explore).
+        :param dst: the dense index of the destination
+        :param stats: an optional SearchStats to add the heap counters of the search to
+        :return: True if the search had to be resumed, False if dst was already settled
+        """
+        settled = self.settled
+        if dst in settled:
+            return False
+        offsets, targets, weights = self.csr.out_offsets, self.csr.out_targets, self.csr.out_weights
+        dist, prev, q = self.dist, self.prev, self.heap
+        push, pop = q.push, q.pop
+        n_settled, n_heap, pops, scanned = len(settled), len(q), 0, 0
+        while q:
+            dv, v = pop()
+            pops += 1
+            if v in settled:
+                continue
+            settled.add(v)
+            a, b = offsets[v], offsets[v + 1]
+            scanned += b - a
+            for u, w in zip(targets[a:b], weights[a:b]):
+                if dist.get(u, math.inf) > dv + w:
+                    dist[u] = dv + w
+                    prev[u] = v
+                    push((dv + w, u))
+            if v == dst:
+                break
+        if stats is not None:
+            stats.add_search(pops, pops + len(q) - n_heap, len(settled) - n_settled, scanned)
+        return True
+
+    def path_to(self, dst: int) -> (float, list):
+        """
+        :param dst: the dense index of an already settled destination
+        :return: the distance to dst and the list of the nodes keys on the path, or (inf, []) if unreachable
+        """
+        if dst not in self.settled:
+            return math.inf, []
+        keys = self.csr.keys
+        path = []
+        p = dst
+        while p != -1:
+            path.append(keys[p])
+            p = self.prev[p]
+        path.reverse()
+        return self.dist[dst], path
+
+    def size_bytes(self) -> int:
+        """
+        :return: an estimation of the memory held by this tree
+        """
+        return self.NODE_BYTES * len(self.dist) + self.HEAP_BYTES * len(self.heap)
+
+
+class PathCache(object):
+    """
+    A bounded LRU cache of ShortestPathTree's, keyed by (source, graph version).
+    Queries repeating a source reuse (and if needed resume) the same tree, so their cost
+    drops to the length of the path. Trees of older versions of the graph are dropped
+    as soon as a newer version, or another frozen graph (even one with the same mc), is queried.
+    The cache is bounded both by the number of trees and by their estimated memory.
+    The new trees use the queue kind set in queue (see Queues.make_queue).
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 256 * 1024 * 1024, queue: str = "auto"):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.queue = queue
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._csr = None
+        self._mc = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def shortest_path(self, csr: CSRGraph, src: int, dst: int, stats=None) -> (float, list):
+        """
+        Answers a shortest path query from the cached tree of src (resuming it if dst
+        was not settled yet), or from a new tree if there is none.
+        :param csr: the frozen graph the search runs on
+        :param src: the dense index of the source
+        :param dst: the dense index of the destination
+        :param stats: an optional SearchStats to add the counters of the search to
+        :return: the distance of the path, a list of the nodes keys that the path goes through
+        """
+        if self._csr is not csr or self._mc != csr.mc:
+            self.clear()
+            self._csr = csr
+            self._mc = csr.mc
+        key = (src, csr.mc)
+        tree = self._entries.pop(key, None)
+        if tree is not None:
+            self.hits += 1
+            self._bytes -= tree.size_bytes()
+        else:
+            self.misses += 1
+            tree = ShortestPathTree(csr, src, self.queue)
+        tree.settle(dst, stats)
+        if self.max_entries > 0:
+            self._entries[key] = tree
+            self._bytes += tree.size_bytes()
+            self._evict()
+        return tree.path_to(dst)
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.size_bytes()
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drops all the cached trees.
+        """
+        self._entries.clear()
+        self._bytes = 0
+        self._csr = None
+        self._mc = None
+
+    def stats(self) -> dict:
+        """
+        :return: the counters of the cache
+        """
+        return {"entries": len(self._entries), "bytes": self._bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def __len__(self):
+        return len(self._entries)
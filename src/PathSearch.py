@@ -0,0 +1,185 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import heapq
+import math
+
+from src.CSRGraph import CSRGraph
+from src.PathCache import ShortestPathTree
+
+
+def dijkstra(csr: CSRGraph, src: int, dst: int) -> (float, list, int):
+    """
+    A plain (one directional) Dijkstra search from src to dst, without any caching.
+    :param csr: the frozen graph
+    :param src: the dense index of the source
+    :param dst: the dense index of the destination
+    :return: the distance, the list of the nodes keys on the path, and the number of settled nodes
+    """
+    tree = ShortestPathTree(csr, src)
+    tree.settle(dst)
+    dist, path = tree.path_to(dst)
+    return dist, path, len(tree.settled)
+
+
+def bidirectional_dijkstra(csr: CSRGraph, src: int, dst: int, stats=None) -> (float, list, int):
+    """
+    Bidirectional Dijkstra: grows a forward search from src over the out-edges and a backward
+    search from dst over the in-edges, always expanding the side with the smaller heap.
+    Every edge relaxed next to a node already reached by the other side gives a candidate
+    path, and the search stops once the tops of the two heaps sum up to at least the
+    best candidate - no path through an unsettled node can be shorter than that.
+    :param csr: the frozen graph
+    :param src: the dense index of the source
+    :param dst: the dense index of the destination
+    :param stats: an optional SearchStats to add the heap counters of the search to
+    :return: the distance, the list of the nodes keys on the path, and the number of settled nodes
+    More info:
+    https://en.wikipedia.org/wiki/Bidirectional_search
+    """
+    if src == dst:
+        return 0, [csr.keys[src]], 1
+    dist = ({src: 0}, {dst: 0})
+    prev = ({src: -1}, {dst: -1})
+    settled = (set(), set())
+    heaps = ([(0, src)], [(0, dst)])
+    edges = ((csr.out_offsets, csr.out_targets, csr.out_weights),
+             (csr.in_offsets, csr.in_targets, csr.in_weights))
+    best, meet = math.inf, -1
+    pops, scanned = 0, 0
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+        q, d, p, done = heaps[side], dist[side], prev[side], settled[side]
+        other = dist[1 - side]
+        dv, v = heapq.heappop(q)
+        pops += 1
+        if v in done:
+            continue
+        done.add(v)
+        offsets, targets, weights = edges[side]
+        a, b = offsets[v], offsets[v + 1]
+        scanned += b - a
+        for u, w in zip(targets[a:b], weights[a:b]):
+            if d.get(u, math.inf) > dv + w:
+                d[u] = dv + w
+                p[u] = v
+                heapq.heappush(q, (dv + w, u))
+            if u in other and d[u] + other[u] < best:
+                best, meet = d[u] + other[u], u
+
+    n_settled = len(settled[0]) + len(settled[1])
+    if stats is not None:
+        stats.add_search(pops, pops + len(heaps[0]) + len(heaps[1]) - 2, n_settled, scanned)
+    if meet == -1:
+        return math.inf, [], n_settled
+
+    # -------------- Retrieving the path: -------------- #
+    path = []
+    v = meet
+    while v != -1:
+        path.append(v)
+        v = prev[0][v]
+    path.reverse()
+    # sum the weights from the source on, so the distance is exactly the one a forward search gives
+    total = dist[0][meet]
+    v = meet
+    while prev[1][v] != -1:
+        u = prev[1][v]
+        total += edge_weight(csr, v, u)
+        path.append(u)
+        v = u
+    return total, [csr.keys[i] for i in path], n_settled
+
+
+def edge_weight(csr: CSRGraph, src: int, dst: int) -> float:
+    """
+    :return: the weight of the edge src->dst (given as dense indexes), or inf if there is no such edge
+    """
+    for j in range(csr.out_offsets[src], csr.out_offsets[src + 1]):
+        if csr.out_targets[j] == dst:
+            return csr.out_weights[j]
+    return math.inf
+
+
+def geometric_factor(csr: CSRGraph) -> float:
+    """
+    Computes the largest factor f for which f * (euclidean distance) is an admissible
+    (and consistent) A* heuristic: the minimum over all the edges of weight / distance.
+    :param csr: the frozen graph
+    :return: the factor, or 0 if the positions of the nodes can not be used as a heuristic
+    (they are missing / made up, or some edge between two distinct positions weighs 0)
+    """
+    if not csr.has_positions or csr.e_size() == 0:
+        return 0.0
+    factor = math.inf
+    offsets, targets, weights = csr.out_offsets, csr.out_targets, csr.out_weights
+    for v in range(csr.v_size()):
+        for j in range(offsets[v], offsets[v + 1]):
+            d = csr.distance(v, targets[j])
+            if d > 0 and weights[j] < factor * d:
+                factor = weights[j] / d
+    if factor == math.inf:
+        return 0.0
+    # a little bit less, so rounding errors never make the heuristic overestimate
+    return factor * (1 - 1e-9)
+
+
+def astar(csr: CSRGraph, src: int, dst: int, factor: float, stats=None) -> (float, list, int):
+    """
+    A* search from src to dst, guided by factor * (euclidean distance to dst) as a heuristic.
+    With factor = geometric_factor(csr) the heuristic is consistent, so the first time a node
+    is popped its distance is final, just like in Dijkstra (which is the case factor = 0).
+    :param csr: the frozen graph
+    :param src: the dense index of the source
+    :param dst: the dense index of the destination
+    :param factor: the heuristic scale factor
+    :param stats: an optional SearchStats to add the heap counters of the search to
+    :return: the distance, the list of the nodes keys on the path, and the number of settled nodes
+    More info:
+    https://en.wikipedia.org/wiki/A*_search_algorithm
+    """
+    offsets, targets, weights = csr.out_offsets, csr.out_targets, csr.out_weights
+    p = csr.positions
+    tx, ty, tz = p[3 * dst], p[3 * dst + 1], p[3 * dst + 2]
+    dist = {src: 0}
+    prev = {src: -1}
+    settled = set()
+    q = [(0, src)]
+    pops, scanned = 0, 0
+    while q:
+        v = heapq.heappop(q)[1]
+        pops += 1
+        if v in settled:
+            continue
+        settled.add(v)
+        if v == dst:
+            break
+        dv = dist[v]
+        a, b = offsets[v], offsets[v + 1]
+        scanned += b - a
+        for u, w in zip(targets[a:b], weights[a:b]):
+            if dist.get(u, math.inf) > dv + w:
+                dist[u] = dv + w
+                prev[u] = v
+                h = factor * math.sqrt((p[3 * u] - tx) ** 2 + (p[3 * u + 1] - ty) ** 2 + (p[3 * u + 2] - tz) ** 2)
+                heapq.heappush(q, (dv + w + h, u))
+
+    if stats is not None:
+        stats.add_search(pops, pops + len(q) - 1, len(settled), scanned)
+    if dst not in settled:
+        return math.inf, [], len(settled)
+    path = []
+    v = dst
+    while v != -1:
+        path.append(csr.keys[v])
+        v = prev[v]
+    path.reverse()
+    return dist[dst], path, len(settled)
@@ -0,0 +1,173 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+import heapq
+from functools import partial
+
+from src.CSRGraph import CSRGraph
+
+# the largest (integer) edge weight the bucket queue is chosen for automatically
+BUCKET_MAX_WEIGHT = 1024
+
+
+# All the queues hold (distance, node) entries with the same three operations:
+#   push((d, v)) - add an entry (or lower the distance of v, for the indexed heap)
+#   pop()        - remove and return the entry with the smallest distance
+#   len(q)       - the number of entries held
+# The lazy queues may hold outdated entries of a node, the search skips them by its settled set.
+
+
+class LazyHeap(list):
+    """
+    A binary heap with lazy deletion: a shorter distance to a node is pushed as a new entry,
+    and the outdated ones are skipped when they are popped. Backed by heapq, so push and pop run in C.
+    """
+
+    def __init__(self, entries=()):
+        super().__init__(entries)
+        heapq.heapify(self)
+        self.push = partial(heapq.heappush, self)
+        self.pop = partial(heapq.heappop, self)
+
+
+class DaryHeap(object):
+    """
+    An indexed d-ary heap with decrease-key: every node has at most one entry, so nothing outdated
+    is ever popped and the heap never grows past the number of open nodes.
+    """
+
+    __slots__ = ("d", "heap", "pos")
+
+    def __init__(self, entries=(), d: int = 4):
+        self.d = d
+        self.heap = []
+        self.pos = {}
+        for entry in entries:
+            self.push(entry)
+
+    def push(self, entry: tuple) -> None:
+        v = entry[1]
+        i = self.pos.get(v)
+        if i is None:
+            i = len(self.heap)
+            self.heap.append(entry)
+        elif entry[0] < self.heap[i][0]:
+            self.heap[i] = entry
+        else:
+            return
+        self._up(i)
+
+    def pop(self) -> tuple:
+        heap, pos = self.heap, self.pos
+        top = heap[0]
+        del pos[top[1]]
+        last = heap.pop()
+        if heap:
+            heap[0] = last
+            pos[last[1]] = 0
+            self._down(0)
+        return top
+
+    def _up(self, i: int) -> None:
+        heap, pos, d = self.heap, self.pos, self.d
+        entry = heap[i]
+        while i > 0:
+            p = (i - 1) // d
+            if heap[p][0] <= entry[0]:
+                break
+            heap[i] = heap[p]
+            pos[heap[i][1]] = i
+            i = p
+        heap[i] = entry
+        pos[entry[1]] = i
+
+    def _down(self, i: int) -> None:
+        heap, pos, d = self.heap, self.pos, self.d
+        n = len(heap)
+        entry = heap[i]
+        while True:
+            first = d * i + 1
+            if first >= n:
+                break
+            c, dc = first, heap[first][0]
+            for j in range(first + 1, min(first + d, n)):
+                if heap[j][0] < dc:
+                    c, dc = j, heap[j][0]
+            if dc >= entry[0]:
+                break
+            heap[i] = heap[c]
+            pos[heap[i][1]] = i
+            i = c
+        heap[i] = entry
+        pos[entry[1]] = i
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class BucketQueue(object):
+    """
+    Dial's bucket queue for small non negative integer weights (at most max_weight).
+    While Dijkstra runs, all the open distances lie in [current, current + max_weight], so
+    max_weight + 1 buckets used in a circle hold every distance in its own bucket: a push is
+    an append, and a pop takes the next non empty bucket - no comparisons at all.
+    Like the lazy heap, outdated entries are left in their buckets and skipped by the search.
+    """
+
+    __slots__ = ("buckets", "size", "current", "count")
+
+    def __init__(self, max_weight: int, entries=()):
+        self.size = int(max_weight) + 1
+        self.buckets = [[] for _ in range(self.size)]
+        self.current = 0
+        self.count = 0
+        for entry in entries:
+            self.push(entry)
+
+    def push(self, entry: tuple) -> None:
+        self.buckets[int(entry[0]) % self.size].append(entry)
+        self.count += 1
+
+    def pop(self) -> tuple:
+        buckets, size, i = self.buckets, self.size, self.current
+        while not buckets[i % size]:
+            i += 1
+        self.current = i
+        self.count -= 1
+        return buckets[i % size].pop()
+
+    def __len__(self):
+        return self.count
+
+
+def choose_queue(csr: CSRGraph) -> str:
+    """
+    Chooses the queue by the weights of the graph: "bucket" if they are all small non negative
+    integers (at most BUCKET_MAX_WEIGHT), "heap" otherwise.
+    """
+    integers, low, high = csr.weight_profile()
+    return "bucket" if integers and low >= 0 and high <= BUCKET_MAX_WEIGHT else "heap"
+
+
+def make_queue(csr: CSRGraph, kind: str = "auto", entries=()):
+    """
+    :param csr: the frozen graph the search runs on
+    :param kind: "heap" (LazyHeap), "dary" (DaryHeap), "bucket" (BucketQueue), or "auto" to choose by the weights
+    :param entries: the initial (distance, node) entries
+    :return: a new queue
+    """
+    if kind == "auto":
+        kind = choose_queue(csr)
+    if kind == "heap":
+        return LazyHeap(entries)
+    if kind == "dary":
+        return DaryHeap(entries)
+    if kind == "bucket":
+        return BucketQueue(max(csr.weight_profile()[2], 0), entries)
+    raise ValueError("Unknown queue: " + kind)
@@ -0,0 +1,325 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+"""
+
+from typing import List
+
+from src.CSRGraph import CSRGraph
+
+
+def tarjan(csr: CSRGraph) -> (list, int):
+    """
+    Finds all the Strongly Connected Components(SCC) of a frozen graph in O(V+E),
+    using an iterative version of Tarjan's algorithm (no recursion, so there is no
+    recursion limit on large graphs).
+    :param csr: the frozen graph
+    :return: a list mapping every dense node index to its component id, and the number of components.
+    The components ids are given in reverse topological order (a component is numbered
+    before every component that can reach it).
+    More info:
+    https://en.wikipedia.org/wiki/Tarjan%27s_strongly_connected_components_algorithm
+    """
+    n = csr.v_size()
+    offsets, targets = csr.out_offsets, csr.out_targets
+    index = [-1] * n
+    low = [0] * n
+    on_stack = bytearray(n)
+    comp = [-1] * n
+    stack = []
+    counter = 0
+    count = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        work = [(root, offsets[root])]
+        while work:
+            v, e = work[-1]
+            end = offsets[v + 1]
+            descended = False
+            while e < end:
+                u = targets[e]
+                e += 1
+                if index[u] == -1:
+                    # ---- "recursive" call on u: save where we stopped in v ---- #
+                    work[-1] = (v, e)
+                    index[u] = low[u] = counter
+                    counter += 1
+                    stack.append(u)
+                    on_stack[u] = 1
+                    work.append((u, offsets[u]))
+                    descended = True
+                    break
+                if on_stack[u] and index[u] < low[v]:
+                    low[v] = index[u]
+            if descended:
+                continue
+
+            # ---- all the edges of v are done, return to its parent ---- #
+            work.pop()
+            if work:
+                p = work[-1][0]
+                if low[v] < low[p]:
+                    low[p] = low[v]
+            if low[v] == index[v]:
+                while True:
+                    u = stack.pop()
+                    on_stack[u] = 0
+                    comp[u] = count
+                    if u == v:
+                        break
+                count += 1
+    return comp, count
+
+
+def tarjan_subgraph(nodes, successors) -> List[list]:
+    """
+    Same as tarjan(), but works directly on the adjacency dictionaries of a graph and only
+    over the subgraph induced by the given nodes.
+    :param nodes: a set of node keys
+    :param successors: a function returning the out-neighbours (keys) of a node
+    :return: the list of the SCCs of the induced subgraph, each one as a list of keys
+    """
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    sccs = []
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+        while work:
+            v, it = work[-1]
+            descended = False
+            for u in it:
+                if u not in nodes:
+                    continue
+                if u not in index:
+                    index[u] = low[u] = len(index)
+                    stack.append(u)
+                    on_stack.add(u)
+                    work.append((u, iter(successors(u))))
+                    descended = True
+                    break
+                if u in on_stack and index[u] < low[v]:
+                    low[v] = index[u]
+            if descended:
+                continue
+            work.pop()
+            if work:
+                p = work[-1][0]
+                if low[v] < low[p]:
+                    low[p] = low[v]
+            if low[v] == index[v]:
+                scc = []
+                while True:
+                    u = stack.pop()
+                    on_stack.discard(u)
+                    scc.append(u)
+                    if u == v:
+                        break
+                sccs.append(scc)
+    return sccs
+
+
+class IncrementalSCC(object):
+    """
+    Keeps the SCC decomposition of a DiGraph up to date across its mutations.
+    Instead of recomputing everything on every query, the changes made to the graph since
+    the last update are read from its change log (DiGraph.changes_since) and applied:
+        - a new node is a new component of its own
+        - removing a node / an edge inside a component may only split that component,
+          so only that component is decomposed again
+        - adding an edge between two components is checked against a topological order of the
+          components, kept along with them (Pearce-Kelly): an edge that agrees with the order changes
+          nothing, and only the components ranked between its two ends are searched otherwise -
+          to merge the ones lying on a cycle through it, or to reorder them
+    If the log does not go back far enough, or it holds more than max_delta changes,
+    the decomposition is rebuilt from scratch, and so it is once the searches of the new edges
+    scan more nodes and edges than the graph has (a rebuild would have been cheaper).
+    The ranks of the order are tuples: a component split into parts passes its rank on to them,
+    extended by their position ((r,) -> (r, 0), (r, 1), ...), so they fit in its place without
+    renumbering any other component.
+    More info:
+    https://doi.org/10.1145/1187436.1210590 (Pearce, Kelly - dynamic topological sort)
+    """
+
+    def __init__(self, g, max_delta: int = 1024):
+        self.graph = g
+        self.max_delta = max_delta
+        self.comp_of = {}
+        self.members = {}
+        self.rank = {}
+        self.mc = None
+        self._next_id = 0
+        self._next_rank = 0
+        self._work = 0
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """
+        Computes the decomposition from scratch (using tarjan() over the frozen graph).
+        """
+        csr = self.graph.freeze()
+        comp, count = tarjan(csr)
+        # Tarjan finds the components in reverse topological order, flip them over
+        self.comp_of = {k: count - 1 - c for k, c in zip(csr.keys, comp)}
+        self.members = {c: set() for c in range(count)}
+        for k, c in self.comp_of.items():
+            self.members[c].add(k)
+        self.rank = {c: (c,) for c in range(count)}
+        self._next_id = count
+        self._next_rank = count
+        self.mc = csr.mc
+
+    def update(self) -> bool:
+        """
+        Brings the decomposition up to date with the current version of the graph.
+        :return: True if the changes were applied incrementally, False if it was rebuilt
+        """
+        if self.mc == self.graph.get_mc():
+            return True
+        changes = self.graph.changes_since(self.mc)
+        if changes is None or len(changes) > self.max_delta:
+            self.rebuild()
+            return False
+
+        # ------------ Pass 1: new nodes and removals ------------ #
+        dirty = set()
+        added = []
+        for change in changes:
+            op = change[1]
+            if op == "add_edge":
+                added.append((change[2], change[3]))
+            elif op == "remove_edge":
+                c = self.comp_of.get(change[2])
+                if c is not None and c == self.comp_of.get(change[3]):
+                    dirty.add(c)
+            elif op == "add_node":
+                # no edges yet, so any rank will do
+                self._new_component([change[2]], (self._next_rank,))
+                self._next_rank += 1
+            elif op == "remove_node":
+                c = self.comp_of.pop(change[2], None)
+                if c is not None:
+                    self.members[c].discard(change[2])
+                    dirty.add(c)
+
+        # ------------ Pass 2: split the components that lost something ------------ #
+        out_edges = self.graph.all_out_edges_of_node
+        for c in dirty:
+            nodes = self.members.pop(c, None)
+            rank = self.rank.pop(c, None)
+            if nodes:
+                parts = tarjan_subgraph(nodes, lambda v: out_edges(v).keys())
+                # in reverse topological order, like tarjan()
+                for i, scc in enumerate(reversed(parts)):
+                    self._new_component(scc, rank + (i,))
+
+        # ------------ Pass 3: insert the new edges into the order ------------ #
+        # the searches of a batch may not cost more than a full decomposition (tarjan is linear)
+        comp_of, rank = self.comp_of, self.rank
+        self._work = 0
+        budget = self.graph.v_size() + self.graph.e_size()
+        for src, dst in added:
+            ni = out_edges(src)
+            if ni is None or dst not in ni:
+                continue
+            cs, cd = comp_of[src], comp_of[dst]
+            if cs != cd and rank[cs] > rank[cd]:
+                self._insert(cs, cd)
+                if self._work > budget:
+                    self.rebuild()
+                    return False
+
+        self.mc = self.graph.get_mc()
+        return True
+
+    def _new_component(self, keys: list, rank: tuple) -> None:
+        c = self._next_id
+        self._next_id += 1
+        self.members[c] = set(keys)
+        self.rank[c] = rank
+        for k in keys:
+            self.comp_of[k] = c
+
+    def _merge(self, comps: set) -> int:
+        """
+        Merges the given components into the largest of them.
+        :return: the id of the merged component
+        """
+        target = max(comps, key=lambda c: len(self.members[c]))
+        into = self.members[target]
+        for c in comps:
+            if c != target:
+                del self.rank[c]
+                for k in self.members.pop(c):
+                    self.comp_of[k] = target
+                    into.add(k)
+        return target
+
+    def _insert(self, cs: int, cd: int) -> None:
+        """
+        Inserts an edge cs -> cd between two components that the order ranks the wrong way (cd before cs).
+        Only the components ranked between them can be affected:
+            forward  - the ones reachable from cd
+            backward - the ones reaching cs
+        If cs is reachable from cd, the components in both sets lie on a cycle through the edge and are merged.
+        Either way, the affected components take the ranks they held between them again: the backward ones
+        the lowest, the merged one (if any) the next, and the forward ones the highest.
+        Both searches stay between the ranks of cd and cs: the edges already in the order never leave that range
+        on such a path, and the new edges of the batch that do are inserted on their own turn.
+        """
+        rank = self.rank
+        low, high = rank[cd], rank[cs]
+        forward = self._search(cd, lambda c: low <= rank[c] <= high, self.graph.all_out_edges_of_node)
+        backward = self._search(cs, lambda c: low <= rank[c] <= high, self.graph.all_in_edges_of_node)
+        ranks = sorted(rank[c] for c in forward | backward)
+        before = sorted(backward - forward, key=rank.get)
+        after = sorted(forward - backward, key=rank.get)
+        # the backward ones only move down and the forward ones only up (even when a merge frees ranks),
+        # so the edges coming into or going out of the range keep their direction
+        for c, r in zip(before, ranks):
+            rank[c] = r
+        for c, r in zip(after, ranks[len(ranks) - len(after):]):
+            rank[c] = r
+        if cs in forward:
+            rank[self._merge(forward & backward)] = ranks[len(before)]
+
+    def _search(self, start: int, inside, neighbours) -> set:
+        """
+        :return: the components reached from the start component over the given direction,
+        through components accepted by inside only
+        """
+        comp_of, members = self.comp_of, self.members
+        found = {start}
+        stack = [start]
+        while stack:
+            for v in members[stack.pop()]:
+                ni = neighbours(v)
+                self._work += 1 + len(ni)
+                for u in ni:
+                    c = comp_of[u]
+                    if c not in found and inside(c):
+                        found.add(c)
+                        stack.append(c)
+        return found
+
+    def components(self) -> List[list]:
+        """
+        :return: the list of all the SCCs, in topological order (an edge between two components always
+        goes from an earlier one to a later one)
+        """
+        return [list(self.members[c]) for c in sorted(self.members, key=self.rank.get)]
@@ -7,9 +7,12 @@
 ****************************************************************************
 """
 
+import os
+import tempfile
 import unittest
 from unittest import TestCase
 from src.DiGraph import DiGraph, NodeData
+from src.Journal import Journal
 
 
 class Test(TestCase):
@@ -61,6 +64,39 @@ class Test(TestCase):
         self.assertEqual(5, self.g.v_size())
         self.assertEqual(15, self.g.get_mc())
 
+    def test_remove_node_edges(self):
+        self.g.add_edge(4, 4, 2)
+        self.assertEqual(9, self.g.e_size())
+        # node 4 has: 1->4, 4->5, 4->2, 4->4
+        self.assertTrue(self.g.remove_node(4))
+        self.assertEqual(5, self.g.e_size())
+        self.assertNotIn(4, self.g.all_out_edges_of_node(1))
+        self.assertNotIn(4, self.g.all_in_edges_of_node(5))
+        self.assertNotIn(4, self.g.all_in_edges_of_node(2))
+        self.assertEqual(sum(map(len, self.g.Ni_out.values())), self.g.e_size())
+        self.assertEqual(sum(map(len, self.g.Ni_in.values())), self.g.e_size())
+
+    def test_remove_nodes(self):
+        mc = self.g.get_mc()
+        self.assertEqual(3, self.g.remove_nodes([1, 2, 9, 5, 1]))
+        self.assertEqual(3, self.g.v_size())
+        self.assertEqual(0, self.g.e_size())
+        self.assertEqual(mc + 1, self.g.get_mc())
+        self.assertEqual([(mc + 1, "remove_node", 1), (mc + 1, "remove_node", 2), (mc + 1, "remove_node", 5)],
+                         self.g.changes_since(mc))
+        self.assertEqual(0, self.g.remove_nodes([1, 2]))
+        self.assertEqual(mc + 1, self.g.get_mc())
+
+    def test_remove_edges(self):
+        mc = self.g.get_mc()
+        self.assertEqual(2, self.g.remove_edges([(1, 2), (2, 1), (1, 2), (0, 5), (7, 8)]))
+        self.assertEqual(6, self.g.e_size())
+        self.assertEqual(mc + 1, self.g.get_mc())
+        self.assertNotIn(1, self.g.all_in_edges_of_node(2))
+        self.assertNotIn(2, self.g.all_in_edges_of_node(1))
+        self.assertEqual(0, self.g.remove_edges([]))
+        self.assertEqual(mc + 1, self.g.get_mc())
+
     def test_add_edge(self):
         self.assertEqual(8, self.g.e_size())
 
@@ -87,6 +123,22 @@ class Test(TestCase):
         self.assertEqual(7, self.g.e_size())
         self.assertEqual(15, self.g.get_mc())
 
+    def test_update_edge_weight(self):
+        mc = self.g.get_mc()
+        self.assertTrue(self.g.update_edge_weight(1, 2, 7.5))
+        self.assertEqual(7.5, self.g.all_out_edges_of_node(1)[2])
+        self.assertEqual(7.5, self.g.all_in_edges_of_node(2)[1])
+        self.assertEqual(8, self.g.e_size())
+        self.assertEqual(mc + 1, self.g.get_mc())
+        self.assertEqual([(mc + 1, "update_edge_weight", 1, 2, 7.5)], self.g.changes_since(mc))
+
+        # the same weight is not a change, and a missing edge is not added
+        self.assertTrue(self.g.update_edge_weight(1, 2, 7.5))
+        self.assertFalse(self.g.update_edge_weight(3, 2, 1))
+        self.assertFalse(self.g.update_edge_weight(1, 99, 1))
+        self.assertEqual(mc + 1, self.g.get_mc())
+        self.assertEqual(8, self.g.e_size())
+
     def test_get_all_v(self):
         d = {0: NodeData(0), 1: NodeData(1), 2: NodeData(2), 3: NodeData(3), 4: NodeData(4), 5: NodeData(5)}
         self.assertEqual(d.__repr__(), self.g.get_all_v().__repr__())
@@ -138,5 +190,218 @@ class Test(TestCase):
     def test_get_mc(self):
         self.assertEqual(14, self.g.get_mc())
 
+    def test_changes_since(self):
+        mc = self.g.get_mc()
+        self.assertEqual([], self.g.changes_since(mc))
+        self.g.add_node(10)
+        self.g.add_edge(10, 1, 2.5)
+        self.g.remove_edge(10, 1)
+        self.g.remove_node(10)
+        self.assertEqual([(mc + 1, "add_node", 10, None), (mc + 2, "add_edge", 10, 1, 2.5),
+                          (mc + 3, "remove_edge", 10, 1), (mc + 4, "remove_node", 10)],
+                         self.g.changes_since(mc))
+        self.assertEqual([(mc + 4, "remove_node", 10)], self.g.changes_since(mc + 3))
+
+        # the log only keeps the last CHANGES_LIMIT changes
+        for i in range(DiGraph.CHANGES_LIMIT):
+            self.g.add_node(100 + i)
+        self.assertIsNone(self.g.changes_since(mc))
+        self.assertEqual(DiGraph.CHANGES_LIMIT, len(self.g.changes_since(self.g.get_mc() - DiGraph.CHANGES_LIMIT)))
+
+    def test_bulk_load(self):
+        g = DiGraph()
+        g.bulk_load([(i, None) for i in range(6)] + [(1, (1, 2, 3))],
+                    [(0, 1, 3), (0, 3, 7), (0, 4, 8), (1, 2, 1), (1, 3, 4), (3, 2, 2), (4, 3, 3), (0, 1, 9), (4, 9, 1)])
+        self.assertEqual(6, g.v_size())
+        self.assertEqual(7, g.e_size())
+        self.assertEqual(1, g.get_mc())
+        self.assertEqual(self.g1.Ni_out, g.Ni_out)
+        self.assertEqual(self.g1.Ni_in, g.Ni_in)
+        self.assertIsNone(g.changes_since(0))
+        self.assertTrue(g.add_edge(2, 0, 1))
+        self.assertEqual(8, g.e_size())
+
+    def test_node_positions(self):
+        node = self.g.get_node(1)
+        self.assertFalse(hasattr(node, "__dict__"))
+        self.assertFalse(node.has_pos)
+        self.assertIsNone(node._pos)
+        # made up only when asked for, and always the same one
+        pos = node.pos
+        self.assertEqual(3, len(pos))
+        self.assertEqual(pos, NodeData(1).pos)
+        self.assertFalse(node.has_pos)
+        self.assertFalse(self.g.freeze().has_positions)
+
+        node.pos = (1.5, 2.5, 0.0)
+        self.assertTrue(node.has_pos)
+        self.assertEqual((1.5, 2.5, 0.0), node.pos)
+        self.assertTrue(self.g.add_node(10, (3.0, 4.0, 0.0)))
+        self.assertTrue(self.g.get_node(10).has_pos)
+
+    def test_freeze(self):
+        csr = self.g1.freeze()
+        self.assertEqual(6, csr.v_size())
+        self.assertEqual(7, csr.e_size())
+        self.assertEqual(self.g1.get_mc(), csr.mc)
+        self.assertIs(csr, self.g1.freeze())
+        out = {csr.keys[u]: w for u, w in csr.out_edges(csr.index[0])}
+        self.assertEqual(self.g1.all_out_edges_of_node(0), out)
+        into = {csr.keys[u]: w for u, w in csr.in_edges(csr.index[3])}
+        self.assertEqual(self.g1.all_in_edges_of_node(3), into)
+
+        # any change in the graph should rebuild the snapshot
+        self.g1.add_edge(2, 0, 5)
+        self.assertIsNot(csr, self.g1.freeze())
+        self.assertEqual(8, self.g1.freeze().e_size())
+
+    def test_snapshot(self):
+        before = ({k: dict(v) for k, v in self.g.Ni_out.items()}, {k: dict(v) for k, v in self.g.Ni_in.items()})
+        mc = self.g.get_mc()
+        snap = self.g.snapshot()
+        self.assertIs(snap, self.g.snapshot())
+        self.assertEqual(mc, snap.get_mc())
+        self.assertIs(self.g.freeze(), snap.freeze())
+
+        self.g.add_edge(5, 0, 2)
+        self.g.remove_edge(1, 2)
+        self.g.remove_node(4)
+        self.g.add_node(9)
+        self.g.update_edge_weight(2, 5, 9)
+        self.assertEqual(before, (snap.Ni_out, snap.Ni_in))
+        self.assertEqual(6, snap.v_size())
+        self.assertEqual(8, snap.e_size())
+        self.assertNotIn(9, snap.get_all_v())
+        self.assertEqual({2: 1, 3: 1, 4: 1}, snap.all_out_edges_of_node(1))
+        # only the adjacency of the changed nodes was copied
+        self.assertIs(self.g.all_out_edges_of_node(3), snap.all_out_edges_of_node(3))
+        self.assertIsNot(self.g.all_out_edges_of_node(1), snap.all_out_edges_of_node(1))
+        self.assertRaises(TypeError, snap.add_edge, 0, 1, 1)
+        self.assertRaises(TypeError, snap.remove_node, 0)
+        self.assertRaises(TypeError, snap.update_edge_weight, 1, 2, 3)
+
+        later = self.g.snapshot()
+        self.assertIsNot(snap, later)
+        self.assertEqual(self.g.get_mc(), later.get_mc())
+        self.assertEqual(self.g.Ni_out, later.Ni_out)
+
+        # once no snapshot is alive the graph stops copying
+        del snap, later
+        self.g.add_edge(0, 1, 1)
+        self.assertIsNone(self.g._owned)
+        out = self.g.all_out_edges_of_node(0)
+        self.g.add_edge(0, 2, 1)
+        self.assertIs(out, self.g.all_out_edges_of_node(0))
+
+    def test_journal(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "g.bin")
+            journal = Journal.create(self.g, path)
+            self.g.add_node(7, (1.0, 2.0, 3.0))
+            self.g.add_edge(7, 1, 2.5)
+            self.g.remove_edge(1, 2)
+            self.g.remove_node(4)
+            self.g.update_edge_weight(2, 5, 0.5)
+            self.assertEqual(5, journal.records)
+            journal.close()
+            self.g.add_edge(0, 1, 1)  # not journaled any more
+
+            g = Journal.open(path)
+            self.assertEqual(5, g.journal.records)
+            self.assertEqual(0.5, g.all_out_edges_of_node(2)[5])
+            self.assertNotIn(2, g.all_out_edges_of_node(1))
+            self.assertEqual({1: 2.5}, g.all_out_edges_of_node(7))
+            self.assertEqual((1.0, 2.0, 3.0), g.get_node(7).pos)
+            self.assertNotIn(4, g.get_all_v())
+            self.assertEqual(self.g.e_size() - 1, g.e_size())
+
+            # a torn record at the end is dropped, and the next changes go right after the last good one
+            g.add_edge(5, 3, 4)
+            size = g.journal.size_bytes()
+            g.journal.close()
+            with open(path + ".journal", "ab") as f:
+                f.write(b"\x12\x34\x56")
+            g = Journal.open(path)
+            self.assertEqual(size, os.path.getsize(path + ".journal"))
+            self.assertEqual(4, g.all_out_edges_of_node(5)[3])
+
+            # a crash in the middle of a compaction (new checkpoint, old journal) loses nothing
+            # and applies nothing twice
+            with open(path + ".journal", "rb") as f:
+                old_journal = f.read()
+            g.journal.compact()
+            g.journal.close()
+            with open(path + ".journal", "wb") as f:
+                f.write(old_journal)
+            recovered = Journal.open(path)
+            self.assertEqual(g.Ni_out, recovered.Ni_out)
+            self.assertEqual(g.Ni_in, recovered.Ni_in)
+            self.assertEqual(0, recovered.journal.records)
+
+            # the journal is folded into a checkpoint once it outgrows it
+            recovered.journal.compact_ratio = 0.0001
+            recovered.add_edge(0, 5, 1)
+            self.assertEqual(0, recovered.journal.records)
+            recovered.bulk_load([(8, None)], [(8, 0, 1)])
+            recovered.journal.close()
+            reopened = Journal.open(path)
+            self.assertEqual(recovered.Ni_out, reopened.Ni_out)
+            reopened.journal.close()
+
+    def test_journal_batches(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "g.bin")
+            Journal.create(self.g, path, fsync=True)
+            mc = self.g.get_mc()
+            self.g.remove_nodes([4, 5])
+            self.g.add_edge(0, 2, 1)
+            self.g.remove_edges([(1, 3), (2, 1), (3, 1)])
+            self.assertEqual(mc + 3, self.g.get_mc())
+            self.g.journal.close()
+
+            # a batch is replayed as a single change, so the recovered graph counts the same changes
+            g = Journal.open(path)
+            self.assertEqual(self.g.Ni_out, g.Ni_out)
+            self.assertEqual(6, g.journal.records)
+            start = g.get_mc()
+            g.remove_nodes([0, 1])
+            self.assertEqual(start + 1, g.get_mc())
+            g.journal.close()
+            # and the changes made after a recovery follow the ones before it
+            g = Journal.open(path)
+            self.assertEqual(8, g.journal.records)
+            self.assertNotIn(0, g.get_all_v())
+            g.journal.close()
+
+            # a repeated or a missing change is detected (the add_edge record after the batch of two remove_node)
+            with open(path + ".journal", "rb") as f:
+                data = f.read()
+            start, end = 20 + 3 * 21, 20 + 3 * 21 + 37
+            for broken in (data[:end] + data[start:], data[:start] + data[end:]):
+                with open(path + ".journal", "wb") as f:
+                    f.write(broken)
+                self.assertRaises(ValueError, Journal.open, path)
+
+            # a batch torn in the middle is dropped as a whole, never replayed in part
+            with open(path + ".journal", "wb") as f:
+                f.write(data[:-21])
+            g = Journal.open(path)
+            self.assertEqual(6, g.journal.records)
+            self.assertEqual(self.g.Ni_out, g.Ni_out)
+            self.assertEqual(len(data) - 3 * 21, os.path.getsize(path + ".journal"))
+            g.journal.close()
+
+    def test_journal_compact_batch(self):
+        # a compaction never runs between the records of a batch
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "g.bin")
+            Journal.create(self.g, path, compact_ratio=50 / 65536)
+            self.g.remove_nodes([3, 4, 5])
+            self.assertEqual(0, self.g.journal.records)
+            self.g.journal.close()
+            g = Journal.open(path)
+            self.assertEqual(self.g.Ni_out, g.Ni_out)
+            g.journal.close()
+
     if __name__ == '__main__':
         unittest.main()
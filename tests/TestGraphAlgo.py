@@ -7,12 +7,52 @@
 ****************************************************************************
 """
 
+import asyncio
+import importlib.util
+import io
+import json
 import math
+import os
+import pickle
 import random
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from array import array
 from unittest import TestCase
 
 from src.DiGraph import DiGraph
+from src.DynamicPaths import DynamicSSSP
 from src.GraphAlgo import GraphAlgo
+from src.GraphIO import iter_json_records, read_json_graph, convert, MappedCSRGraph
+from src.GraphService import GraphService, load_test
+from src.Landmarks import LandmarkIndex
+from src.Metrics import SearchStats
+from src.ParallelSCC import parallel_scc
+from src.PathCache import ShortestPathTree
+from src.Queues import BucketQueue, DaryHeap, LazyHeap, make_queue
+
+
+# the startup budget of a process that only loads graphs and answers queries (see test_import_budget)
+IMPORT_SECONDS = 0.2
+IMPORT_MB = 25
+# modules that must not be imported until a feature that needs them is used
+HEAVY_MODULES = ("matplotlib", "numpy", "multiprocessing", "concurrent.futures", "pstats")
+
+_MEASURE_IMPORT = """
+import os, sys, time
+def rss():
+    # the current resident set (ru_maxrss would carry the peak of the parent process over the fork)
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+before = rss()
+start = time.perf_counter()
+from src.GraphAlgo import GraphAlgo
+seconds = time.perf_counter() - start
+print(seconds, rss() - before, *sorted(m for m in sys.modules if m.split('.')[0] in HEAVY or m in HEAVY))
+"""
 
 
 class TestGraphAlgo(TestCase):
@@ -30,19 +70,104 @@ class TestGraphAlgo(TestCase):
         print(self.ga.get_graph())
         self.assertTrue(self.ga.load_from_json("../data/T0.json"))
         print(self.ga.get_graph())
+        self.assertEqual(4, self.ga.load_stats["nodes"])
+        self.assertEqual(5, self.ga.load_stats["edges"])
+
+        self.assertFalse(self.ga.load_from_json("../data/no_such_file.json"))
+        self.assertEqual(4, self.ga.get_graph().v_size())
+
+    def test_load_from_json_streaming(self):
+        for file in ["../data/A5", "../data/T0.json", "../data/G_100_800_0.json"]:
+            with open(file) as f:
+                s = json.load(f)
+            expected = [(section, record) for section in s for record in s[section]]
+            for chunk_size in [1, 13, 1 << 16]:
+                with open(file) as f:
+                    self.assertEqual(expected, list(iter_json_records(f, chunk_size)))
+            self.assertTrue(self.ga.load_from_json(file))
+            g = self.ga.get_graph()
+            self.assertEqual(len(s["Nodes"]), g.v_size())
+            self.assertEqual(len(s["Edges"]), g.e_size())
+            for edge in s["Edges"]:
+                self.assertEqual(edge["w"], g.all_out_edges_of_node(edge["src"])[edge["dest"]])
+                self.assertEqual(edge["w"], g.all_in_edges_of_node(edge["dest"])[edge["src"]])
+
+        for bad in ['{"Nodes": [{"id": 1}', '{"Nodes": [], "Edges": [1 2]}', '[]', '{"Nodes": []}']:
+            self.assertRaises(Exception, read_json_graph, io.StringIO(bad))
 
     def test_save_to_json(self):
-        self.assertTrue(self.ga.load_from_json("../data/A0"))
-        self.assertTrue(self.ga.save_to_json("test1.json"))
+        with tempfile.TemporaryDirectory() as tmp:
+            for file in ["../data/A0", "../data/A5", "../data/A5_edited", "../data/T0.json"]:
+                self.assertTrue(self.ga.load_from_json(file))
+                g = self.ga.get_graph()
+                for name, options in [("g.json", {}), ("g_indented.json", {"compact": False}),
+                                      ("g.json.gz", {}), ("g.json.xz", {}), ("g_gzip", {"compression": "gzip"})]:
+                    out = os.path.join(tmp, name)
+                    self.assertTrue(self.ga.save_to_json(out, **options))
+                    self.assertEqual([name], os.listdir(tmp))
+                    ga = GraphAlgo()
+                    self.assertTrue(ga.load_from_json(out))
+                    loaded = ga.get_graph()
+                    self.assertEqual(list(g.get_all_v()), list(loaded.get_all_v()))
+                    self.assertEqual(g.Ni_out, loaded.Ni_out)
+                    self.assertEqual([n.has_pos and n.pos for n in g.get_all_v().values()],
+                                     [n.has_pos and n.pos for n in loaded.get_all_v().values()])
+                    os.remove(out)
+                plain = os.path.join(tmp, "g.json")
+                self.ga.save_to_json(plain)
+                with open(plain) as f:
+                    self.assertEqual(["Edges", "Nodes"], sorted(json.load(f)))
+                self.assertTrue(self.ga.save_to_json(plain + ".gz"))
+                self.assertLess(os.path.getsize(plain + ".gz"), os.path.getsize(plain))
+                os.remove(plain)
+                os.remove(plain + ".gz")
+            self.assertFalse(self.ga.save_to_json(os.path.join(tmp, "no_such_dir", "g.json")))
+            self.assertFalse(self.ga.save_to_json(os.path.join(tmp, "g.json"), compression="zip"))
+            # a failed save leaves neither a temporary file nor a partial graph behind
+            self.assertEqual([], os.listdir(tmp))
 
-        self.assertTrue(self.ga.load_from_json("../data/A5"))
-        self.assertTrue(self.ga.save_to_json("test2.json"))
+    def test_save_load_binary(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for file in ["../data/A5", "../data/T0.json", "../data/G_100_800_0.json"]:
+                self.assertTrue(self.ga.load_from_json(file))
+                g = self.ga.get_graph()
+                out = os.path.join(tmp, "graph.bin")
+                self.assertTrue(self.ga.save_binary(out))
 
-        self.assertTrue(self.ga.load_from_json("../data/A5_edited"))
-        self.assertTrue(self.ga.save_to_json("test3.json"))
+                ga = GraphAlgo()
+                self.assertTrue(ga.load_binary(out))
+                loaded = ga.get_graph()
+                self.assertEqual(list(g.get_all_v()), list(loaded.get_all_v()))
+                self.assertEqual(g.Ni_out, loaded.Ni_out)
+                self.assertEqual(g.Ni_in, loaded.Ni_in)
+                if g.freeze().has_positions:
+                    self.assertEqual([n.pos for n in g.get_all_v().values()],
+                                     [n.pos for n in loaded.get_all_v().values()])
+                self.assertIsInstance(loaded.freeze(), MappedCSRGraph)
+                self.assertEqual(self.ga.shortest_path(0, 3), ga.shortest_path(0, 3))
 
-        self.assertTrue(self.ga.load_from_json("../data/T0.json"))
-        self.assertTrue(self.ga.save_to_json("test4.json"))
+                # the mapped snapshot is sent to other processes by its path, and keeps its mc
+                csr = pickle.loads(pickle.dumps(loaded.freeze()))
+                self.assertEqual(out, csr.path)
+                self.assertEqual(g.e_size(), csr.e_size())
+                self.assertEqual(loaded.get_mc(), csr.mc)
+                if file == "../data/A5":
+                    # so a hierarchy built from it in another process is adopted
+                    ga.preprocess(background=True).result()
+                    self.assertIsNotNone(ga.hierarchy())
+
+                back = os.path.join(tmp, "graph.json")
+                convert(out, back)
+                self.assertTrue(ga.load_from_json(back))
+                self.assertEqual(g.Ni_out, ga.get_graph().Ni_out)
+
+            self.assertFalse(ga.load_binary("../data/A0"))
+            self.assertFalse(ga.load_binary(os.path.join(tmp, "no_such_file.bin")))
+            with open(out, "rb") as f:
+                data = f.read()
+            with open(out, "wb") as f:
+                f.write(data[:len(data) // 2])
+            self.assertFalse(ga.load_binary(out))
 
     def test_shortest_path(self):
         g = DiGraph()
@@ -73,6 +198,377 @@ class TestGraphAlgo(TestCase):
         self.assertIsNone(self.ga.shortest_path(20, 4))
         self.assertIsNone(self.ga.shortest_path(1, 20))
 
+    def test_shortest_path_bidirectional(self):
+        for file in ["../data/A5", "../data/G_1000_8000_0.json"]:
+            self.assertTrue(self.ga.load_from_json(file))
+            keys = list(self.ga.get_graph().get_all_v())
+            rnd = random.Random(5)
+            for _ in range(50):
+                src, dst = rnd.choice(keys), rnd.choice(keys)
+                dist, path = self.ga.shortest_path(src, dst)
+                bi_dist, bi_path = self.ga.shortest_path(src, dst, method="bidirectional")
+                self.assertAlmostEqual(dist, bi_dist)
+                self.assertEqual(src, bi_path[0])
+                self.assertEqual(dst, bi_path[-1])
+        self.ga.graph = g1
+        self.assertEqual((math.inf, []), self.ga.shortest_path(6, 1, method="bidirectional"))
+        self.assertEqual((0, [3]), self.ga.shortest_path(3, 3, method="bidirectional"))
+        self.assertEqual((3, [1, 2, 3, 4]), self.ga.shortest_path(1, 4, method="bidirectional"))
+        self.assertRaises(ValueError, self.ga.shortest_path, 1, 4, "no-such-method")
+
+    def test_shortest_path_astar(self):
+        for file in ["../data/A0", "../data/A5", "../data/A5_edited"]:
+            self.assertTrue(self.ga.load_from_json(file))
+            self.assertGreater(self.ga.astar_factor(), 0)
+            keys = list(self.ga.get_graph().get_all_v())
+            for src in keys[::3]:
+                for dst in keys[::5]:
+                    dist, path = self.ga.shortest_path(src, dst)
+                    a_dist, a_path = self.ga.shortest_path(src, dst, method="astar")
+                    self.assertAlmostEqual(dist, a_dist)
+                    if path:
+                        self.assertEqual((src, dst), (a_path[0], a_path[-1]))
+
+        # without real positions it falls back to plain Dijkstra
+        self.ga.graph = g1
+        self.assertEqual(0, self.ga.astar_factor())
+        self.assertEqual((3, [1, 2, 3, 4]), self.ga.shortest_path(1, 4, method="astar"))
+
+    def test_shortest_path_queues(self):
+        rnd = random.Random(8)
+        ints = DiGraph()
+        for i in range(300):
+            ints.add_node(i)
+        for _ in range(1500):
+            ints.add_edge(rnd.randrange(300), rnd.randrange(300), rnd.randint(0, 6))
+        self.assertTrue(self.ga.load_from_json("../data/G_1000_8000_0.json"))
+        for g, auto in [(self.ga.get_graph(), LazyHeap), (ints, BucketQueue)]:
+            csr = g.freeze()
+            self.assertIsInstance(ShortestPathTree(csr, 0).heap, auto)
+            keys = list(g.get_all_v())
+            pairs = [(rnd.choice(keys), rnd.choice(keys)) for _ in range(100)]
+            expected = [GraphAlgo(g).shortest_path(src, dst)[0] for src, dst in pairs]
+            for queue in ["heap", "dary", "bucket", "auto"]:
+                if queue == "bucket" and auto is not BucketQueue:
+                    continue
+                ga = GraphAlgo(g)
+                ga.path_cache.queue = queue
+                for (src, dst), dist in zip(pairs, expected):
+                    # equally short paths may be taken in another order, so the paths are checked by their weight
+                    d, path = ga.shortest_path(src, dst)
+                    self.assertEqual(dist, d)
+                    if path:
+                        self.assertEqual((src, dst), (path[0], path[-1]))
+                        self.assertEqual(d, sum(g.all_out_edges_of_node(a)[b] for a, b in zip(path, path[1:])))
+        self.assertRaises(ValueError, make_queue, ints.freeze(), "no-such-queue")
+
+        q = DaryHeap([(5, "a"), (3, "b"), (4, "c")])
+        q.push((1, "a"))
+        q.push((9, "b"))  # not a decrease, ignored
+        self.assertEqual(3, len(q))
+        self.assertEqual([(1, "a"), (3, "b"), (4, "c")], [q.pop() for _ in range(3)])
+
+    def test_shortest_path_alt(self):
+        self.assertTrue(self.ga.load_from_json("../data/G_1000_8000_0.json"))
+        rnd = random.Random(4)
+        for settings in [{}, {"selection": "random", "typecode": 'f'}, {"k": 2}]:
+            lm = self.ga.build_landmarks(**settings)
+            self.assertEqual(settings.get("k", 8), lm.k())
+            for _ in range(50):
+                src, dst = rnd.randrange(1000), rnd.randrange(1000)
+                dist, path = self.ga.shortest_path(src, dst)
+                alt_dist, alt_path = self.ga.shortest_path(src, dst, method="alt")
+                self.assertAlmostEqual(dist, alt_dist)
+                self.assertEqual((src, dst), (alt_path[0], alt_path[-1]))
+        self.assertEqual(3, self.ga.build_landmarks(max_bytes=3 * 2 * 1000 * 8).k())
+        self.assertRaises(ValueError, self.ga.build_landmarks, 4, "no-such-selection")
+
+        # g1 has 3 components: every landmark leaves some nodes unreachable
+        self.ga.graph = g1
+        lm = self.ga.build_landmarks(k=3)
+        comp_of = self.ga.component_map()
+        self.assertEqual(3, len({comp_of[g1.freeze().keys[v]] for v in lm.landmarks}))
+        for src in range(1, 9):
+            for dst in range(1, 9):
+                self.assertEqual(self.ga.shortest_path(src, dst), self.ga.shortest_path(src, dst, method="alt"))
+        csr = g1.freeze()
+        self.assertEqual(math.inf, lm.lower_bound(csr.index[6], csr.index[1]))
+
+        # float32 bounds by the distances to a landmark, larger than all the distances from it,
+        # are lowered by their own rounding error (3000000.4 is rounded up to 3000000.5)
+        g = DiGraph()
+        for i in range(3):
+            g.add_node(i)
+        g.add_edge(0, 1, 1)
+        g.add_edge(0, 2, 1)
+        g.add_edge(1, 0, 3000000.4)
+        g.add_edge(2, 0, 3000000.5)
+        csr = g.freeze()
+        ga = GraphAlgo(g)
+        F = array('f', (ga.shortest_path(0, key)[0] for key in csr.keys))
+        T = array('f', (ga.shortest_path(key, 0)[0] for key in csr.keys))
+        self.assertEqual(3000000.5, T[csr.index[1]])
+        lm = LandmarkIndex([csr.index[0]], 3, csr.mc, F, T)
+        self.assertLessEqual(lm.lower_bound(csr.index[1], csr.index[0]), 3000000.4)
+
+        # the index follows the changes of the graph, with the same settings
+        g = DiGraph()
+        for i in range(5):
+            g.add_node(i)
+            g.add_edge(i - 1, i, 1)
+        self.ga.graph = g
+        lm = self.ga.build_landmarks(k=2, selection="random")
+        self.assertEqual((4, [0, 1, 2, 3, 4]), self.ga.shortest_path(0, 4, method="alt"))
+        g.add_edge(4, 0, 1)
+        self.assertEqual((1, [4, 0]), self.ga.shortest_path(4, 0, method="alt"))
+        self.assertIsNot(lm, self.ga.landmarks())
+        self.assertEqual(2, self.ga.landmarks().k())
+
+    def test_shortest_path_ch(self):
+        # a grid with random weights, and one of the random graphs
+        rnd = random.Random(2)
+        grid = DiGraph()
+        for i in range(144):
+            grid.add_node(i)
+        for i in range(144):
+            for j in (i + 1, i - 1, i + 12, i - 12):
+                if 0 <= j < 144 and (j // 12 == i // 12 or j % 12 == i % 12):
+                    grid.add_edge(i, j, rnd.randint(1, 10))
+        self.assertTrue(self.ga.load_from_json("../data/A5"))
+        for g, max_shortcuts in [(self.ga.get_graph(), 64), (grid, 64), (grid, 2)]:
+            self.ga.graph = g
+            self.ga.preprocess(max_shortcuts=max_shortcuts)
+            keys = list(g.get_all_v())
+            for _ in range(200):
+                src, dst = rnd.choice(keys), rnd.choice(keys)
+                dist, path = self.ga.shortest_path(src, dst)
+                ch_dist, ch_path = self.ga.shortest_path(src, dst, method="ch")
+                self.assertAlmostEqual(dist, ch_dist)
+                if path:
+                    self.assertEqual((path[0], path[-1]), (ch_path[0], ch_path[-1]))
+                # the shortcuts are unpacked into the original edges
+                self.assertEqual(ch_dist, sum(g.all_out_edges_of_node(a)[b] for a, b in zip(ch_path, ch_path[1:])))
+
+        self.ga.graph = g1
+        self.assertIsNone(self.ga.hierarchy())
+        # the first query does not wait for the hierarchy, it is built in the background
+        self.assertEqual((3, [1, 2, 3, 4]), self.ga.shortest_path(1, 4, method="ch"))
+        self.ga.preprocess(background=True).result()
+        self.assertEqual((math.inf, []), self.ga.shortest_path(6, 1, method="ch"))
+        ch = self.ga.hierarchy()
+        self.assertIsNotNone(ch)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "g1.json.ch")
+            self.assertTrue(self.ga.save_hierarchy(out))
+            ga = GraphAlgo(g1)
+            self.assertTrue(ga.load_hierarchy(out))
+            self.assertEqual(list(ch.rank), list(ga.hierarchy().rank))
+            self.assertEqual((3, [1, 2, 3, 4]), ga.shortest_path(1, 4, method="ch"))
+            self.assertFalse(GraphAlgo(grid).load_hierarchy(out))
+
+            # after a change the hierarchy is stale: the queries fall back to Dijkstra during the rebuild
+            g = DiGraph()
+            for i in range(1, 9):
+                g.add_node(i)
+            for src, out_edges in g1.Ni_out.items():
+                for dst, w in out_edges.items():
+                    g.add_edge(src, dst, w)
+            ga = GraphAlgo(g)
+            ga.preprocess()
+            self.assertTrue(ga.save_hierarchy(out))
+            g.add_edge(1, 4, 1)
+            self.assertIsNone(ga.hierarchy())
+            self.assertFalse(ga.save_hierarchy(out))
+            self.assertFalse(ga.load_hierarchy(out))
+            self.assertEqual((1, [1, 4]), ga.shortest_path(1, 4, method="ch"))
+            ga.preprocess(background=True).result()
+            self.assertIsNotNone(ga.hierarchy())
+            self.assertEqual((2, [1, 4, 8]), ga.shortest_path(1, 8, method="ch"))
+
+    def test_shortest_path_ch_speed(self):
+        self.assertTrue(self.ga.load_from_json("../data/G_1000_8000_0.json"))
+        g = self.ga.get_graph()
+        ch = self.ga.preprocess()
+        # the dense part is left as the core instead of being filled with shortcuts
+        self.assertLess(ch.shortcuts(), g.e_size() // 2)
+        self.assertLess(ch.core, g.v_size())
+        rnd = random.Random(4)
+        keys = list(g.get_all_v())
+        pairs = [(rnd.choice(keys), rnd.choice(keys)) for _ in range(100)]
+        self.ga.path_cache.max_entries = 0
+        # the work of the searches (edges scanned), not the wall time, so a loaded machine can't fail it
+        with self.ga.instrument() as dijkstra:
+            expected = [self.ga.shortest_path(src, dst)[0] for src, dst in pairs]
+        with self.ga.instrument() as hierarchy:
+            found = [self.ga.shortest_path(src, dst, method="ch")[0] for src, dst in pairs]
+        for a, b in zip(expected, found):
+            self.assertAlmostEqual(a, b)
+        dijkstra, hierarchy = dijkstra.snapshot()["shortest_path"], hierarchy.snapshot()["shortest_path"]
+        self.assertLess(hierarchy["relaxations"], dijkstra["relaxations"] // 4)
+
+    def test_shortest_path_dynamic(self):
+        rnd = random.Random(5)
+        g = DiGraph()
+        for i in range(200):
+            g.add_node(i)
+        for _ in range(1000):
+            g.add_edge(rnd.randrange(200), rnd.randrange(200), rnd.randint(1, 20))
+        self.ga.graph = g
+        sources = [0, 1, 2]
+        for src in sources:
+            self.assertTrue(self.ga.register_source(src))
+        self.assertFalse(self.ga.register_source(999))
+
+        # random batches of changes, the trees always match a search from scratch
+        for step in range(40):
+            for _ in range(rnd.randint(1, 8)):
+                edges = [(a, b) for a in g.get_all_v() for b in g.all_out_edges_of_node(a)]
+                r = rnd.random()
+                if r < 0.6:
+                    g.update_edge_weight(*rnd.choice(edges), rnd.randint(1, 20))
+                elif r < 0.75:
+                    g.remove_edge(*rnd.choice(edges))
+                elif r < 0.9:
+                    g.add_edge(rnd.randrange(200), rnd.randrange(200), rnd.randint(1, 20))
+                elif r < 0.95:
+                    g.remove_node(rnd.randrange(200))
+                else:
+                    g.add_node(rnd.randrange(200))
+            fresh = GraphAlgo(g)
+            for src in sources:
+                if src not in g.get_all_v():
+                    continue
+                for dst in g.get_all_v():
+                    dist, path = self.ga.shortest_path(src, dst, method="dynamic")
+                    self.assertEqual(fresh.shortest_path(src, dst)[0], dist)
+                    if path:
+                        self.assertEqual((src, dst), (path[0], path[-1]))
+                        self.assertEqual(dist, sum(g.all_out_edges_of_node(a)[b] for a, b in zip(path, path[1:])))
+        self.assertGreater(self.ga._dynamic.repairs, 0)
+        self.assertEqual(0, self.ga._dynamic.rebuilds)
+
+        # a removed source comes back with its new edges
+        g.remove_node(0)
+        self.assertIsNone(self.ga.shortest_path(0, 5, method="dynamic"))
+        g.add_node(0)
+        g.add_edge(0, 5, 1)
+        self.assertEqual((1, [0, 5]), self.ga.shortest_path(0, 5, method="dynamic"))
+
+        # only the affected part of a tree is touched
+        dynamic = DynamicSSSP(g, [1])
+        tree = dynamic.trees[1]
+        a, b = next((a, b) for a in tree.dist for b in g.all_out_edges_of_node(a) if tree.parent.get(b) != a)
+        stats = SearchStats()
+        g.update_edge_weight(a, b, g.all_out_edges_of_node(a)[b] + 5)
+        dynamic.update(stats)
+        self.assertEqual(0, stats.settled)
+        # the farthest node has no subtree, so making its tree edge lighter settles only that node
+        b = max(tree.dist, key=tree.dist.get)
+        a = tree.parent[b]
+        g.update_edge_weight(a, b, g.all_out_edges_of_node(a)[b] - 0.5)
+        dynamic.update(stats)
+        self.assertEqual(1, stats.settled)
+        self.assertEqual(GraphAlgo(g).shortest_path(1, b)[0], tree.dist[b])
+        g.remove_edge(a, b)
+        dynamic.update(stats)
+        self.assertEqual(GraphAlgo(g).shortest_path(1, b)[0], tree.path_to(b)[0])
+
+        dynamic = self.ga._dynamic
+        # too many changes at once rebuild the trees
+        dynamic.max_delta = 2
+        g.add_node(1000)
+        g.add_node(1001)
+        g.add_edge(1, 1000, 1)
+        g.add_edge(1000, 1001, 2)
+        self.assertEqual((3, [1, 1000, 1001]), self.ga.shortest_path(1, 1001, method="dynamic"))
+        self.assertEqual(1, dynamic.rebuilds)
+
+        # the sources that are not registered fall back to dijkstra
+        self.assertTrue(self.ga.unregister_source(1))
+        self.assertFalse(self.ga.unregister_source(1))
+        self.assertEqual(fresh.shortest_path(1, 6)[0], self.ga.shortest_path(1, 6, method="dynamic")[0])
+
+    def test_shortest_paths_batch(self):
+        self.assertTrue(self.ga.load_from_json("../data/G_100_800_0.json"))
+        rnd = random.Random(11)
+        pairs = [(rnd.randrange(12), rnd.randrange(100)) for _ in range(300)] + [(3, 500), (500, 3)]
+        for workers in [1, 3]:
+            results = dict(self.ga.shortest_paths_batch(pairs, workers=workers))
+            self.assertEqual(len(set(pairs)), len(results))
+            for (src, dst), result in results.items():
+                self.assertEqual(self.ga.shortest_path(src, dst), result)
+        self.assertEqual([], list(self.ga.shortest_paths_batch([])))
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+    def test_all_pairs_distances(self):
+        import numpy as np
+        self.assertTrue(self.ga.load_from_json("../data/A5"))
+        fw, index = self.ga.all_pairs_distances(method="floyd_warshall")
+        dj, index2 = self.ga.all_pairs_distances(method="dijkstra", dtype="float32")
+        self.assertEqual(index, index2)
+        self.assertEqual(np.float32, dj.dtype)
+        self.assertTrue(np.allclose(fw, dj))
+        for src, dst in [(0, 47), (13, 14), (20, 2), (5, 5)]:
+            self.assertAlmostEqual(self.ga.shortest_path(src, dst)[0], fw[index[src], index[dst]])
+
+        # relaxed in blocks of a few rows (the last one partial), it gives the same matrix
+        import src.AllPairs as AllPairs
+        block_bytes = AllPairs.BLOCK_BYTES
+        AllPairs.BLOCK_BYTES = 5 * 48 * 8
+        try:
+            blocked, _ = self.ga.all_pairs_distances(method="floyd_warshall")
+        finally:
+            AllPairs.BLOCK_BYTES = block_bytes
+        self.assertTrue(np.array_equal(fw, blocked))
+
+        self.ga.graph = g1
+        d, index = self.ga.all_pairs_distances()
+        self.assertEqual(math.inf, d[index[6], index[1]])
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "g1.npy")
+            mm, _ = self.ga.all_pairs_distances(method="dijkstra", out=out)
+            self.assertTrue(np.array_equal(d, np.load(out)))
+            del mm
+        self.assertRaises(ValueError, self.ga.all_pairs_distances, "no-such-method")
+
+    def test_shortest_path_cache(self):
+        self.assertTrue(self.ga.load_from_json("../data/A5"))
+        cache = self.ga.path_cache
+        expected = GraphAlgo(self.ga.get_graph())
+        expected.path_cache.max_entries = 0
+        for dst in range(48):
+            self.assertEqual(expected.shortest_path(0, dst), self.ga.shortest_path(0, dst))
+        self.assertEqual(1, cache.misses)
+        self.assertEqual(47, cache.hits)
+
+        # a change in the graph invalidates the cached trees
+        self.ga.get_graph().remove_edge(13, 14)
+        self.assertEqual(expected.shortest_path(0, 20), self.ga.shortest_path(0, 20))
+        self.assertEqual(2, cache.misses)
+
+        # and so does another graph with the same mc, without leaking the bytes of the dropped trees
+        mc = self.ga.get_graph().get_mc()
+        self.assertTrue(self.ga.load_from_json("../data/A5"))
+        self.ga.get_graph().remove_edge(13, 14)
+        self.assertEqual(mc, self.ga.get_graph().get_mc())
+        expected = GraphAlgo(self.ga.get_graph())
+        expected.path_cache.max_entries = 0
+        self.assertEqual(expected.shortest_path(0, 20), self.ga.shortest_path(0, 20))
+        self.assertEqual(3, cache.misses)
+        self.assertEqual(sum(t.size_bytes() for t in cache._entries.values()), cache.stats()["bytes"])
+
+        # eviction by the number of entries and by memory
+        cache.max_entries = 3
+        for src in range(10):
+            self.ga.shortest_path(src, 47)
+        self.assertEqual(3, len(cache))
+        self.assertEqual(7, cache.evictions)
+        cache.max_bytes = 1
+        self.ga.shortest_path(0, 47)
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.stats()["bytes"])
+
     def test_connected_component(self):
         self.ga.graph = None
         self.assertEqual([], self.ga.connected_component(1))
@@ -84,12 +580,280 @@ class TestGraphAlgo(TestCase):
     def test_connected_components(self):
         self.ga.graph = g1
         sccs = self.ga.connected_components()
-        self.assertEqual([[1, 2, 5], [8, 3, 4], [6, 7]], sccs)
+        self.assertEqual([{1, 2, 5}, {8, 3, 4}, {6, 7}], [set(scc) for scc in sccs])
+
+    def test_snapshot_concurrent_writer(self):
+        g = DiGraph()
+        rnd = random.Random(5)
+        for i in range(300):
+            g.add_node(i)
+        for i in range(2400):
+            g.add_edge(rnd.randrange(300), rnd.randrange(300), rnd.randint(1, 10))
+        snap = g.snapshot()
+        copy = DiGraph()
+        copy.bulk_load(((k, None) for k in snap.get_all_v()),
+                       ((src, dst, w) for src in snap.get_all_v() for dst, w in snap.all_out_edges_of_node(src).items()))
+        expected = [GraphAlgo(copy).shortest_path(src, 299 - src) for src in range(40)]
+        stop = threading.Event()
+
+        def writer():
+            wrnd = random.Random(6)
+            while not stop.is_set():
+                src, dst = wrnd.randrange(320), wrnd.randrange(320)
+                if wrnd.random() < 0.5:
+                    g.add_node(src)
+                    g.add_edge(src, dst, 1)
+                else:
+                    g.remove_node(src)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            # the readers see the version of the snapshot, whatever the writer does meanwhile
+            for _ in range(3):
+                ga = GraphAlgo(snap)
+                self.assertEqual(expected, [ga.shortest_path(src, 299 - src) for src in range(40)])
+                self.assertEqual(len(GraphAlgo(copy).connected_components()), len(ga.connected_components()))
+        finally:
+            stop.set()
+            thread.join()
+        self.assertNotEqual(snap.get_mc(), g.get_mc())
+
+    def test_connected_components_parallel(self):
+        rnd = random.Random(3)
+        sparse = DiGraph()
+        for i in range(3000):
+            sparse.add_node(i)
+        for i in range(4500):
+            sparse.add_edge(rnd.randrange(3000), rnd.randrange(3000), 1)
+        for g in [g1, sparse, DiGraph()]:
+            expected = sorted(sorted(scc) for scc in GraphAlgo(g).connected_components())
+            # a tiny "small" size forces the forward-backward splitting down to tiny pieces
+            for workers, small in [(1, 2048), (1, 4), (2, 4)]:
+                self.assertEqual(expected, sorted(sorted(scc) for scc in parallel_scc(g.freeze(), workers, small)))
+            ga = GraphAlgo(g)
+            self.assertEqual(expected, sorted(sorted(scc) for scc in ga.connected_components(workers=2)))
+            for key, c in ga.component_map().items():
+                self.assertIn(key, ga.connected_components()[c])
+
+    def test_component_map(self):
+        self.ga.graph = g1
+        comp_of = self.ga.component_map()
+        sccs = self.ga.connected_components()
+        self.assertEqual(8, len(comp_of))
+        for key, c in comp_of.items():
+            self.assertIn(key, sccs[c])
+        self.assertEqual(comp_of[3], comp_of[8])
+        self.assertNotEqual(comp_of[1], comp_of[6])
+        self.assertEqual(sorted(sccs[comp_of[4]]), sorted(self.ga.connected_component(4)))
+
+    def test_connected_components_incremental(self):
+        rnd = random.Random(7)
+        g = DiGraph()
+        for i in range(60):
+            g.add_node(i)
+        for i in range(150):
+            g.add_edge(rnd.randrange(60), rnd.randrange(60), 1)
+        self.ga.graph = g
+        self.ga.connected_components()
+        incremental = 0
+        for step in range(300):
+            op = rnd.random()
+            if op < 0.45:
+                g.add_edge(rnd.randrange(70), rnd.randrange(70), 1)
+            elif op < 0.85:
+                src = rnd.choice(list(g.get_all_v()))
+                if g.all_out_edges_of_node(src):
+                    g.remove_edge(src, rnd.choice(list(g.all_out_edges_of_node(src))))
+            elif op < 0.93:
+                g.add_node(rnd.randrange(70))
+            else:
+                g.remove_node(rnd.randrange(70))
+            if step % 3 == 0:
+                expected = GraphAlgo(g).connected_components()
+                # a batch whose searches grow past the size of the graph is rebuilt instead
+                incremental += self.ga._scc.update()
+                sccs = self.ga.connected_components()
+                self.assertEqual(sorted(map(sorted, expected)), sorted(map(sorted, sccs)))
+                position = {k: i for i, scc in enumerate(sccs) for k in scc}
+                for src in g.get_all_v():
+                    for dst in g.all_out_edges_of_node(src):
+                        self.assertLessEqual(position[src], position[dst])
+                key = rnd.choice(list(g.get_all_v()))
+                self.assertEqual(sorted(GraphAlgo(g).connected_component(key)),
+                                 sorted(self.ga.connected_component(key)))
+        self.assertGreater(incremental, 80)
+
+    def test_connected_components_acyclic_inserts(self):
+        rnd = random.Random(3)
+        g = DiGraph()
+        n = 5000
+        for i in range(n):
+            g.add_node(i)
+        for i in range(n):
+            for _ in range(3):
+                g.add_edge(i, min(n - 1, i + rnd.randint(1, 50)), 1)
+        self.ga.graph = g
+        self.assertEqual(n, len(self.ga.connected_components()))
+        scc = self.ga._scc
+
+        # edges that agree with the order are not searched at all
+        keys = sorted(g.get_all_v(), key=lambda k: scc.rank[scc.comp_of[k]])
+        for _ in range(100):
+            a, b = sorted(rnd.sample(range(n), 2))
+            g.add_edge(keys[a], keys[b], 1)
+        self.assertTrue(scc.update())
+        self.assertEqual(0, scc._work)
+
+        # edges against it search no more than the graph holds (and the last one) before falling back to a rebuild
+        for _ in range(500):
+            a, b = rnd.randrange(n), rnd.randrange(n)
+            g.add_edge(min(a, b), max(a, b), 1)
+        scc.update()
+        self.assertLessEqual(scc._work, 3 * (g.v_size() + g.e_size()))
+        self.assertEqual(n, len(self.ga.connected_components()))
+
+    def test_connected_components_long_chain(self):
+        g = DiGraph()
+        n = 100000
+        for i in range(n):
+            g.add_node(i)
+        for i in range(n - 1):
+            g.add_edge(i, i + 1, 1)
+        g.add_edge(n - 1, 0, 1)
+        self.ga.graph = g
+        self.assertEqual(1, len(self.ga.connected_components()))
+        g.remove_edge(n - 1, 0)
+        self.assertEqual(n, len(self.ga.connected_components()))
+
+    def test_instrument(self):
+        self.ga.graph = g1
+        self.assertIsNone(self.ga.metrics)
+        with self.ga.instrument() as m:
+            self.ga.shortest_path(1, 7)
+            self.ga.shortest_path(1, 7, method="bidirectional")
+            self.ga.connected_component(3)
+        self.assertIsNone(self.ga.metrics)
+        self.ga.shortest_path(1, 6)
+
+        ops = m.snapshot()
+        self.assertEqual(2, ops["shortest_path"]["calls"])
+        self.assertEqual(1, ops["connected_component"]["calls"])
+        self.assertNotIn("BFS", ops)  # nested calls are counted in the outer call
+        sp = ops["shortest_path"]
+        # every push comes from a relaxation, but not every relaxation improves a distance
+        self.assertGreater(sp["relaxations"], sp["pushes"])
+        self.assertEqual(sp["pops"] - sp["settled"], sp["stale_pops"])
+        self.assertGreater(sp["settled"], 0)
+        self.assertGreater(ops["connected_component"]["max_frontier"], 0)
+        # a search over everything reachable scans every out-edge of every node it settles
+        stats = SearchStats()
+        csr = g1.freeze()
+        tree = ShortestPathTree(csr, csr.index[1])
+        tree.settle(-1, stats)
+        self.assertEqual(sum(len(g1.all_out_edges_of_node(csr.keys[v])) for v in tree.settled), stats.relaxations)
+        # every node visited by the two BFS runs is counted once
+        self.assertEqual(len(self.ga.BFS(3)) + len(self.ga.BFS(3, inverted=True)),
+                         ops["connected_component"]["settled"])
+
+        out = io.StringIO()
+        m.dump(out)
+        dumped = json.loads(out.getvalue())
+        self.assertEqual(["shortest_path", "shortest_path", "connected_component"],
+                         [c["op"] for c in dumped["calls"]])
+
+        with self.ga.instrument(profile=True) as m:
+            self.ga.shortest_path(1, 7, method="bidirectional")
+        self.assertIn("bidirectional_dijkstra", m.report("shortest_path"))
+        self.assertIn("not profiled", m.report("BFS"))
+
+    def test_service(self):
+        async def run():
+            service = GraphService.from_json("../data/G_100_800_0.json", workers=1)
+            ga = GraphAlgo()
+            ga.load_from_json("../data/G_100_800_0.json")
+            port = await service.start()
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                requests = [{"id": 1, "op": "shortest_path", "src": 0, "dst": 7},
+                            {"id": 2, "op": "shortest_path", "src": 0, "dst": 99},
+                            {"id": 3, "op": "shortest_path", "src": 0, "dst": 1000},
+                            {"id": 4, "op": "connected_component", "node": 5},
+                            {"id": 5, "op": "connected_components"},
+                            {"id": 6, "op": "no_such_op"}]
+                for request in requests:
+                    writer.write(json.dumps(request).encode() + b"\n")
+                writer.write(b"not json\n")
+                await writer.drain()
+                responses = {}
+                for _ in range(len(requests) + 1):
+                    response = json.loads(await reader.readline())
+                    responses[response["id"]] = response
+                writer.close()
+
+                for i, dst in [(1, 7), (2, 99)]:
+                    dist, path = ga.shortest_path(0, dst)
+                    self.assertEqual({"dist": dist, "path": path}, responses[i]["result"])
+                self.assertIsNone(responses[3]["result"])
+                self.assertEqual(sorted(ga.connected_component(5)), sorted(responses[4]["result"]))
+                self.assertEqual(sorted(map(sorted, ga.connected_components())),
+                                 sorted(map(sorted, responses[5]["result"])))
+                self.assertIn("Unknown op", responses[6]["error"])
+                self.assertIn("error", responses[None])
+
+                # identical requests in flight share a single search, requests of the same source share a batch
+                coalesced, batches = service.coalesced, service.batches
+                results = await asyncio.gather(*[service.query("shortest_path", {"src": 3, "dst": dst})
+                                                 for dst in [8, 8, 8, 9, 10]])
+                self.assertEqual(2, service.coalesced - coalesced)
+                self.assertEqual(1, service.batches - batches)
+                self.assertEqual(list(ga.shortest_path(3, 8)), [results[0]["dist"], results[0]["path"]])
+
+                load = await load_test("127.0.0.1", port, list(range(100)), requests=200, concurrency=8, sources=5)
+                self.assertEqual(0, load["errors"])
+                # the latencies of the 5 valid requests sent above and the load test (direct queries are not counted)
+                stats = service.stats()
+                self.assertEqual(5 + 200, sum(h["count"] for h in stats["latency"].values()))
+                self.assertGreater(stats["latency"]["shortest_path"]["p99"], 0)
+            finally:
+                await service.close()
+
+        asyncio.run(run())
+
+    @unittest.skipUnless(os.path.exists("/proc/self/statm"), "measures the memory by /proc")
+    def test_import_budget(self):
+        """
+        Importing GraphAlgo in a fresh process (best of 3) stays within the startup budget,
+        and loads none of the heavy optional modules.
+        """
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = "HEAVY = {!r}\n".format(HEAVY_MODULES) + _MEASURE_IMPORT
+        runs = []
+        for _ in range(3):
+            out = subprocess.run([sys.executable, "-c", code], cwd=root, env=dict(os.environ, PYTHONPATH=root),
+                                 capture_output=True, text=True, check=True).stdout.split()
+            runs.append(out)
+        print(runs)
+        self.assertEqual([], runs[0][2:])
+        self.assertLess(min(float(run[0]) for run in runs), IMPORT_SECONDS)
+        self.assertLess(min(float(run[1]) for run in runs), IMPORT_MB)
 
     def test_plot_graph(self):
         self.ga.graph = rg
         self.ga.plot_graph()
 
+    def test_plot_graph_to_file(self):
+        self.ga.graph = rg
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, options in [("plain.png", {}), ("plain.svg", {}),
+                                  ("overview.png", {"color_components": True, "max_edges": 5, "arrows": False}),
+                                  ("labels.png", {"labels": False, "arrows": True})]:
+                file_name = os.path.join(tmp, name)
+                self.ga.plot_graph(file_name, **options)
+                self.assertGreater(os.path.getsize(file_name), 0)
+            with open(os.path.join(tmp, "plain.svg")) as f:
+                self.assertIn("<svg", f.read())
+
 
 # ========================== Graph 1 ===========================
 g1 = DiGraph()
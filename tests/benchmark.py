@@ -0,0 +1,360 @@
+"""
+*****************************************************************************
+* Eyal Levi ID.203249073
+* OOP course 2020 - Ariel University
+* Assignment number 4
+* https://github.com/LeviEyal
+****************************************************************************
+
+A reproducible performance benchmark of DiGraph / GraphAlgo.
+Every graph is generated from a seed, every workload is warmed up and repeated, and the
+results (percentiles of the run times and the peak memory) are written as json and compared
+against a stored baseline. networkx is benchmarked alongside when it is installed.
+Everything runs offline.
+
+usage:
+    python -m tests.benchmark [--sizes 1000 10000] [--repeat 5] [--out results.json]
+                              [--baseline tests/benchmark_baseline.json] [--update-baseline]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import TestCase
+
+from src.DiGraph import DiGraph
+from src.GraphAlgo import GraphAlgo
+from src.Journal import Journal
+from src.Landmarks import LandmarkIndex, alt_search
+from src.PathSearch import dijkstra, bidirectional_dijkstra
+
+try:
+    import networkx as nx
+except ImportError:
+    nx = None
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+# -----------------------------------------------------------------------------------------
+# ********************************** Graph generator **************************************
+# -----------------------------------------------------------------------------------------
+def generate_graph(nodes: int, degree: int = 8, seed: int = 0, positions: bool = False) -> DiGraph:
+    """
+    Generates a random graph with small integer weights (1..10), the same for the same arguments.
+    :param nodes: the number of nodes
+    :param degree: the average out degree
+    :param seed: the random seed
+    :param positions: if True, every node gets a random position in the unit square, and every
+    edge weighs at least the distance between its ends (so geometric heuristics apply)
+    :return: the new graph
+    """
+    rnd = random.Random(seed)
+    pos = [(rnd.random(), rnd.random(), 0.0) for _ in range(nodes)] if positions else None
+    edges = []
+    for _ in range(nodes * degree):
+        src, dst = rnd.randrange(nodes), rnd.randrange(nodes)
+        w = rnd.randint(1, 10)
+        if positions:
+            w += ((pos[src][0] - pos[dst][0]) ** 2 + (pos[src][1] - pos[dst][1]) ** 2) ** 0.5
+        edges.append((src, dst, w))
+    g = DiGraph()
+    g.bulk_load(((i, pos[i] if positions else None) for i in range(nodes)), edges)
+    return g
+
+
+def to_networkx(g: DiGraph):
+    gx = nx.DiGraph()
+    gx.add_nodes_from(g.get_all_v())
+    for src in g.get_all_v():
+        for dst, w in g.all_out_edges_of_node(src).items():
+            gx.add_edge(src, dst, weight=w)
+    return gx
+
+
+# -----------------------------------------------------------------------------------------
+# ************************************ Measurements ***************************************
+# -----------------------------------------------------------------------------------------
+def percentile(values: list, p: float) -> float:
+    """
+    :return: the p-th percentile (0..100) of the values, by the nearest rank method
+    """
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    k = max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))
+    return values[k]
+
+
+def summarize(times: list) -> dict:
+    return {"runs": len(times), "min": min(times), "mean": sum(times) / len(times),
+            "p50": percentile(times, 50), "p90": percentile(times, 90), "p99": percentile(times, 99),
+            "max": max(times)}
+
+
+def run_workload(setup, run, repeat: int, warmup: int = 1) -> dict:
+    """
+    Measures a workload: setup() prepares a fresh state (not timed), run(state) is timed.
+    run may return the times of its single operations (OpTimes), which are then summarized instead of the whole run.
+    The peak memory is measured on one more (untimed) run under tracemalloc.
+    """
+    for _ in range(warmup):
+        run(setup())
+    times = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        ops = run(state)
+        elapsed = time.perf_counter() - start
+        times.extend(ops if isinstance(ops, OpTimes) else [elapsed])
+    result = summarize(times)
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+
+class OpTimes(list):
+    """The run times of the single operations of a workload run."""
+
+
+def timed_each(fn, items) -> OpTimes:
+    times = OpTimes()
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+# -----------------------------------------------------------------------------------------
+# ************************************** Workloads ****************************************
+# -----------------------------------------------------------------------------------------
+def workloads(n: int, queries: int, seed: int, tmp: str) -> dict:
+    """
+    :return: a dictionary of (workload name: (setup, run)) for a graph of n nodes
+    """
+    g = generate_graph(n, seed=seed)
+    gp = generate_graph(n, seed=seed, positions=True)
+    rnd = random.Random(seed)
+    pairs = [(rnd.randrange(n), rnd.randrange(n)) for _ in range(queries)]
+    json_file = os.path.join(tmp, "g{}.json".format(n))
+    bin_file = os.path.join(tmp, "g{}.bin".format(n))
+    ga = GraphAlgo(g)
+    ga.save_to_json(json_file)
+    ga.save_to_json(json_file + ".gz")
+    ga.save_binary(bin_file)
+
+    def algo(graph=g, cache=False):
+        a = GraphAlgo(graph)
+        if not cache:
+            a.path_cache.max_entries = 0
+        return a
+
+    def alt_algo():
+        a = algo()
+        a.build_landmarks()
+        return a
+
+    def mutations(a):
+        mrnd = random.Random(seed + 1)
+        graph = a.get_graph()
+        a.connected_components()
+
+        def op(_):
+            src = mrnd.randrange(n)
+            out = graph.all_out_edges_of_node(src)
+            if out and mrnd.random() < 0.5:
+                graph.remove_edge(src, next(iter(out)))
+            else:
+                graph.add_edge(src, mrnd.randrange(n), mrnd.randint(1, 10))
+            a.connected_components()
+        return timed_each(op, range(queries))
+
+    def weight_updates(method):
+        # traffic-like updates: one edge weight changes, then the same few hub sources are queried again
+        def run(a):
+            wrnd = random.Random(seed + 3)
+            graph = a.get_graph()
+            hubs = list(range(4))
+            if method == "dynamic":
+                for hub in hubs:
+                    a.register_source(hub)
+
+            def op(_):
+                src = wrnd.randrange(n)
+                out = graph.all_out_edges_of_node(src)
+                if out:
+                    graph.update_edge_weight(src, next(iter(out)), wrnd.randint(1, 10))
+                for hub in hubs:
+                    a.shortest_path(hub, wrnd.randrange(n), method=method)
+            return timed_each(op, range(queries))
+        return run
+
+    def journaled():
+        graph = generate_graph(n, seed=seed)
+        Journal.create(graph, os.path.join(tmp, "journaled.bin"), compact_ratio=None)
+        return graph
+
+    def journal_changes(graph):
+        jrnd = random.Random(seed + 2)
+        for _ in range(queries):
+            graph.add_edge(jrnd.randrange(n), jrnd.randrange(n), jrnd.randint(1, 10))
+        graph.journal.close()
+
+    w = {
+        "generate": (lambda: None, lambda _: generate_graph(n, seed=seed)),
+        "save_json": (lambda: ga, lambda a: a.save_to_json(os.path.join(tmp, "out.json"))),
+        "save_json_gzip": (lambda: ga, lambda a: a.save_to_json(os.path.join(tmp, "out.json.gz"))),
+        "load_json": (GraphAlgo, lambda a: a.load_from_json(json_file)),
+        "load_json_gzip": (GraphAlgo, lambda a: a.load_from_json(json_file + ".gz")),
+        "journal_changes": (journaled, journal_changes),
+        "journal_recover": (lambda: None, lambda _: Journal.open(os.path.join(tmp, "journaled.bin")).journal.close()),
+        "save_binary": (lambda: ga, lambda a: a.save_binary(os.path.join(tmp, "out.bin"))),
+        "load_binary": (GraphAlgo, lambda a: a.load_binary(bin_file)),
+        "shortest_path_dijkstra": (algo, lambda a: timed_each(lambda p: a.shortest_path(*p), pairs)),
+        "shortest_path_cached": (lambda: algo(cache=True),
+                                 lambda a: timed_each(lambda p: a.shortest_path(p[0] % 10, p[1]), pairs)),
+        "shortest_path_bidirectional": (algo, lambda a: timed_each(
+            lambda p: a.shortest_path(*p, method="bidirectional"), pairs)),
+        "shortest_path_astar": (lambda: algo(gp), lambda a: timed_each(
+            lambda p: a.shortest_path(*p, method="astar"), pairs)),
+        "shortest_path_alt": (alt_algo, lambda a: timed_each(lambda p: a.shortest_path(*p, method="alt"), pairs)),
+        "build_landmarks": (algo, lambda a: a.build_landmarks()),
+        "connected_components": (algo, lambda a: a.connected_components()),
+        "plot_graph": (lambda: algo(gp), lambda a: a.plot_graph(os.path.join(tmp, "plot.png"))),
+        "plot_graph_overview": (lambda: algo(gp), lambda a: a.plot_graph(
+            os.path.join(tmp, "overview.png"), max_edges=10000, color_components=True)),
+        "weight_updates_dijkstra": (lambda: algo(generate_graph(n, seed=seed), cache=True), weight_updates("dijkstra")),
+        "weight_updates_dynamic": (lambda: algo(generate_graph(n, seed=seed)), weight_updates("dynamic")),
+        "mutations_with_scc_queries": (lambda: algo(generate_graph(n, seed=seed)), mutations),
+        "remove_nodes_10pct": (lambda: generate_graph(n, seed=seed),
+                               lambda graph: graph.remove_nodes(random.Random(seed).sample(range(n), n // 10))),
+    }
+    # the scaling of the parallel SCC decomposition over 1 .. N worker processes
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        w["connected_components_parallel_{}".format(workers)] = (
+            algo, lambda a, workers=workers: a.connected_components(workers=workers))
+    if nx is not None:
+        gx = to_networkx(g)
+        w["networkx_shortest_path"] = (lambda: gx, lambda x: timed_each(
+            lambda p: nx.has_path(x, *p) and nx.dijkstra_path(x, *p), pairs))
+        w["networkx_connected_components"] = (lambda: gx, lambda x: list(nx.strongly_connected_components(x)))
+    return w
+
+
+def settled_nodes(n: int, queries: int, seed: int) -> dict:
+    """
+    :return: the average number of nodes settled per query by every point to point search
+    """
+    csr = generate_graph(n, seed=seed).freeze()
+    rnd = random.Random(seed)
+    pairs = [(rnd.randrange(n), rnd.randrange(n)) for _ in range(queries)]
+    lm = LandmarkIndex.build(csr)
+    return {name: sum(search(csr, s, t)[2] for s, t in pairs) / queries
+            for name, search in [("dijkstra", dijkstra), ("bidirectional", bidirectional_dijkstra),
+                                 ("alt", lambda c, s, t: alt_search(c, lm, s, t))]}
+
+
+def run_benchmark(sizes: list, repeat: int = 5, queries: int = 50, seed: int = 0, only: list = None) -> dict:
+    """
+    Runs all the workloads over graphs of the given sizes.
+    :return: the results: {"meta": {...}, "results": {size: {workload: stats}}}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            results[str(n)] = {}
+            for name, (setup, run) in workloads(n, queries, seed, tmp).items():
+                if only and name not in only:
+                    continue
+                stats = run_workload(setup, run, repeat)
+                results[str(n)][name] = stats
+                print("|V|={:<8} {:<32} p50={:.6f}s p90={:.6f}s peak={:.1f}MB".format(
+                    n, name, stats["p50"], stats["p90"], stats["peak_memory_bytes"] / 2 ** 20))
+            results[str(n)]["settled_nodes"] = settled_nodes(n, queries, seed)
+            print("|V|={:<8} settled nodes per query: {}".format(n, results[str(n)]["settled_nodes"]))
+    return {"meta": {"sizes": sizes, "repeat": repeat, "queries": queries, "seed": seed,
+                     "python": sys.version.split()[0], "networkx": nx is not None},
+            "results": results}
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.3) -> list:
+    """
+    Compares the p50 of every workload against a baseline.
+    :return: a list of (size, workload, baseline p50, current p50) of the workloads that got slower by more than tolerance
+    """
+    regressions = []
+    for size, workloads_ in current["results"].items():
+        for name, stats in workloads_.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if not base or "p50" not in stats or "p50" not in base:
+                continue
+            if stats["p50"] > base["p50"] * (1 + tolerance):
+                regressions.append((size, name, base["p50"], stats["p50"]))
+    return regressions
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description="DiGraph / GraphAlgo benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="graph sizes (number of nodes), 10 .. 1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=50, help="queries per query workload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="run only these workloads")
+    parser.add_argument("--out", help="write the results to this json file")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed p50 slowdown vs the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.sizes, args.repeat, args.queries, args.seed, args.only)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        return 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for size, workloads_ in results["results"].items():
+            for name in workloads_:
+                if name not in baseline.get("results", {}).get(size, {}):
+                    print("NO BASELINE |V|={} {} (see --update-baseline)".format(size, name))
+        for size, name, base, cur in regressions:
+            print("REGRESSION |V|={} {}: p50 {:.6f}s -> {:.6f}s".format(size, name, base, cur))
+        return 1 if regressions else 0
+    return 0
+
+
+class Test(TestCase):
+
+    def test_generate_graph(self):
+        g1, g2 = generate_graph(100, seed=3), generate_graph(100, seed=3)
+        self.assertEqual(g1.Ni_out, g2.Ni_out)
+        self.assertEqual(100, g1.v_size())
+
+    def test_percentile(self):
+        self.assertEqual(5, percentile(list(range(1, 11)), 50))
+        self.assertEqual(10, percentile(list(range(1, 11)), 99))
+
+    def test_smoke(self):
+        results = run_benchmark([50], repeat=1, queries=5)
+        self.assertIn("connected_components", results["results"]["50"])
+        self.assertEqual([], compare(results, results))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))